@@ -0,0 +1,13 @@
+"""
+Замеры производительности бота. Запускаются из корня репозитория: python -m benchmarks.<имя>.
+Каждый замер завершается с кодом 1, если результат хуже допустимого (--budget).
+"""
+
+import os
+import sys
+
+
+# Модули бота импортируют друг друга как модули верхнего уровня, как при запуске python src/main.py
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
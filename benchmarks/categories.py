@@ -0,0 +1,96 @@
+"""
+Замер построения индекса категорий из строк листа "категории".
+
+Запуск из корня репозитория:
+    python -m benchmarks.categories [--rows 1000 10000 100000] [--budget 1.0]
+
+Сравнивает build_category_index с прежним способом через pandas (DataFrame и iterrows),
+если pandas установлен. Для каждого размера выводится лучшее из трёх время и пиковая память.
+Индекс, в отличие от прежнего дерева, включает и индексы поиска по началу названия.
+Завершается с кодом 1, если build_category_index на каком-либо размере дольше budget секунд.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from categories import GROUP_COLUMN, ITEM_COLUMN, PARTNER_COLUMN, build_category_index
+
+
+HEADER = [ITEM_COLUMN, GROUP_COLUMN, PARTNER_COLUMN, "Комментарий"]
+
+
+def category_rows(count):
+    """Заголовок и count строк листа: 40 статей, по 10 групп в каждой, остальное - партнёры"""
+    rows = [HEADER]
+    for number in range(count):
+        item = number % 40
+        group = number // 40 % 10
+        rows.append([f"Статья {item}", f"Группа {item}.{group}", f"ООО Партнёр {number}", ""])
+    return rows
+
+
+def pandas_tree(rows):
+    """Прежнее построение дерева категорий: get_all_records, DataFrame и iterrows"""
+    import pandas as pd
+
+    header, *values = rows
+    df = pd.DataFrame([dict(zip(header, row)) for row in values])
+    unique_items = df[ITEM_COLUMN].unique()
+    tree = {}
+    for _, row in df.iterrows():
+        tree.setdefault(row[ITEM_COLUMN], {}).setdefault(row[GROUP_COLUMN], []).append(
+            row[PARTNER_COLUMN]
+        )
+    return tree, unique_items
+
+
+def measure(build, rows):
+    """Лучшее из трёх время построения и пиковая память одного построения, МБ"""
+    elapsed = []
+    for _ in range(3):
+        started = time.perf_counter()
+        build(rows)
+        elapsed.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    build(rows)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(elapsed), peak / 2**20
+
+
+def run(sizes, budget):
+    try:
+        import pandas  # noqa: F401
+    except ImportError:
+        print("pandas не установлен: сравнение с прежним способом пропущено")
+        builders = (("index", build_category_index),)
+    else:
+        builders = (("pandas", pandas_tree), ("index", build_category_index))
+
+    slow = []
+    for count in sizes:
+        rows = category_rows(count)
+        for name, build in builders:
+            elapsed, peak = measure(build, rows)
+            print(f"{count} строк, {name}: {elapsed:.3f} с, {peak:.1f} МБ")
+            if build is build_category_index and elapsed > budget:
+                slow.append(f"{count} строк")
+    return slow
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--budget", type=float, default=1.0, help="допустимое время построения, с")
+    args = parser.parse_args()
+
+    slow = run(args.rows, args.budget)
+    if slow:
+        print(f"Дольше {args.budget} с: {', '.join(slow)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
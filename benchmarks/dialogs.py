@@ -0,0 +1,114 @@
+"""
+Замер памяти и времени сохранения незавершённых диалогов (DialogPersistence).
+
+Запуск из корня репозитория:
+    python -m benchmarks.dialogs [--dialogs 10000] [--budget 2.0]
+
+Для dialogs пользователей, остановившихся на вводе комментария, изменения состояния и выбора
+передаются в DialogPersistence, записываются в базу одной транзакцией (flush) и загружаются
+обратно, как при перезапуске бота. Выводится время записи и загрузки, размер базы и память,
+занимаемая загруженными диалогами, в пересчёте на один диалог.
+Завершается с кодом 1, если запись или загрузка дольше budget секунд.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+import persistence
+from conversation import DIALOG_KEYS, INPUT_COMMENT
+from db.db import ApprovalDB
+from db.pool import ConnectionPool
+from persistence import DialogPersistence
+
+
+CONVERSATION = "enter_record"  # имя диалога ввода счёта в main.py
+
+
+def user_data(user_id):
+    """Выбор пользователя к шагу ввода комментария и временные данные, которые не сохраняются"""
+    return {
+        "chat_id": user_id,
+        "categories_digest": "3f2a9c1b7d4e5f60",
+        "sum": "125000.50",
+        "item": f"Статья {user_id % 40}",
+        "item_id": user_id % 40,
+        "group": f"Группа {user_id % 400}",
+        "group_id": user_id % 10,
+        "partner": f"ООО Партнёр {user_id}",
+        "search": "ооо",
+    }
+
+
+async def save(store, count):
+    started = time.perf_counter()
+    for user_id in range(1, count + 1):
+        await store.update_conversation(CONVERSATION, (user_id, user_id), INPUT_COMMENT)
+        await store.update_user_data(user_id, user_data(user_id))
+    collected = time.perf_counter() - started
+    await store.flush()
+    return collected, time.perf_counter() - started - collected
+
+
+async def load(store):
+    """Загрузка диалогов при запуске бота"""
+    data = await store.get_user_data()
+    states = await store.get_conversations(CONVERSATION)
+    assert len(data) == len(states)
+    return data, states
+
+
+async def measure_load(store):
+    """Время загрузки и память, занимаемая загруженными диалогами (замеряется отдельно)"""
+    started = time.perf_counter()
+    _, states = await load(store)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    loaded = await load(store)  # noqa: F841 - диалоги должны оставаться в памяти при замере
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, memory, len(states)
+
+
+async def run(count, budget):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        persistence.db = database = ApprovalDB()
+        database.pool = ConnectionPool(path, 1)
+        try:
+            await database.setup()
+            store = DialogPersistence(DIALOG_KEYS)
+            collected, written = await save(store, count)
+            loaded, memory, found = await measure_load(DialogPersistence(DIALOG_KEYS))
+        finally:
+            await database.close()
+
+        print(
+            f"{count} диалогов: передача изменений {collected:.3f} с, запись {written:.3f} с, "
+            f"загрузка {loaded:.3f} с"
+        )
+        print(
+            f"база {os.path.getsize(path) / 2**20:.1f} МБ, загруженные диалоги "
+            f"{memory / 2**20:.1f} МБ ({memory / found / 1024:.2f} КБ на диалог)"
+        )
+    return [name for name, elapsed in (("запись", written), ("загрузка", loaded)) if elapsed > budget]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dialogs", type=int, default=10_000)
+    parser.add_argument("--budget", type=float, default=2.0, help="допустимое время записи и загрузки, с")
+    args = parser.parse_args()
+
+    slow = asyncio.run(run(args.dialogs, args.budget))
+    if slow:
+        print(f"Дольше {args.budget} с: {', '.join(slow)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
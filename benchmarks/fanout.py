@@ -0,0 +1,93 @@
+"""
+Замер рассылки сообщения в несколько чатов (FanOutSender) с поддельным ботом.
+
+Запуск из корня репозитория:
+    python -m benchmarks.fanout [--recipients 50] [--latency 0.05] [--budget 2.0]
+
+Поддельный бот отвечает на send_message через latency секунд; часть чатов один раз отвечает
+RetryAfter, а один чат - ошибкой. Сравнивается последовательная отправка, как в прежнем
+send_message_to_chats, и FanOutSender с ограничениями частоты по умолчанию.
+Завершается с кодом 1, если рассылка FanOutSender дольше budget секунд.
+"""
+
+import argparse
+import asyncio
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+from fanout import FanOutSender
+
+
+RETRY_SHARE = 10  # каждый такой по счёту чат один раз отвечает RetryAfter
+RETRY_AFTER = 1  # секунды паузы в ответе RetryAfter
+
+
+class FakeBot:
+    def __init__(self, latency, failing_chat):
+        self.latency = latency
+        self.failing_chat = failing_chat
+        self.retried = set()
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        if chat_id == self.failing_chat:
+            raise BadRequest("Chat not found")
+        if chat_id % RETRY_SHARE == 0 and chat_id not in self.retried:
+            self.retried.add(chat_id)
+            raise RetryAfter(RETRY_AFTER)
+        self.sent += 1
+        return chat_id
+
+
+async def sequential(bot, chat_ids, text):
+    """Прежняя отправка по одному чату; RetryAfter повторяется после паузы"""
+    results = {}
+    for chat_id in chat_ids:
+        while True:
+            try:
+                results[chat_id] = await bot.send_message(chat_id=chat_id, text=text)
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            except Exception as e:
+                results[chat_id] = e
+            break
+    return results
+
+
+async def run(recipients, latency):
+    chat_ids = list(range(1, recipients + 1))
+    timings = {}
+    for name, send in (
+        ("последовательно", sequential),
+        ("FanOutSender", FanOutSender().send),
+    ):
+        bot = FakeBot(latency, failing_chat=recipients)
+        started = time.perf_counter()
+        results = await send(bot, chat_ids, "Заявка на одобрение")
+        timings[name] = time.perf_counter() - started
+        failed = sum(isinstance(result, Exception) for result in results.values())
+        print(
+            f"{name}: {timings[name]:.2f} с, доставлено {bot.sent}, ошибок {failed}, "
+            f"повторов после RetryAfter {len(bot.retried)}"
+        )
+    return timings["FanOutSender"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="время ответа Bot API, с")
+    parser.add_argument("--budget", type=float, default=2.0, help="допустимое время рассылки, с")
+    args = parser.parse_args()
+
+    elapsed = asyncio.run(run(args.recipients, args.latency))
+    if elapsed > args.budget:
+        print(f"Рассылка дольше {args.budget} с")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
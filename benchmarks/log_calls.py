@@ -0,0 +1,123 @@
+"""
+Замер задержки цикла событий на один вызов логгера: запись в файл напрямую и через очередь.
+
+Запуск из корня репозитория:
+    python -m benchmarks.log_calls [--records 20000] [--max-bytes 1048576] [--budget 0.001]
+
+Прежняя настройка - RotatingFileHandler и консольный обработчик на корневом логгере, запись
+и ротация файла выполняются в вызывающем потоке. Текущая - configure_logging: вызов логгера
+только ставит запись в очередь, запись выполняет фоновый поток QueueListener.
+Из корутины выполняется records вызовов logger.info; для каждого замеряется время, на которое
+он занимает цикл событий, выводятся p50, p99 и максимум. Файлы пишутся во временный каталог,
+консольный вывод отбрасывается. Малый max-bytes включает частую ротацию файла.
+Фоновый поток конкурирует с циклом событий за GIL, поэтому редкие вызовы через очередь
+тоже задерживаются; суммарная задержка цикла при этом в разы меньше.
+Завершается с кодом 1, если p99 вызова через очередь дольше budget секунд.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+from config.logging_config import (
+    LOG_FILE,
+    LOG_FORMAT,
+    LOGGER_NAME,
+    MAX_FILES,
+    BoundedQueueHandler,
+    configure_logging,
+)
+
+
+def direct_logging(max_bytes, console):
+    """Прежняя настройка: обработчики вызываются в потоке, который пишет в лог"""
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=max_bytes, backupCount=MAX_FILES, encoding="utf-8")
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    console_handler = logging.StreamHandler(console)
+    console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    console_handler.addFilter(logging.Filter(LOGGER_NAME))
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(file_handler)
+    root_logger.addHandler(console_handler)
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def queued_logging(max_bytes, console):
+    with contextlib.redirect_stderr(console):
+        return configure_logging(max_bytes=max_bytes, environ={"LOG_QUEUE_POLICY": "block"})
+
+
+def reset_logging():
+    """Снятие обработчиков корневого логгера после записи всех поставленных в очередь записей"""
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, BoundedQueueHandler):
+            handler.queue.join()
+        root_logger.removeHandler(handler)
+        handler.close()
+
+
+async def log_calls(logger, records):
+    """Время каждого вызова логгера из корутины; между вызовами цикл событий обрабатывает другие задачи"""
+    elapsed = []
+    for number in range(records):
+        started = time.perf_counter()
+        logger.info("Заявка %s одобрена пользователем %s, сумма %s", number, "@head", 125000)
+        elapsed.append(time.perf_counter() - started)
+        await asyncio.sleep(0)
+    return elapsed
+
+
+def percentile(values, share):
+    return sorted(values)[min(len(values) - 1, int(len(values) * share))]
+
+
+def run(records, max_bytes):
+    results = {}
+    initial = os.getcwd()
+    for name, setup in (("напрямую", direct_logging), ("через очередь", queued_logging)):
+        with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as console:
+            os.chdir(directory)
+            try:
+                logger = setup(max_bytes, console)
+                elapsed = asyncio.run(log_calls(logger, records))
+            finally:
+                started = time.perf_counter()
+                reset_logging()
+                written = time.perf_counter() - started
+                os.chdir(initial)
+
+        p99 = percentile(elapsed, 0.99)
+        results[name] = p99
+        print(
+            f"{name}: p50 {percentile(elapsed, 0.5) * 1e6:.1f} мкс, p99 {p99 * 1e6:.1f} мкс, "
+            f"максимум {max(elapsed) * 1e3:.2f} мс, всего {sum(elapsed):.3f} с, "
+            f"дозапись после вызовов {written:.3f} с"
+        )
+    return results["через очередь"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--max-bytes", type=int, default=1024 * 1024, help="размер файла лога до ротации")
+    parser.add_argument("--budget", type=float, default=0.001, help="допустимое время вызова (p99), с")
+    args = parser.parse_args()
+
+    p99 = run(args.records, args.max_bytes)
+    if p99 > args.budget:
+        print(f"Вызов логгера дольше {args.budget} с")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Замер постраничного поиска открытых заявок (ApprovalDB.find_open, /show_not_paid).
+
+Запуск из корня репозитория:
+    python -m benchmarks.open_approvals [--approvals 100000 1000000] [--open 100 10000] [--budget 0.05]
+
+Для каждого размера таблицы и количества открытых заявок создаётся база, остальные заявки которой
+оплачены или отклонены, и замеряется время первой страницы и обхода всех страниц.
+Время должно зависеть от количества открытых заявок, а не от размера таблицы.
+Завершается с кодом 1, если первая страница строится дольше budget секунд.
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+
+from db.db import ApprovalDB, Status
+from db.pool import ConnectionPool
+
+
+PAGE_SIZE = 11  # как в /show_not_paid: NOT_PAID_PAGE_SIZE + 1
+
+# Открытые заявки равномерно распределены по истории: каждая step-я, со статусами по кругу
+APPROVALS_SQL = """
+WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :count)
+INSERT INTO approvals
+    (id, amount, expense_item, expense_group, partner, comment, period, payment_method,
+     approvals_needed, approvals_received, status, created_at, updated_at, initiator_chat_id)
+SELECT i, 10000 + i * 7919 % 10000000, 'item' || (i % 40), 'group' || (i % 5),
+       'partner' || (i % 300), '', '10.26', 'card', 1, 0,
+       CASE WHEN i % :step = 0 THEN 1 + i / :step % 3
+            WHEN i % 2 THEN :paid ELSE :rejected END,
+       CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 1
+FROM n
+"""
+
+
+async def seed(database, count, open_count):
+    async with database:
+        conn = database._conn
+        await conn.execute("BEGIN IMMEDIATE")
+        await conn.execute(
+            APPROVALS_SQL,
+            {
+                "count": count,
+                "step": max(1, count // open_count),
+                "paid": int(Status.PAID),
+                "rejected": int(Status.REJECTED),
+            },
+        )
+        await conn.commit()
+        await conn.execute("ANALYZE")
+
+
+async def first_page(database):
+    started = time.perf_counter()
+    async with database:
+        rows = [row async for row in database.find_open(PAGE_SIZE)]
+    return time.perf_counter() - started, len(rows)
+
+
+async def all_pages(database):
+    started = time.perf_counter()
+    total = 0
+    after_id = 0
+    async with database:
+        while True:
+            rows = [row async for row in database.find_open(PAGE_SIZE, after_id)]
+            total += len(rows)
+            if len(rows) < PAGE_SIZE:
+                break
+            after_id = rows[-1].id
+    return time.perf_counter() - started, total
+
+
+async def run(counts, open_counts, budget):
+    slow = []
+    for count, open_count in itertools.product(counts, open_counts):
+        with tempfile.TemporaryDirectory() as directory:
+            database = ApprovalDB()
+            database.pool = ConnectionPool(os.path.join(directory, "benchmark.db"), 1)
+            try:
+                await database.setup()
+                await seed(database, count, open_count)
+
+                page = min([(await first_page(database))[0] for _ in range(3)])
+                elapsed, found = await all_pages(database)
+                print(
+                    f"{count} заявок, открытых {found}: первая страница {page * 1000:.2f} мс, "
+                    f"все страницы {elapsed:.3f} с"
+                )
+                if page > budget:
+                    slow.append(f"{count} заявок, {open_count} открытых")
+            finally:
+                await database.close()
+    return slow
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--approvals", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--open", type=int, nargs="+", default=[100, 10_000])
+    parser.add_argument("--budget", type=float, default=0.05, help="допустимое время страницы, с")
+    args = parser.parse_args()
+
+    slow = asyncio.run(run(args.approvals, args.open, args.budget))
+    if slow:
+        print(f"Дольше {args.budget} с: {', '.join(slow)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
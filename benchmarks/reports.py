@@ -0,0 +1,132 @@
+"""
+Замер времени запросов /report на синтетической истории заявок.
+
+Запуск из корня репозитория:
+    python -m benchmarks.reports [--approvals 1000000] [--days 30] [--budget 1.0]
+
+База создаётся миграциями db.migrations: история заявок и журнал согласований заполняются
+до миграции add_event_durations, поэтому длительности этапов рассчитывает она же.
+Завершается с кодом 1, если какой-либо отчёт строится дольше budget секунд.
+В уменьшенном масштабе запускается вместе с тестами (tests/test_reports.py).
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from db.db import since
+from db.migrations import MIGRATIONS, add_event_durations, migrate
+from db.pool import ConnectionPool
+from db.reports import BACKLOG_OLDEST_QUERY, BACKLOG_QUERY, SLA_QUERY, TOTALS_QUERY
+
+
+HISTORY_DAYS = 365  # период синтетической истории
+
+# Заявки: равномерно за HISTORY_DAYS дней; статус по остатку id от деления на 8:
+# 0 - не обработана, 1 - ждёт финансовый отдел, 2 - одобрена, 3 - отклонена, остальные оплачены
+APPROVALS_SQL = """
+WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :count)
+INSERT INTO approvals
+    (id, amount, expense_item, expense_group, partner, comment, period, payment_method,
+     approvals_needed, approvals_received, status, created_at, updated_at, initiator_chat_id)
+SELECT i, 10000 + i * 7919 % 10000000, 'item' || (i % 40), 'group' || (i % 5),
+       'partner' || (i % 300), '', '10.26', 'card', 2,
+       CASE i % 8 WHEN 0 THEN 0 WHEN 1 THEN 1 WHEN 3 THEN 1 ELSE 2 END,
+       CASE i % 8 WHEN 0 THEN 1 WHEN 1 THEN 2 WHEN 2 THEN 3 WHEN 3 THEN 5 ELSE 4 END,
+       datetime(:now - (:count - i) * :span / :count, 'unixepoch'),
+       datetime(:now - (:count - i) * :span / :count, 'unixepoch'),
+       1
+FROM n
+"""
+
+# События в порядке действий: апрув руководителя, затем финансового отдела или отклонение,
+# затем оплата; каждое - через псевдослучайное время до суток (оплата - до трёх) после создания
+EVENTS_SQL = (
+    """INSERT INTO approval_events (approval_id, username, department, action, created_at)
+       SELECT id, '@head' || (id % 3), 'head', 'approve',
+              datetime(created_at, '+' || (id * 2654435761 % 86400) || ' seconds')
+       FROM approvals WHERE status != 1""",
+    """INSERT INTO approval_events (approval_id, username, department, action, created_at)
+       SELECT id, '@finance' || (id % 4), 'finance', 'approve',
+              datetime(created_at, '+' || (86400 + id * 40503 % 86400) || ' seconds')
+       FROM approvals WHERE status IN (3, 4)""",
+    """INSERT INTO approval_events (approval_id, username, department, action, created_at)
+       SELECT id, '@finance' || (id % 4), NULL, 'reject',
+              datetime(created_at, '+' || (86400 + id * 40503 % 86400) || ' seconds')
+       FROM approvals WHERE status = 5""",
+    """INSERT INTO approval_events (approval_id, username, department, action, created_at)
+       SELECT id, '@payer' || (id % 2), 'payers', 'pay',
+              datetime(created_at, '+' || (172800 + id * 97 % 259200) || ' seconds')
+       FROM approvals WHERE status = 4""",
+)
+
+
+async def build_history(conn, count):
+    """Схема до add_event_durations, синтетическая история и оставшиеся миграции"""
+    for number, migration in enumerate(MIGRATIONS[: MIGRATIONS.index(add_event_durations)], 1):
+        await migration(conn)
+        if not conn.in_transaction:
+            await conn.execute("BEGIN IMMEDIATE")
+        await conn.execute(f"PRAGMA user_version = {number}")
+        await conn.commit()
+
+    await conn.execute("BEGIN IMMEDIATE")
+    params = {"count": count, "now": int(time.time()), "span": HISTORY_DAYS * 86400}
+    await conn.execute(APPROVALS_SQL, params)
+    for query in EVENTS_SQL:
+        await conn.execute(query)
+    await conn.commit()
+    await migrate(conn)
+
+
+async def timed_query(conn, query, params):
+    started = time.perf_counter()
+    result = await conn.execute(query, params)
+    await result.fetchall()
+    return time.perf_counter() - started
+
+
+async def run(count, days, budget):
+    with tempfile.TemporaryDirectory() as directory:
+        pool = ConnectionPool(os.path.join(directory, "benchmark.db"), 1)
+        conn = await pool.acquire()
+        try:
+            started = time.perf_counter()
+            await build_history(conn, count)
+            print(f"История из {count} заявок: {time.perf_counter() - started:.1f} с")
+
+            reports = (
+                ("sla", SLA_QUERY, {"since": since(days)}),
+                ("backlog", BACKLOG_QUERY, {}),
+                ("backlog oldest", BACKLOG_OLDEST_QUERY, {"limit": 3}),
+                ("totals", TOTALS_QUERY, {"since": since(days)}),
+            )
+            slow = []
+            for name, query, params in reports:
+                elapsed = min([await timed_query(conn, query, params) for _ in range(3)])
+                print(f"{name}: {elapsed:.3f} с")
+                if elapsed > budget:
+                    slow.append(name)
+        finally:
+            await pool.release(conn)
+            await pool.close()
+    return slow
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--approvals", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=30, help="период отчётов sla и totals")
+    parser.add_argument("--budget", type=float, default=1.0, help="допустимое время отчёта, с")
+    args = parser.parse_args()
+
+    slow = asyncio.run(run(args.approvals, args.days, args.budget))
+    if slow:
+        print(f"Дольше {args.budget} с: {', '.join(slow)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
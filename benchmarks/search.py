@@ -0,0 +1,103 @@
+"""
+Замер нечёткого поиска категорий по триграммам (TripleIndex).
+
+Запуск из корня репозитория:
+    python -m benchmarks.search [--triples 10000 100000] [--queries 1000] [--budget 0.05]
+
+Для каждого размера строится индекс троек (статья, группа, партнёр), замеряется полное построение,
+обновление после изменения 1% партнёров и время запросов: названий партнёров с опечаткой,
+названий статей и частых слов вроде "ООО". Выводятся p50 и p99 времени запроса.
+Завершается с кодом 1, если p99 запроса на каком-либо размере дольше budget секунд.
+"""
+
+import argparse
+import random
+import time
+
+from categories import GROUP_COLUMN, ITEM_COLUMN, PARTNER_COLUMN, build_category_index
+from search import TripleIndex
+
+
+SYLLABLES = (
+    "ал", "бе", "ви", "го", "да", "ер", "жи", "зо", "ка", "ли", "мо",
+    "ны", "ор", "пе", "ра", "со", "ту", "фа", "хи", "це", "ча", "ше",
+)  # fmt: skip
+FORMS = ("ООО", "АО", "ИП", "ПАО")
+
+
+def partner_name(rng):
+    name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 5))).capitalize()
+    return f"{rng.choice(FORMS)} {name}"
+
+
+def categories(count, rng, partners=None):
+    """Индекс категорий из count строк: 40 статей, по 10 групп в каждой, остальное - партнёры"""
+    partners = partners or [partner_name(rng) for _ in range(count)]
+    rows = [[ITEM_COLUMN, GROUP_COLUMN, PARTNER_COLUMN]]
+    for number, partner in enumerate(partners):
+        item = number % 40
+        rows.append([f"Статья {item}", f"Группа {item}.{number // 40 % 10}", partner])
+    return build_category_index(rows), partners
+
+
+def typo(text, rng):
+    position = rng.randrange(len(text))
+    return text[:position] + text[position + 1 :]
+
+
+def percentile(values, share):
+    return sorted(values)[min(len(values) - 1, int(len(values) * share))]
+
+
+def run(sizes, query_count, budget):
+    rng = random.Random(1)
+    slow = []
+    for count in sizes:
+        index = TripleIndex()
+        tree, partners = categories(count, rng)
+        started = time.perf_counter()
+        index.sync(tree)
+        built = time.perf_counter() - started
+
+        changed = list(partners)
+        for number in rng.sample(range(count), max(1, count // 100)):
+            changed[number] = partner_name(rng)
+        updated_tree, _ = categories(count, rng, changed)
+        started = time.perf_counter()
+        index.sync(updated_tree)
+        updated = time.perf_counter() - started
+
+        queries = [typo(rng.choice(changed), rng) for _ in range(query_count)]
+        queries += [f"статья {rng.randrange(40)}" for _ in range(query_count // 10)]
+        queries += ["ооо"] * (query_count // 10)
+        elapsed = []
+        for text in queries:
+            started = time.perf_counter()
+            index.search(text)
+            elapsed.append(time.perf_counter() - started)
+
+        p50, p99 = percentile(elapsed, 0.5), percentile(elapsed, 0.99)
+        print(
+            f"{count} троек: построение {built:.2f} с, обновление 1% {updated:.3f} с, "
+            f"запрос p50 {p50 * 1000:.2f} мс, p99 {p99 * 1000:.2f} мс"
+        )
+        if p99 > budget:
+            slow.append(f"{count} троек")
+    return slow
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--triples", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--budget", type=float, default=0.05, help="допустимое время запроса (p99), с")
+    args = parser.parse_args()
+
+    slow = run(args.triples, args.queries, args.budget)
+    if slow:
+        print(f"Дольше {args.budget} с: {', '.join(slow)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Замер пропускной способности приёма обновлений через вебхук (WebhookServer.receive_update).
+
+Запуск из корня репозитория:
+    python -m benchmarks.webhook [--updates updates.jsonl] [--count 5000] [--connections 16] [--budget 500]
+
+Обновления из файла (по одному JSON-объекту Telegram Update в строке, например записанные
+из журнала вебхука) или синтетические сообщения и нажатия кнопок отправляются POST-запросами
+на встроенный HTTP-сервер через connections одновременных соединений. Замеряется число
+обновлений в секунду от первого запроса до появления последнего обновления в очереди приложения.
+Сеть и Bot API не используются. Завершается с кодом 1, если принято меньше budget обновлений в секунду.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+
+# Настройки читаются при первом обращении к Config: вебхук слушает свободный локальный порт
+SECRET = "benchmark"
+BENCHMARK_ENV = {
+    "TELEGRAM_BOT_TOKEN": "123:benchmark",
+    "GOOGLE_SHEETS_SPREADSHEET_ID": "benchmark",
+    "DATABASE_PATH": "benchmark.db",
+    "GOOGLE_SHEETS_CREDENTIALS_FILE": "credentials.json",
+    "GOOGLE_SHEETS_CATEGORIES_SHEET_ID": "1",
+    "GOOGLE_SHEETS_RECORDS_SHEET_ID": "0",
+    "DEPARTMENT_HEAD_CHAT_ID": "1",
+    "FINANCE_CHAT_IDS": "2",
+    "PAYERS_CHAT_IDS": "3",
+}
+for name, value in BENCHMARK_ENV.items():
+    os.environ.setdefault(name, value)
+os.environ.update(WEBHOOK_LISTEN="127.0.0.1", WEBHOOK_PORT="0", WEBHOOK_SECRET_TOKEN=SECRET)
+
+from telegram.ext import ApplicationBuilder  # noqa: E402
+
+from config.config import Config  # noqa: E402
+from webhook import WebhookServer  # noqa: E402
+
+
+CHATS = 200  # чатов в синтетических обновлениях
+
+
+def synthetic_updates(count):
+    """Текстовые сообщения и нажатия кнопок "Одобрить" из CHATS чатов"""
+    updates = []
+    for update_id in range(1, count + 1):
+        chat = {"id": update_id % CHATS + 1, "type": "private", "first_name": "Test"}
+        user = {"id": chat["id"], "is_bot": False, "first_name": "Test"}
+        message = {"message_id": update_id, "date": 1760000000, "chat": chat, "from": user}
+        if update_id % 3:
+            updates.append({"update_id": update_id, "message": {**message, "text": "/start"}})
+        else:
+            query = {
+                "id": str(update_id),
+                "from": user,
+                "chat_instance": "1",
+                "data": f"approval_head_approve_{update_id}_",
+                "message": message,
+            }
+            updates.append({"update_id": update_id, "callback_query": query})
+    return updates
+
+
+def recorded_updates(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+async def post(port, body):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"POST {Config.webhook_path} HTTP/1.1\r\n"
+        "Host: 127.0.0.1\r\n"
+        "Content-Type: application/json\r\n"
+        f"X-Telegram-Bot-Api-Secret-Token: {SECRET}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1")
+        + body
+    )
+    await writer.drain()
+    status_line = (await reader.read()).split(b"\r\n", 1)[0]
+    writer.close()
+    return status_line.split(b" ")[1] == b"200"
+
+
+async def run(updates, connections):
+    application = ApplicationBuilder().token(Config.telegram_bot_token).build()
+    webhook = WebhookServer(application)
+    await webhook.server.start()
+    port = webhook.server._server.sockets[0].getsockname()[1]
+    bodies = [json.dumps(update).encode("utf-8") for update in updates]
+    pending = iter(bodies)
+
+    async def client():
+        rejected = 0
+        for body in pending:
+            rejected += not await post(port, body)
+        return rejected
+
+    async def consume():
+        for _ in bodies:
+            await application.update_queue.get()
+
+    try:
+        started = time.perf_counter()
+        consumer = asyncio.create_task(consume())
+        rejected = sum(await asyncio.gather(*(client() for _ in range(connections))))
+        if rejected:
+            consumer.cancel()
+            raise RuntimeError(f"Вебхук отклонил {rejected} обновлений")
+        await consumer
+        elapsed = time.perf_counter() - started
+    finally:
+        await webhook.server.stop()
+
+    rate = len(bodies) / elapsed
+    print(f"{len(bodies)} обновлений, {connections} соединений: {elapsed:.2f} с, {rate:.0f} обновлений/с")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--updates", help="файл с записанными обновлениями, по одному JSON в строке")
+    parser.add_argument("--count", type=int, default=5000, help="число синтетических обновлений")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--budget", type=float, default=500, help="минимум обновлений в секунду")
+    args = parser.parse_args()
+
+    updates = recorded_updates(args.updates) if args.updates else synthetic_updates(args.count)
+    rate = asyncio.run(run(updates, args.connections))
+    if rate < args.budget:
+        print(f"Меньше {args.budget:.0f} обновлений в секунду")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,128 @@
-from os import getenv
+import os
+from dataclasses import dataclass
+from functools import lru_cache
 
 from dotenv import load_dotenv
 
-load_dotenv()
 
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Настройки проекта из переменных окружения"""
 
-class Config:
-    """Класс-конфиг для проекта"""
+    telegram_bot_token: str
+    google_sheets_spreadsheet_id: str
+    database_path: str
+    database_pool_size: int
+    google_sheets_credentials_file: str
+    google_sheets_categories_sheet_id: str
+    google_sheets_records_sheet_id: str
+    department_head_chat_id: list
+    finance_chat_ids: list
+    payers_chat_ids: list
+    developer_chat_id: str
+    categories_cache_ttl: int
+    metrics_host: str
+    metrics_port: int
+    update_mode: str
+    webhook_url: str | None
+    webhook_secret_token: str | None
+    webhook_listen: str
+    webhook_port: int
+    webhook_path: str
+    max_concurrent_updates: int
 
-    telegram_bot_token = getenv("TELEGRAM_BOT_TOKEN")
-    google_sheets_spreadsheet_id = getenv("GOOGLE_SHEETS_SPREADSHEET_ID")
-    database_path = getenv("DATABASE_PATH")
-    google_sheets_credentials_file = getenv("GOOGLE_SHEETS_CREDENTIALS_FILE")
-    google_sheets_categories_sheet_id = getenv("GOOGLE_SHEETS_CATEGORIES_SHEET_ID")
-    google_sheets_records_sheet_id = getenv("GOOGLE_SHEETS_RECORDS_SHEET_ID")
-    department_head_chat_id = list(map(int, getenv("DEPARTMENT_HEAD_CHAT_ID").split(",")))
-    finance_chat_ids = list(map(int, getenv("FINANCE_CHAT_IDS").split(",")))
-    payers_chat_ids = list(map(int, getenv("PAYERS_CHAT_IDS").split(",")))
-    developer_chat_id = getenv("DEVELOPER_CHAT_ID")
+
+class EnvReader:
+    """Чтение переменных окружения с накоплением ошибок, чтобы сообщить обо всех сразу"""
+
+    def __init__(self, environ):
+        self.environ = environ
+        self.errors = []
+
+    def text(self, name, default=None, required=False):
+        value = self.environ.get(name, default)
+        if required and not value:
+            self.errors.append(f"{name}: не задана")
+        return value
+
+    def integer(self, name, default):
+        value = self.environ.get(name)
+        if value is None:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            self.errors.append(f"{name}: ожидается целое число, получено {value!r}")
+            return default
+
+    def ids(self, name):
+        value = self.text(name, required=True)
+        if not value:
+            return []
+        try:
+            return [int(chat_id) for chat_id in value.split(",")]
+        except ValueError:
+            self.errors.append(f"{name}: ожидается список id через запятую, получено {value!r}")
+            return []
+
+
+def load_config(environ=None) -> Settings:
+    """
+    Разбор и проверка настроек из окружения (по умолчанию os.environ и файл .env).
+    Выбрасывает RuntimeError со списком всех ошибочных переменных.
+    """
+    if environ is None:
+        load_dotenv()
+        environ = os.environ
+
+    env = EnvReader(environ)
+    settings = Settings(
+        telegram_bot_token=env.text("TELEGRAM_BOT_TOKEN", required=True),
+        google_sheets_spreadsheet_id=env.text("GOOGLE_SHEETS_SPREADSHEET_ID", required=True),
+        database_path=env.text("DATABASE_PATH", required=True),
+        database_pool_size=env.integer("DATABASE_POOL_SIZE", 4),
+        google_sheets_credentials_file=env.text("GOOGLE_SHEETS_CREDENTIALS_FILE", required=True),
+        google_sheets_categories_sheet_id=env.text("GOOGLE_SHEETS_CATEGORIES_SHEET_ID", required=True),
+        google_sheets_records_sheet_id=env.text("GOOGLE_SHEETS_RECORDS_SHEET_ID", required=True),
+        department_head_chat_id=env.ids("DEPARTMENT_HEAD_CHAT_ID"),
+        finance_chat_ids=env.ids("FINANCE_CHAT_IDS"),
+        payers_chat_ids=env.ids("PAYERS_CHAT_IDS"),
+        developer_chat_id=env.text("DEVELOPER_CHAT_ID"),
+        categories_cache_ttl=env.integer("CATEGORIES_CACHE_TTL", 300),
+        metrics_host=env.text("METRICS_HOST", "127.0.0.1"),
+        metrics_port=env.integer("METRICS_PORT", 9100),
+        update_mode=env.text("UPDATE_MODE", "polling"),
+        webhook_url=env.text("WEBHOOK_URL"),
+        webhook_secret_token=env.text("WEBHOOK_SECRET_TOKEN"),
+        webhook_listen=env.text("WEBHOOK_LISTEN", "0.0.0.0"),
+        webhook_port=env.integer("WEBHOOK_PORT", 8443),
+        webhook_path=env.text("WEBHOOK_PATH", "/telegram"),
+        max_concurrent_updates=env.integer("MAX_CONCURRENT_UPDATES", 16),
+    )
+    if settings.update_mode not in ("polling", "webhook"):
+        env.errors.append(f"UPDATE_MODE: ожидается polling или webhook, получено {settings.update_mode!r}")
+    if settings.database_pool_size < 1:
+        env.errors.append(f"DATABASE_POOL_SIZE: ожидается положительное число, получено {settings.database_pool_size}")
+    if settings.max_concurrent_updates < 1:
+        env.errors.append(
+            f"MAX_CONCURRENT_UPDATES: ожидается положительное число, получено {settings.max_concurrent_updates}"
+        )
+    if env.errors:
+        raise RuntimeError("Неверная конфигурация:\n" + "\n".join(env.errors))
+    return settings
+
+
+@lru_cache(maxsize=1)
+def get_config() -> Settings:
+    """Настройки проекта. Загружаются и проверяются один раз при первом обращении."""
+    return load_config()
+
+
+class LazyConfig:
+    """Доступ к настройкам как к атрибутам: Config.database_path. Окружение читается при первом обращении."""
+
+    def __getattr__(self, name):
+        return getattr(get_config(), name)
+
+
+Config = LazyConfig()
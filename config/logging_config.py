@@ -1,39 +1,135 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
 
+from config.config import EnvReader
+
 
-LOG_LEVEL = "INFO"
 LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
 LOG_FILE = "logs/app.log"
 MAX_SIZE = 10 * 1024 * 1024
 MAX_FILES = 5
+LOG_QUEUE_SIZE = 10000  # максимальное количество записей в очереди по умолчанию
+LOG_QUEUE_POLICIES = ("drop", "block")  # drop - отбрасывать записи при переполнении, block - ждать
+
+LOGGER_NAME = "budget_automation_bot"
+
+
+@dataclass(frozen=True, slots=True)
+class LogSettings:
+    """Настройки логирования из переменных окружения"""
+
+    level: str
+    queue_size: int
+    queue_policy: str
+    json: bool  # вывод в файл в формате JSON lines
+
+
+def load_log_settings(environ=None) -> LogSettings:
+    """
+    Разбор и проверка LOG_LEVEL, LOG_QUEUE_SIZE, LOG_QUEUE_POLICY и LOG_JSON (по умолчанию из os.environ).
+    Выбрасывает RuntimeError со списком всех ошибочных переменных.
+    """
+    env = EnvReader(os.environ if environ is None else environ)
+    settings = LogSettings(
+        level=env.text("LOG_LEVEL", "INFO").upper(),
+        queue_size=env.integer("LOG_QUEUE_SIZE", LOG_QUEUE_SIZE),
+        queue_policy=env.text("LOG_QUEUE_POLICY", "drop"),
+        json=env.text("LOG_JSON", "false").lower() in ("1", "true", "yes"),
+    )
+    if not isinstance(logging.getLevelName(settings.level), int):
+        env.errors.append(f"LOG_LEVEL: неизвестный уровень {settings.level!r}")
+    if settings.queue_size <= 0:
+        env.errors.append(f"LOG_QUEUE_SIZE: ожидается положительное число, получено {settings.queue_size}")
+    if settings.queue_policy not in LOG_QUEUE_POLICIES:
+        env.errors.append(
+            f"LOG_QUEUE_POLICY: ожидается drop или block, получено {settings.queue_policy!r}"
+        )
+    if env.errors:
+        raise RuntimeError("Неверная настройка логирования:\n" + "\n".join(env.errors))
+    return settings
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирование записи лога в одну строку JSON"""
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Передаёт записи лога в ограниченную очередь без форматирования.
+    Форматирование и запись выполняются в фоновом потоке QueueListener.
+    При переполнении очереди запись отбрасывается (drop) или ожидает места (block).
+    """
+
+    def __init__(self, log_queue, block=False):
+        super().__init__(log_queue)
+        self.block = block
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self.block:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(max_bytes=MAX_SIZE, backup_count=MAX_FILES, environ=None):
+    """
+    Обработчик логгирования в проекте. Вызывается один раз при запуске бота:
+    до этого импорт модулей не создаёт файлов и фоновых потоков и не читает окружение.
+    """
+    settings = load_log_settings(environ)
+    level = logging.getLevelName(settings.level)
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
-def configure_logging(max_bytes=MAX_SIZE, backup_count=MAX_FILES):
-    """Обработчик логгирования в проекте"""
     # Создаем обработчик файлового логгера
     file_handler = RotatingFileHandler(LOG_FILE, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
-    file_handler.setLevel(logging.getLevelName(LOG_LEVEL))
-    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
-
-    # Настраиваем корневой логгер
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.getLevelName(LOG_LEVEL))
-    root_logger.addHandler(file_handler)
+    file_handler.setLevel(level)
+    file_handler.setFormatter(JsonFormatter() if settings.json else logging.Formatter(LOG_FORMAT))
 
-    # Создаем потоковый обработчик для консоли
+    # Создаем потоковый обработчик для консоли только для логгера бота
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.getLevelName(LOG_LEVEL))
+    console_handler.setLevel(level)
     console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    console_handler.addFilter(logging.Filter(LOGGER_NAME))
 
-    # Создаем глобальный логгер
-    logger = logging.getLogger("budget_automation_bot")
-    logger.setLevel(logging.getLevelName(LOG_LEVEL))
-    logger.addHandler(console_handler)
+    # Запись в файл и консоль выполняется в фоновом потоке
+    log_queue = queue.Queue(maxsize=settings.queue_size)
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
 
-    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    # Настраиваем корневой логгер
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    root_logger.addHandler(BoundedQueueHandler(log_queue, block=settings.queue_policy == "block"))
+
+    # Создаем глобальный логгер
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
 
     return logger
 
 
-logger = configure_logging()
+logger = logging.getLogger(LOGGER_NAME)
@@ -1,10 +1,5 @@
-import asyncio
+from .db import ApprovalDB, ApprovalRow, Status
 
-from .db import ApprovalDB
 
-
-__all__ = ["db"]
+__all__ = ["db", "ApprovalRow", "Status"]
 db = ApprovalDB()
-
-loop = asyncio.get_event_loop()
-loop.run_until_complete(db.create_table())
\ No newline at end of file
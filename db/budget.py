@@ -0,0 +1,94 @@
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from config.logging_config import logger
+from .values import Status, from_minor
+
+
+SHARE_PRECISION = Decimal("0.0000000001")  # точность суммы на месяц начисления в листе записей
+REBUILD_CHUNK = 5000  # заявок, читаемых за раз при перестроении сводки бюджета
+
+BUDGET_UPSERT = (
+    "INSERT INTO budget_rollup "
+    "(month, expense_item, expense_group, partner, payment_method, amount, payments) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT DO UPDATE SET amount = decimal_add(amount, excluded.amount), "
+    "payments = payments + excluded.payments"
+)
+
+
+def decimal_add(a, b) -> str:
+    """Сумма двух десятичных чисел, хранящихся текстом. Регистрируется в SQLite как decimal_add."""
+    return str(Decimal(a) + Decimal(b))
+
+
+def period_months(period) -> list[datetime]:
+    """
+    Первые дни месяцев начисления из периода "mm.yy mm.yy ...".
+    Выбрасывает ValueError при неверном или пустом периоде.
+    """
+    months = [datetime.strptime(f"01.{month}", "%d.%m.%y") for month in (period or "").split()]
+    if not months:
+        raise ValueError(f"Не указаны месяцы начисления: {period!r}")
+    return months
+
+
+def month_share(amount, months) -> Decimal:
+    """Сумма счёта amount на один из months месяцев начисления, округлённая как в листе записей"""
+    return (Decimal(amount) / Decimal(months)).quantize(SHARE_PRECISION, rounding=ROUND_HALF_UP)
+
+
+def budget_rows(amount, expense_item, expense_group, partner, period, payment_method) -> list:
+    """
+    Строки сводки бюджета для одного оплаченного счёта: по строке на месяц начисления
+    (месяц "YYYY-MM", статья, группа, партнёр, форма оплаты, сумма текстом, 1).
+    """
+    months = period_months(period)
+    share = str(month_share(amount, len(months)))
+    return [
+        (
+            month.strftime("%Y-%m"),
+            expense_item or "",
+            expense_group or "",
+            partner or "",
+            payment_method or "",
+            share,
+            1,
+        )
+        for month in months
+    ]
+
+
+async def rebuild_budget(conn, chunk_size=REBUILD_CHUNK) -> int:
+    """
+    Пересчёт сводки бюджета по всем оплаченным заявкам за один проход по таблице заявок.
+    Выполняется в текущей транзакции conn. Возвращает количество учтённых заявок.
+    """
+    totals = {}
+    count = 0
+    skipped = 0
+    cursor = await conn.execute(
+        "SELECT amount, expense_item, expense_group, partner, period, payment_method "
+        f"FROM approvals WHERE status = {int(Status.PAID)}"
+    )
+    while rows := await cursor.fetchmany(chunk_size):
+        for amount, *fields in rows:
+            try:
+                rollup = budget_rows(from_minor(amount), *fields)
+            except ValueError:
+                skipped += 1
+                continue
+            for *key, share, payments in rollup:
+                total = totals.setdefault(tuple(key), [Decimal(0), 0])
+                total[0] += Decimal(share)
+                total[1] += payments
+            count += 1
+    if skipped:
+        logger.warning("Заявок с неверным периодом начисления не учтено в сводке бюджета: %s", skipped)
+
+    await conn.execute("DELETE FROM budget_rollup")
+    await conn.executemany(
+        BUDGET_UPSERT,
+        [(*key, str(amount), payments) for key, (amount, payments) in totals.items()],
+    )
+    return count
@@ -1,149 +1,722 @@
-import aiosqlite
+import asyncio
+import time
+from contextvars import ContextVar
+from decimal import Decimal
+from functools import cached_property
+from typing import NamedTuple
 
 from config.config import Config
 from config.logging_config import logger
+from metrics import timed
+from .budget import BUDGET_UPSERT, budget_rows, rebuild_budget
+from .migrations import migrate
+from .pool import ConnectionPool
+from .reports import BACKLOG_OLDEST_QUERY, BACKLOG_QUERY, SLA_QUERY, TOTALS_QUERY
+from .values import OPEN_STATUSES_SQL, Status, from_minor, to_minor
+
+
+APPROVAL_COLUMNS = (
+    "id",
+    "amount",
+    "expense_item",
+    "expense_group",
+    "partner",
+    "comment",
+    "period",
+    "payment_method",
+    "approvals_needed",
+    "approvals_received",
+    "status",
+    "created_at",
+    "updated_at",
+    "initiator_chat_id",
+)
+
+
+class ApprovalRow(NamedTuple):
+    """Компактная запись заявки"""
+
+    id: int
+    amount: Decimal
+    expense_item: str
+    expense_group: str
+    partner: str
+    comment: str
+    period: str
+    payment_method: str
+    approvals_needed: int
+    approvals_received: int
+    status: Status
+    created_at: str | None
+    updated_at: str | None
+    initiator_chat_id: int | None
+
+
+def since(days) -> str:
+    """Начало периода в days дней в формате столбцов created_at и updated_at (UTC)"""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - days * 86400))
+
+
+def approval_row(row) -> ApprovalRow:
+    """Запись заявки из строки таблицы 'approvals' с суммой в рублях и статусом Status"""
+    row = ApprovalRow._make(row)
+    return row._replace(amount=from_minor(row.amount), status=Status(row.status))
+
+
+def approval_record(row) -> dict:
+    """То же, что approval_row, в виде словаря"""
+    return approval_row(row)._asdict()
+
+
+def record_params(record) -> list:
+    """Значения записи для вставки в таблицу 'approvals' в порядке полей записи"""
+    return [to_minor(value) if key == "amount" else value for key, value in record.items()]
+
+
+def transition_query(count):
+    """Запрос смены статуса count заявок (см. ApprovalDB.transition)"""
+    return (
+        "UPDATE approvals SET "
+        "approvals_received = approvals_received + ?, "
+        "status = CASE WHEN ? AND approvals_received + 1 < approvals_needed "
+        "THEN ? ELSE ? END, "
+        "updated_at = CURRENT_TIMESTAMP "
+        f"WHERE id IN ({', '.join('?' * count)}) AND status = ? RETURNING *"
+    )
+
+
+def transition_params(approval_ids, expected_status, new_status):
+    approve = new_status == Status.APPROVED
+    return (int(approve), approve, Status.PENDING, new_status, *approval_ids, expected_status)
+
+
+EVENT_COLUMNS = ("id", "approval_id", "username", "department", "action", "created_at")
+
+# Запись события журнала согласований с длительностями для отчёта /report sla:
+# wait_seconds - от предыдущего действия с заявкой (или её создания) до этого действия,
+# approve_seconds - от создания заявки до одобрения, только у апрува, завершившего одобрение.
+EVENT_INSERT = """
+INSERT INTO approval_events
+    (approval_id, username, department, action, wait_seconds, approve_seconds)
+SELECT id, ?, ?, ?,
+       (julianday(CURRENT_TIMESTAMP) - julianday(COALESCE(
+           (SELECT MAX(created_at) FROM approval_events WHERE approval_id = approvals.id),
+           created_at))) * 86400,
+       CASE WHEN ? THEN (julianday(CURRENT_TIMESTAMP) - julianday(created_at)) * 86400 END
+FROM approvals
+WHERE id = ?
+"""
+
+
+def transition_action(new_status) -> str:
+    """Действие журнала согласований для смены статуса на new_status"""
+    return "approve" if new_status == Status.APPROVED else "reject"
+
+
+# Соединение, выданное текущей корутине, и глубина вложенных "async with db"
+_lease = ContextVar("approval_db_lease", default=None)
 
 
 class ApprovalDB:
-    """База данных для хранения данных о заявке"""
+    """
+    База данных для хранения данных о заявке.
+    Каждая корутина внутри "async with db" получает собственное соединение из пула.
+    """
 
     def __init__(self):
-        self.db_file = Config.database_path
+        self._ready = False
+        self._setup_lock = asyncio.Lock()
+
+    @cached_property
+    def pool(self):
+        """Пул соединений. Создаётся при первом обращении, а не при импорте модуля."""
+        return ConnectionPool(Config.database_path, Config.database_pool_size)
+
+    async def setup(self):
+        """
+        Открытие пула и создание таблиц при запуске бота.
+        Выполняется один раз; одновременные вызовы ждут первого.
+        """
+        async with self._setup_lock:
+            if not self._ready:
+                await self.open()
+                await self.migrate()
+                self._ready = True
+
+    async def open(self):
+        """Открытие пула соединений при запуске бота"""
+        await self.pool.open()
+
+    async def close(self):
+        """Закрытие пула соединений при остановке бота"""
+        await self.pool.close()
+
+    async def ping(self):
+        """Проверка доступности базы данных"""
+        await self.pool.ping()
+
+    @property
+    def _conn(self):
+        lease = _lease.get()
+        if lease is None:
+            raise RuntimeError("Обращение к базе данных вне блока 'async with db'.")
+        return lease[0]
 
     async def __aenter__(self):
-        self._conn = await aiosqlite.connect(self.db_file)
-        self._cursor = await self._conn.cursor()
-        logger.info("Connected to database.")
+        lease = _lease.get()
+        if lease is not None:
+            _lease.set((lease[0], lease[1] + 1))
+            return self
+
+        conn = await self.pool.acquire()
+        _lease.set((conn, 0))
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self._conn:
-            await self._conn.close()
-            logger.info("Disconnected from database.")
-        return True
+        conn, depth = _lease.get()
+        if depth:
+            _lease.set((conn, depth - 1))
+            return False
 
-    async def create_table(self):
-        """Создает таблицу 'approvals', если она еще не существует."""
+        _lease.set(None)
+        await self.pool.release(conn)
+        return False
+
+    async def migrate(self):
+        """Приводит схему базы данных к текущей версии (см. db.migrations)."""
         async with self:
-            await self._cursor.execute(
-                'SELECT name FROM sqlite_master WHERE type="table" AND name="approvals";'
-            )
-            table_exists = await self._cursor.fetchone()
-
-        if not table_exists:
-            await self._cursor.execute(
-                """CREATE TABLE IF NOT EXISTS approvals
-                                          (id INTEGER PRIMARY KEY, 
-                                           amount REAL, 
-                                           expense_item TEXT, 
-                                           expense_group TEXT, 
-                                           partner TEXT, 
-                                           comment TEXT,
-                                           period TEXT, 
-                                           payment_method TEXT, 
-                                           approvals_needed INTEGER, 
-                                           approvals_received INTEGER,
-                                           status TEXT,
-                                           approved_by TEXT)"""
-            )
-            await self._conn.commit()
-            logger.info("Таблица 'approvals' создана.")
-        else:
-            logger.info("Таблица 'approvals' уже существует.")
+            await migrate(self._conn)
+            logger.info("Схема базы данных актуальна.")
 
+    @timed("db")
     async def insert_record(self, record):
         """
         Вставляет новую запись в таблицу 'approvals'.
         """
         try:
-            await self._cursor.execute(
+            cursor = await self._conn.execute(
                 "INSERT INTO approvals (amount, expense_item, expense_group, partner, comment, period, payment_method,"
-                "approvals_needed, approvals_received, status, approved_by) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
-                list(record.values()),
+                "approvals_needed, approvals_received, status, initiator_chat_id, "
+                "created_at, updated_at) "
+                "VALUES (?,?,?,?,?,?,?,?,?,?,?,CURRENT_TIMESTAMP,CURRENT_TIMESTAMP)",
+                record_params(record),
             )
             await self._conn.commit()
             logger.info("Record inserted successfully.")
-            return self._cursor.lastrowid
+            return cursor.lastrowid
         except Exception as e:
             raise RuntimeError(f"Failed to insert record: {e}")
 
 
+    @timed("db")
+    async def insert_records(self, records):
+        """
+        Вставляет записи в таблицу 'approvals' одной транзакцией.
+        Возвращает id вставленных записей: таблица заблокирована на запись на всё время вставки,
+        поэтому id идут подряд после наибольшего существующего.
+        """
+        try:
+            await self._conn.execute("BEGIN IMMEDIATE")
+            result = await self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM approvals")
+            first_id = (await result.fetchone())[0] + 1
+            await self._conn.executemany(
+                "INSERT INTO approvals (amount, expense_item, expense_group, partner, comment, period, payment_method,"
+                "approvals_needed, approvals_received, status, initiator_chat_id, "
+                "created_at, updated_at) "
+                "VALUES (?,?,?,?,?,?,?,?,?,?,?,CURRENT_TIMESTAMP,CURRENT_TIMESTAMP)",
+                [record_params(record) for record in records],
+            )
+            await self._conn.commit()
+        except Exception as e:
+            await self._conn.rollback()
+            raise RuntimeError(f"Failed to insert records: {e}")
+        logger.info("%s records inserted successfully.", len(records))
+        return list(range(first_id, first_id + len(records)))
+
+    @timed("db")
     async def get_row_by_id(self, row_id):
         try:
-            result = await self._cursor.execute(
+            result = await self._conn.execute(
                 "SELECT * FROM approvals WHERE id=?", (row_id,)
             )
             row = await result.fetchone()
             if row is None:
                 return None
             logger.info("Row data received successfully")
-            return dict(
-                zip(
-                    (
-                        "id",
-                        "amount",
-                        "expense_item",
-                        "expense_group",
-                        "partner",
-                        "comment",
-                        "period",
-                        "payment_method",
-                        "approvals_needed",
-                        "approvals_received",
-                        "status",
-                        "approved_by",
-                    ),
-                    row,
-                )
-            )
+            return approval_record(row)
         except Exception as e:
             raise RuntimeError(f"Failed to fetch record: {e}")
 
-    async def update_row_by_id(self, row_id, updates):
+    async def _add_events(self, approval_ids, username, department, action, approved_ids=()):
+        """
+        Записи журнала согласований без фиксации транзакции.
+        approved_ids - заявки, одобрение которых завершает это действие (см. EVENT_INSERT).
+        """
+        await self._conn.executemany(
+            EVENT_INSERT,
+            [
+                (username, department, action, approval_id in approved_ids, approval_id)
+                for approval_id in approval_ids
+            ],
+        )
+
+    @timed("db")
+    async def transition(
+        self, approval_id, expected_status, new_status, approver=None, department=None
+    ):
+        """
+        Атомарно переводит заявку из статуса expected_status в new_status одним запросом.
+        При одобрении увеличивает счётчик апрувов;
+        статус 'Approved' заявка получает только после нужного количества апрувов, до этого - 'Pending'.
+        Действие approver записывается в журнал согласований в той же транзакции.
+        Возвращает обновлённую запись или None, если заявка не найдена или её статус уже изменился.
+        """
+        records = await self._transition(
+            [approval_id], expected_status, new_status, approver, department
+        )
+        if not records:
+            logger.info("Record %s is not in status %s.", approval_id, expected_status.label)
+            return None
+        logger.info(
+            "Record %s status changed: %s -> %s.",
+            approval_id,
+            expected_status.label,
+            records[0]["status"].label,
+        )
+        return records[0]
+
+    @timed("db")
+    async def transition_many(
+        self, approval_ids, expected_status, new_status, approver=None, department=None
+    ):
+        """
+        То же, что transition, для нескольких заявок одним запросом в одной транзакции.
+        Возвращает обновлённые записи; заявки, статус которых уже изменился, пропускаются.
+        """
+        if not approval_ids:
+            return []
+        records = await self._transition(
+            approval_ids, expected_status, new_status, approver, department
+        )
+        logger.info(
+            "%s of %s records changed status from %s.",
+            len(records),
+            len(approval_ids),
+            expected_status.label,
+        )
+        return records
+
+    async def _transition(self, approval_ids, expected_status, new_status, approver, department):
         try:
-            await self._cursor.execute(
-                "UPDATE approvals SET {} WHERE id = ?".format(
-                    ", ".join([f"{key} = ?" for key in updates.keys()])
-                ),
-                list(updates.values()) + [row_id],
+            cursor = await self._conn.execute(
+                transition_query(len(approval_ids)),
+                transition_params(approval_ids, expected_status, new_status),
             )
+            rows = await cursor.fetchall()
+            if approver is not None:
+                status = APPROVAL_COLUMNS.index("status")
+                await self._add_events(
+                    [row[0] for row in rows],
+                    approver,
+                    department,
+                    transition_action(new_status),
+                    {row[0] for row in rows if row[status] == Status.APPROVED},
+                )
             await self._conn.commit()
-            logger.info("Record updated successfully.")
         except Exception as e:
-            raise RuntimeError(f"Failed to update record: {e}. Approval ID: {row_id}, Updates: {updates}")
+            await self._conn.rollback()
+            raise RuntimeError(
+                f"Failed to change records status: {e}. Approval IDs: {approval_ids}, "
+                f"{expected_status.label} -> {new_status.label}"
+            )
+
+        return [approval_record(row) for row in rows]
 
-    async def find_not_paid(self):
+    @timed("db")
+    async def reject(self, row_id, username):
+        """
+        Отклоняет открытую заявку и записывает это в журнал согласований в одной транзакции.
+        Возвращает False, если заявка не найдена, уже оплачена или отклонена:
+        оплаченная заявка учтена в сводке бюджета и не отклоняется.
+        """
         try:
-            result = await self._cursor.execute(
-                "SELECT * FROM approvals WHERE status != ? AND status != ?",
-                ("Paid", "Rejected"),
+            cursor = await self._conn.execute(
+                "UPDATE approvals SET status = ?, updated_at = CURRENT_TIMESTAMP "
+                f"WHERE id = ? AND {OPEN_STATUSES_SQL}",
+                (Status.REJECTED, row_id),
             )
+            if cursor.rowcount:
+                await self._add_events([row_id], username, None, "reject")
+            await self._conn.commit()
+        except Exception as e:
+            await self._conn.rollback()
+            raise RuntimeError(f"Failed to reject record: {e}. Approval ID: {row_id}")
+        return bool(cursor.rowcount)
+
+    @timed("db")
+    async def find_open(self, limit=50, after_id=0, filters=None, before_id=None):
+        """
+        Постраничный (keyset) поиск необработанных и неоплаченных заявок.
+        Возвращает до limit записей ApprovalRow с id больше after_id по возрастанию id,
+        либо, если указан before_id, - последние limit записей с id меньше before_id.
+        filters: status, expense_item, min_amount, max_amount (суммы в рублях).
+        """
+        conditions = [OPEN_STATUSES_SQL]
+        params = []
+        for key, condition in (
+            ("status", "status = ?"),
+            ("expense_item", "expense_item = ?"),
+            ("min_amount", "amount >= ?"),
+            ("max_amount", "amount <= ?"),
+        ):
+            if filters and filters.get(key) is not None:
+                conditions.append(condition)
+                value = filters[key]
+                params.append(to_minor(value) if key.endswith("_amount") else value)
+
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+            order = "DESC"
+        else:
+            conditions.append("id > ?")
+            params.append(after_id)
+            order = "ASC"
+
+        query = (
+            f"SELECT {', '.join(APPROVAL_COLUMNS)} FROM approvals "
+            f"WHERE {' AND '.join(conditions)} ORDER BY id {order} LIMIT ?"
+        )
+        try:
+            result = await self._conn.execute(query, params + [limit])
             rows = await result.fetchall()
-            if not rows:
-                return []
-            logger.info("Not paid records found successfully.")
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch open records: {e}")
 
+        if before_id is not None:
+            rows.reverse()
+        for row in rows:
+            yield approval_row(row)
+
+    @timed("db")
+    async def mark_paid(self, row_id, payer=None):
+        """
+        Меняет статус заявки на 'Paid', записывает оплату в журнал согласований и сводку бюджета
+        и ставит заявку в очередь выгрузки в Google Sheets в одной транзакции.
+        Оплачивается только одобренная заявка; иначе (уже оплачена, отклонена или не одобрена)
+        возвращает False и ничего не меняет.
+        """
+        try:
+            now = time.time()
+            result = await self._conn.execute(
+                "UPDATE approvals SET status = ?, updated_at = CURRENT_TIMESTAMP "
+                "WHERE id = ? AND status = ? "
+                "RETURNING amount, expense_item, expense_group, partner, period, payment_method",
+                (Status.PAID, row_id, Status.APPROVED),
+            )
+            paid = await result.fetchone()
+            if paid is None:
+                await self._conn.rollback()
+                logger.info("Record %s is not approved for payment.", row_id)
+                return False
+            if payer is not None:
+                await self._add_events([row_id], payer, "payers", "pay")
+            amount, *fields = paid
+            try:
+                await self._conn.executemany(BUDGET_UPSERT, budget_rows(from_minor(amount), *fields))
+            except ValueError as e:
+                logger.warning("Record %s is not added to the budget rollup: %s", row_id, e)
+            await self._conn.execute(
+                "INSERT OR IGNORE INTO export_outbox (approval_id, created_at, next_attempt_at) "
+                "VALUES (?, ?, ?)",
+                (row_id, now, now),
+            )
+            await self._conn.commit()
+            logger.info("Record %s marked as paid and queued for export.", row_id)
+            return True
+        except Exception as e:
+            await self._conn.rollback()
+            raise RuntimeError(f"Failed to mark record as paid: {e}. Approval ID: {row_id}")
+
+    @timed("db")
+    async def budget(self, month):
+        """
+        Сводка бюджета за месяц начисления month ("YYYY-MM") по первичному ключу сводки:
+        список (статья, группа, партнёр, форма оплаты, сумма, количество счетов).
+        """
+        try:
+            result = await self._conn.execute(
+                "SELECT expense_item, expense_group, partner, payment_method, amount, payments "
+                "FROM budget_rollup WHERE month = ?",
+                (month,),
+            )
             return [
-                dict(
-                    zip(
-                        (
-                            "id заявки",
-                            "сумма",
-                            "статья",
-                            "группа",
-                            "партнёр",
-                            "комментарий",
-                            "период дат",
-                            "способ оплаты",
-                            "апрувов требуется",
-                            "апрувов получено",
-                            "статус",
-                            "кем апрувенно",
-                        ),
-                        row,
-                    )
-                )
+                (item, group, partner, method, Decimal(amount), payments)
+                for item, group, partner, method, amount, payments in await result.fetchall()
+            ]
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch budget: {e}")
+
+    @timed("db")
+    async def rebuild_budget(self):
+        """
+        Пересчитывает сводку бюджета по всем оплаченным заявкам в одной транзакции.
+        Возвращает количество учтённых заявок.
+        """
+        try:
+            await self._conn.execute("BEGIN IMMEDIATE")
+            count = await rebuild_budget(self._conn)
+            await self._conn.commit()
+            logger.info("Budget rollup rebuilt from %s paid records.", count)
+            return count
+        except Exception as e:
+            await self._conn.rollback()
+            raise RuntimeError(f"Failed to rebuild budget rollup: {e}")
+
+    @timed("db")
+    async def fetch_export_batch(self, limit):
+        """Возвращает заявки из очереди выгрузки, время повторной попытки которых наступило."""
+        try:
+            result = await self._conn.execute(
+                "SELECT o.id, o.attempts, a.* FROM export_outbox o "
+                "JOIN approvals a ON a.id = o.approval_id "
+                "WHERE o.exported_at IS NULL AND o.claimed_at IS NULL AND o.next_attempt_at <= ? "
+                "ORDER BY o.id LIMIT ?",
+                (time.time(), limit),
+            )
+            rows = await result.fetchall()
+            return [
+                {
+                    "outbox_id": row[0],
+                    "attempts": row[1],
+                    "record": approval_record(row[2:]),
+                }
                 for row in rows
             ]
         except Exception as e:
-            raise RuntimeError(f"Failed to fetch records: {e}")
+            raise RuntimeError(f"Failed to fetch export queue: {e}")
+
+    @timed("db")
+    async def claim_export(self, outbox_ids):
+        """
+        Отмечает начало выгрузки элементов очереди до добавления их строк в лист.
+        Отмеченные элементы не выбираются fetch_export_batch, пока выгрузка не отменена
+        mark_export_failed, поэтому ошибка после добавления строк не приводит к повторной выгрузке.
+        """
+        try:
+            await self._conn.executemany(
+                "UPDATE export_outbox SET claimed_at = ? WHERE id = ?",
+                [(time.time(), outbox_id) for outbox_id in outbox_ids],
+            )
+            await self._conn.commit()
+        except Exception as e:
+            await self._conn.rollback()
+            raise RuntimeError(f"Failed to claim export queue items: {e}")
+
+    @timed("db")
+    async def mark_exported(self, outbox_ids):
+        """Отмечает элементы очереди выгрузки как выгруженные."""
+        try:
+            await self._conn.executemany(
+                "UPDATE export_outbox SET exported_at = ?, last_error = NULL WHERE id = ?",
+                [(time.time(), outbox_id) for outbox_id in outbox_ids],
+            )
+            await self._conn.commit()
+        except Exception as e:
+            raise RuntimeError(f"Failed to mark export queue items as exported: {e}")
+
+    @timed("db")
+    async def mark_export_failed(self, retries, error):
+        """
+        Откладывает повторную выгрузку элементов очереди и снимает отметку claim_export.
+        retries - список пар (id элемента очереди, задержка в секундах).
+        """
+        try:
+            now = time.time()
+            await self._conn.executemany(
+                "UPDATE export_outbox SET attempts = attempts + 1, next_attempt_at = ?, "
+                "last_error = ?, claimed_at = NULL WHERE id = ?",
+                [(now + delay, error, outbox_id) for outbox_id, delay in retries],
+            )
+            await self._conn.commit()
+        except Exception as e:
+            raise RuntimeError(f"Failed to reschedule export queue items: {e}")
+
+    @timed("db")
+    async def export_queue_stats(self):
+        """
+        Глубина очереди выгрузки, время ожидания старейшего элемента, количество элементов
+        с ошибками и отмеченных, но не выгруженных (прерванная выгрузка), и последняя ошибка.
+        """
+        try:
+            result = await self._conn.execute(
+                "SELECT COUNT(*), MIN(created_at), SUM(attempts > 0), "
+                "SUM(claimed_at IS NOT NULL) FROM export_outbox "
+                "WHERE exported_at IS NULL"
+            )
+            depth, oldest, failing, claimed = await result.fetchone()
+            result = await self._conn.execute(
+                "SELECT last_error FROM export_outbox WHERE exported_at IS NULL "
+                "AND last_error IS NOT NULL ORDER BY next_attempt_at DESC LIMIT 1"
+            )
+            last_error = await result.fetchone()
+            return {
+                "depth": depth,
+                "lag": time.time() - oldest if oldest is not None else 0.0,
+                "failing": failing or 0,
+                "claimed": claimed or 0,
+                "last_error": last_error[0] if last_error else None,
+            }
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch export queue stats: {e}")
+
+    @timed("db")
+    async def approval_events(self, approval_id):
+        """Журнал согласований заявки в порядке действий."""
+        try:
+            result = await self._conn.execute(
+                f"SELECT {', '.join(EVENT_COLUMNS)} FROM approval_events "
+                "WHERE approval_id = ? ORDER BY id",
+                (approval_id,),
+            )
+            return [dict(zip(EVENT_COLUMNS, row)) for row in await result.fetchall()]
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch approval events: {e}. Approval ID: {approval_id}")
+
+    @timed("db")
+    async def approvers(self, approval_ids):
+        """Одобрившие заявки пользователи: словарь id заявки -> список в порядке одобрения."""
+        if not approval_ids:
+            return {}
+        try:
+            result = await self._conn.execute(
+                "SELECT approval_id, username FROM approval_events "
+                f"WHERE approval_id IN ({', '.join('?' * len(approval_ids))}) "
+                "AND action = 'approve' ORDER BY id",
+                list(approval_ids),
+            )
+            approvers = {}
+            for approval_id, username in await result.fetchall():
+                approvers.setdefault(approval_id, []).append(username)
+            return approvers
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch approvers: {e}")
+
+    @timed("db")
+    async def approver_stats(self):
+        """Количество действий каждого пользователя: список (пользователь, {действие: количество})."""
+        try:
+            result = await self._conn.execute(
+                "SELECT username, action, COUNT(*) FROM approval_events "
+                "GROUP BY username, action ORDER BY username"
+            )
+            stats = {}
+            for username, action, count in await result.fetchall():
+                stats.setdefault(username, {})[action] = count
+            return list(stats.items())
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch approver stats: {e}")
+
+    @timed("db")
+    async def sla_report(self, days):
+        """
+        Перцентили длительностей (с, с точностью до минуты) действий за последние days дней:
+        список (метрика, количество, p50, p90, p99). Метрики: approve - от создания до
+        последнего нужного апрува, pay - от одобрения до оплаты, department:<отдел> и
+        user:<пользователь> - от предыдущего действия с заявкой до действия отдела или пользователя.
+        """
+        try:
+            result = await self._conn.execute(SLA_QUERY, {"since": since(days)})
+            return await result.fetchall()
+        except Exception as e:
+            raise RuntimeError(f"Failed to build SLA report: {e}")
+
+    @timed("db")
+    async def backlog_report(self, oldest=3):
+        """
+        Открытые заявки по статусам: словарь статус -> {count, amount, age, oldest},
+        где age - ожидание старейшей заявки (с), oldest - до oldest дольше всего ожидающих заявок.
+        """
+        try:
+            result = await self._conn.execute(BACKLOG_QUERY)
+            backlog = {
+                Status(status): {
+                    "count": count,
+                    "amount": from_minor(amount),
+                    "age": age,
+                    "oldest": [],
+                }
+                for status, count, amount, age in await result.fetchall()
+            }
+            result = await self._conn.execute(BACKLOG_OLDEST_QUERY, {"limit": oldest})
+            for status, approval_id, amount, partner, age in await result.fetchall():
+                backlog[Status(status)]["oldest"].append(
+                    {"id": approval_id, "amount": from_minor(amount), "partner": partner, "age": age}
+                )
+            return backlog
+        except Exception as e:
+            raise RuntimeError(f"Failed to build backlog report: {e}")
+
+    @timed("db")
+    async def totals_report(self, days):
+        """
+        Суммы неотклонённых заявок за последние days дней по статье, группе и месяцу создания:
+        список (статья, группа, месяц, оплачено, открыто, итог по статье).
+        """
+        try:
+            result = await self._conn.execute(TOTALS_QUERY, {"since": since(days)})
+            return [
+                (item, group, month, from_minor(paid), from_minor(open_), from_minor(item_total))
+                for item, group, month, paid, open_, item_total in await result.fetchall()
+            ]
+        except Exception as e:
+            raise RuntimeError(f"Failed to build totals report: {e}")
+
+    @timed("db")
+    async def load_dialog_states(self, name):
+        """Состояния диалога name: словарь ключ диалога (JSON) -> состояние."""
+        try:
+            result = await self._conn.execute(
+                "SELECT key, state FROM dialog_states WHERE name = ?", (name,)
+            )
+            return dict(await result.fetchall())
+        except Exception as e:
+            raise RuntimeError(f"Failed to load dialog states: {e}")
+
+    @timed("db")
+    async def load_dialog_data(self):
+        """Данные диалогов пользователей: словарь user_id -> данные (JSON)."""
+        try:
+            result = await self._conn.execute("SELECT user_id, data FROM dialog_data")
+            return dict(await result.fetchall())
+        except Exception as e:
+            raise RuntimeError(f"Failed to load dialog data: {e}")
+
+    @timed("db")
+    async def save_dialogs(self, states, data):
+        """
+        Сохраняет изменения диалогов в одной транзакции.
+        states - список (имя диалога, ключ, состояние), data - список (user_id, данные);
+        состояние или данные None удаляют запись.
+        """
+        try:
+            await self._conn.executemany(
+                "INSERT OR REPLACE INTO dialog_states (name, key, state) VALUES (?, ?, ?)",
+                [item for item in states if item[2] is not None],
+            )
+            await self._conn.executemany(
+                "DELETE FROM dialog_states WHERE name = ? AND key = ?",
+                [item[:2] for item in states if item[2] is None],
+            )
+            await self._conn.executemany(
+                "INSERT OR REPLACE INTO dialog_data (user_id, data) VALUES (?, ?)",
+                [item for item in data if item[1] is not None],
+            )
+            await self._conn.executemany(
+                "DELETE FROM dialog_data WHERE user_id = ?",
+                [item[:1] for item in data if item[1] is None],
+            )
+            await self._conn.commit()
+        except Exception as e:
+            await self._conn.rollback()
+            raise RuntimeError(f"Failed to save dialogs: {e}")
@@ -0,0 +1,321 @@
+from config.logging_config import logger
+from .budget import rebuild_budget
+
+
+MIGRATION_CHUNK = 2000  # строк, переносимых или читаемых за раз при переносе данных в миграциях
+
+# Текстовые статусы версии 1 и их числовые коды (см. Status). Значения зафиксированы:
+# миграция должна давать один и тот же результат независимо от текущего кода.
+LEGACY_STATUSES = {
+    "Not processed": 1,
+    "Pending": 2,
+    "Approved": 3,
+    "Paid": 4,
+    "Rejected": 5,
+}
+
+APPROVALS_V2 = """CREATE TABLE IF NOT EXISTS approvals_v2
+                  (id INTEGER PRIMARY KEY,
+                   amount INTEGER NOT NULL,
+                   expense_item TEXT,
+                   expense_group TEXT,
+                   partner TEXT,
+                   comment TEXT,
+                   period TEXT,
+                   payment_method TEXT,
+                   approvals_needed INTEGER NOT NULL,
+                   approvals_received INTEGER NOT NULL DEFAULT 0,
+                   status INTEGER NOT NULL,
+                   approved_by TEXT,
+                   created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                   updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                   initiator_chat_id INTEGER)"""
+
+# Индексы таблицы заявок версии 2. Имена индексов сохраняются при переименовании таблицы.
+V2_INDEXES = (
+    # Постраничный список открытых заявок (/show_not_paid, /approve_batch): обход по id
+    "CREATE INDEX IF NOT EXISTS idx_approvals_open ON approvals_v2 (id) WHERE status IN (1, 2, 3)",
+    # Покрывающие индексы для сумм и количества заявок по статусу (отделу) и статье или периоду
+    "CREATE INDEX IF NOT EXISTS idx_approvals_status_item "
+    "ON approvals_v2 (status, expense_item, amount)",
+    "CREATE INDEX IF NOT EXISTS idx_approvals_status_period "
+    "ON approvals_v2 (status, period, amount)",
+)
+
+V2_COLUMNS = (
+    "id, amount, expense_item, expense_group, partner, comment, period, payment_method, "
+    "approvals_needed, approvals_received, status, approved_by, created_at, updated_at, "
+    "initiator_chat_id"
+)
+
+
+# Значения строки версии 1, приведённые к версии 2
+V2_VALUES = (
+    "id, CAST(ROUND(amount * 100) AS INTEGER), expense_item, expense_group, partner, comment, "
+    "period, payment_method, approvals_needed, COALESCE(approvals_received, 0), "
+    "CASE status {} END, approved_by, created_at, updated_at, initiator_chat_id".format(
+        " ".join(f"WHEN '{label}' THEN {code}" for label, code in LEGACY_STATUSES.items())
+    )
+)
+
+
+async def create_base_schema(conn):
+    """таблицы заявок, очереди выгрузки и диалогов"""
+    await conn.execute("BEGIN IMMEDIATE")
+    await conn.execute(
+        """CREATE TABLE IF NOT EXISTS approvals
+                                  (id INTEGER PRIMARY KEY,
+                                   amount REAL,
+                                   expense_item TEXT,
+                                   expense_group TEXT,
+                                   partner TEXT,
+                                   comment TEXT,
+                                   period TEXT,
+                                   payment_method TEXT,
+                                   approvals_needed INTEGER,
+                                   approvals_received INTEGER,
+                                   status TEXT,
+                                   approved_by TEXT,
+                                   created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                                   updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                                   initiator_chat_id INTEGER)"""
+    )
+    # Базы, созданные до появления миграций, могут не содержать новых столбцов
+    result = await conn.execute("PRAGMA table_info(approvals)")
+    columns = {row[1] for row in await result.fetchall()}
+    for column, column_type in (
+        ("created_at", "TEXT"),
+        ("updated_at", "TEXT"),
+        ("initiator_chat_id", "INTEGER"),
+    ):
+        if column not in columns:
+            await conn.execute(f"ALTER TABLE approvals ADD COLUMN {column} {column_type}")
+    await conn.execute(
+        """CREATE TABLE IF NOT EXISTS export_outbox
+                                  (id INTEGER PRIMARY KEY,
+                                   approval_id INTEGER NOT NULL UNIQUE,
+                                   created_at REAL NOT NULL,
+                                   attempts INTEGER NOT NULL DEFAULT 0,
+                                   next_attempt_at REAL NOT NULL,
+                                   last_error TEXT,
+                                   exported_at REAL)"""
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_export_outbox_pending "
+        "ON export_outbox (next_attempt_at) WHERE exported_at IS NULL"
+    )
+    await conn.execute(
+        """CREATE TABLE IF NOT EXISTS dialog_states
+                                  (name TEXT NOT NULL,
+                                   key TEXT NOT NULL,
+                                   state INTEGER NOT NULL,
+                                   PRIMARY KEY (name, key)) WITHOUT ROWID"""
+    )
+    await conn.execute(
+        """CREATE TABLE IF NOT EXISTS dialog_data
+                                  (user_id INTEGER PRIMARY KEY,
+                                   data TEXT NOT NULL)"""
+    )
+
+
+async def convert_approvals(conn):
+    """числовые статусы, суммы в копейках и индексы таблицы заявок"""
+    # Заявки переносятся в approvals_v2 частями по MIGRATION_CHUNK строк, каждая в своей короткой
+    # транзакции, чтобы не держать блокировку записи на всё время переноса. Прерванный перенос
+    # продолжается со следующего после последнего перенесённого id: до окончания миграции
+    # бот не обрабатывает обновления, и перенесённые строки не меняются.
+    await conn.execute("BEGIN IMMEDIATE")
+    await conn.execute(APPROVALS_V2)
+    # Индексы создаются до переноса: строки добавляются по возрастанию id, и построение индексов
+    # распределяется по частям, а не выполняется целиком при замене таблицы
+    for index in V2_INDEXES:
+        await conn.execute(index)
+    await conn.commit()
+
+    result = await conn.execute("SELECT COALESCE(MAX(id), 0) FROM approvals_v2")
+    last_id = (await result.fetchone())[0]
+    if last_id:
+        logger.info("Продолжение переноса заявок после id %s", last_id)
+
+    copied = 0
+    while True:
+        await conn.execute("BEGIN IMMEDIATE")
+        result = await conn.execute(
+            "SELECT MAX(id) FROM (SELECT id FROM approvals WHERE id > ? ORDER BY id LIMIT ?)",
+            (last_id, MIGRATION_CHUNK),
+        )
+        chunk_end = (await result.fetchone())[0]
+        if chunk_end is None:
+            # Все строки перенесены; замена таблицы - в этой же транзакции
+            break
+        result = await conn.execute(
+            f"INSERT INTO approvals_v2 ({V2_COLUMNS}) "
+            f"SELECT {V2_VALUES} FROM approvals WHERE id > ? AND id <= ?",
+            (last_id, chunk_end),
+        )
+        await conn.commit()
+        copied += result.rowcount
+        last_id = chunk_end
+    logger.info("Перенесено заявок в новую таблицу: %s", copied)
+
+    await conn.execute("DROP TABLE approvals")
+    await conn.execute("ALTER TABLE approvals_v2 RENAME TO approvals")
+    # Без статистики планировщик предпочитает индексы по статусу частичному индексу открытых заявок
+    await conn.execute("ANALYZE approvals")
+
+
+async def add_approval_events(conn):
+    """журнал согласований approval_events вместо столбца approved_by"""
+    await conn.execute("BEGIN IMMEDIATE")
+    # created_at пуст у событий, перенесённых из approved_by: время одобрения не сохранялось
+    await conn.execute(
+        """CREATE TABLE approval_events
+                          (id INTEGER PRIMARY KEY,
+                           approval_id INTEGER NOT NULL,
+                           username TEXT NOT NULL,
+                           department TEXT,
+                           action TEXT NOT NULL,
+                           created_at TEXT DEFAULT CURRENT_TIMESTAMP)"""
+    )
+    await conn.execute(
+        "CREATE INDEX idx_approval_events_approval ON approval_events (approval_id)"
+    )
+    await conn.execute(
+        "CREATE INDEX idx_approval_events_user ON approval_events (username, action, created_at)"
+    )
+
+    # approved_by - согласующие через ", " в порядке одобрения: руководитель, затем финансовый отдел
+    departments = ("head", "finance")
+    cursor = await conn.execute(
+        "SELECT id, approved_by FROM approvals WHERE approved_by IS NOT NULL ORDER BY id"
+    )
+    while rows := await cursor.fetchmany(MIGRATION_CHUNK):
+        await conn.executemany(
+            "INSERT INTO approval_events (approval_id, username, department, action, created_at) "
+            "VALUES (?, ?, ?, 'approve', NULL)",
+            [
+                (approval_id, username, departments[position] if position < 2 else None)
+                for approval_id, approved_by in rows
+                for position, username in enumerate(approved_by.split(", "))
+            ],
+        )
+    await conn.execute("ALTER TABLE approvals DROP COLUMN approved_by")
+
+
+async def add_report_indexes(conn):
+    """индексы по времени создания и ожидания заявок для отчётов"""
+    await conn.execute("BEGIN IMMEDIATE")
+    # Заявки за период отчёта (/report sla, /report totals)
+    await conn.execute("CREATE INDEX idx_approvals_created ON approvals (created_at)")
+    # Открытые заявки по статусу и времени перехода в него (/report backlog), покрывающий
+    await conn.execute(
+        "CREATE INDEX idx_approvals_status_updated ON approvals (status, updated_at, amount)"
+    )
+    await conn.execute("ANALYZE")
+
+
+async def add_budget_rollup(conn):
+    """сводка бюджета budget_rollup по оплаченным заявкам"""
+    await conn.execute("BEGIN IMMEDIATE")
+    # Суммы - текстом (decimal_add): доли счёта по месяцам начисления округляются
+    # до 10 знаков, как в листе записей, и не помещаются в целые копейки
+    await conn.execute(
+        """CREATE TABLE budget_rollup
+                          (month TEXT NOT NULL,
+                           expense_item TEXT NOT NULL,
+                           expense_group TEXT NOT NULL,
+                           partner TEXT NOT NULL,
+                           payment_method TEXT NOT NULL,
+                           amount TEXT NOT NULL,
+                           payments INTEGER NOT NULL,
+                           PRIMARY KEY (month, expense_item, expense_group, partner, payment_method))
+                          WITHOUT ROWID"""
+    )
+    count = await rebuild_budget(conn, MIGRATION_CHUNK)
+    logger.info("Оплаченных заявок учтено в сводке бюджета: %s", count)
+
+
+async def add_event_durations(conn):
+    """длительности этапов в журнале согласований для отчёта /report sla"""
+    await conn.execute("BEGIN IMMEDIATE")
+    # Новые события получают длительности при записи (см. EVENT_INSERT в db.db)
+    await conn.execute("ALTER TABLE approval_events ADD COLUMN wait_seconds REAL")
+    await conn.execute("ALTER TABLE approval_events ADD COLUMN approve_seconds REAL")
+    # Существующие - одним проходом по журналу; у перенесённых из approved_by событий
+    # времени нет, и длительности остаются пустыми
+    await conn.execute(
+        """WITH durations AS (
+               SELECT e.id,
+                      (julianday(e.created_at)
+                       - julianday(COALESCE(LAG(e.created_at) OVER stage, a.created_at))) * 86400
+                          AS wait_seconds,
+                      CASE WHEN e.action = 'approve'
+                                AND SUM(e.action = 'approve') OVER stage = a.approvals_needed
+                           THEN (julianday(e.created_at) - julianday(a.created_at)) * 86400
+                      END AS approve_seconds
+               FROM approval_events e JOIN approvals a ON a.id = e.approval_id
+               WHERE e.created_at IS NOT NULL
+               WINDOW stage AS (PARTITION BY e.approval_id ORDER BY e.id)
+           )
+           UPDATE approval_events
+           SET wait_seconds = durations.wait_seconds, approve_seconds = durations.approve_seconds
+           FROM durations
+           WHERE durations.id = approval_events.id"""
+    )
+    # События за период отчёта; покрывающий, чтобы отчёт не читал строки журнала
+    await conn.execute(
+        "CREATE INDEX idx_approval_events_created ON approval_events "
+        "(created_at, action, department, username, wait_seconds, approve_seconds)"
+    )
+    await conn.execute("ANALYZE approval_events")
+
+
+async def add_export_claims(conn):
+    """отметка о начале выгрузки заявки в Google Sheets"""
+    await conn.execute("BEGIN IMMEDIATE")
+    # Заявка отмечается до добавления строк в лист: отмеченная, но не выгруженная заявка
+    # (прерванная выгрузка) повторно не выгружается, чтобы не добавить её строки дважды
+    await conn.execute("ALTER TABLE export_outbox ADD COLUMN claimed_at REAL")
+
+
+# Миграция с номером n (от 1) переводит базу из версии n - 1 в версию n
+MIGRATIONS = (
+    create_base_schema,
+    convert_approvals,
+    add_approval_events,
+    add_report_indexes,
+    add_budget_rollup,
+    add_event_durations,
+    add_export_claims,
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+async def schema_version(conn) -> int:
+    result = await conn.execute("PRAGMA user_version")
+    return (await result.fetchone())[0]
+
+
+async def migrate(conn):
+    """
+    Приведение схемы базы данных к версии SCHEMA_VERSION.
+    Версия хранится в PRAGMA user_version и меняется в одной транзакции с последним шагом миграции.
+    """
+    version = await schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Версия схемы базы данных {version} новее поддерживаемой {SCHEMA_VERSION}."
+        )
+
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        migration = MIGRATIONS[number - 1]
+        logger.info("Миграция базы данных до версии %s: %s", number, migration.__doc__)
+        try:
+            await migration(conn)
+            if not conn.in_transaction:
+                await conn.execute("BEGIN IMMEDIATE")
+            await conn.execute(f"PRAGMA user_version = {number}")
+            await conn.commit()
+        except Exception as e:
+            await conn.rollback()
+            raise RuntimeError(f"Не удалось выполнить миграцию базы данных до версии {number}: {e}")
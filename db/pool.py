@@ -0,0 +1,80 @@
+import asyncio
+
+import aiosqlite
+
+from config.logging_config import logger
+from .budget import decimal_add
+
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",  # 16 МБ кэша страниц на соединение
+    "PRAGMA mmap_size=268435456",  # 256 МБ
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Функции SQL, регистрируемые на каждом соединении: (имя, число аргументов, функция)
+FUNCTIONS = (("decimal_add", 2, decimal_add),)
+
+
+class ConnectionPool:
+    """
+    Пул постоянных соединений aiosqlite.
+    Соединения открываются при первом обращении и живут до закрытия пула.
+    """
+
+    def __init__(self, db_file, size):
+        self.db_file = db_file
+        self.size = size
+        self._connections = []
+        self._idle = None
+        self._lock = asyncio.Lock()
+
+    async def open(self):
+        """Открытие соединений пула с настройкой PRAGMA и функций SQL"""
+        async with self._lock:
+            if self._idle is not None:
+                return
+            idle = asyncio.Queue()
+            for _ in range(self.size):
+                conn = await aiosqlite.connect(self.db_file)
+                for pragma in PRAGMAS:
+                    await conn.execute(pragma)
+                for name, num_params, func in FUNCTIONS:
+                    await conn.create_function(name, num_params, func, deterministic=True)
+                self._connections.append(conn)
+                idle.put_nowait(conn)
+            self._idle = idle
+            logger.info("Connection pool opened: %s connections.", self.size)
+
+    async def close(self):
+        """Закрытие всех соединений пула"""
+        async with self._lock:
+            for conn in self._connections:
+                await conn.close()
+            self._connections.clear()
+            self._idle = None
+            logger.info("Connection pool closed.")
+
+    async def acquire(self):
+        """Получение свободного соединения. Ожидает, если все соединения заняты."""
+        if self._idle is None:
+            await self.open()
+        return await self._idle.get()
+
+    async def release(self, conn):
+        """Возврат соединения в пул с откатом незавершённой транзакции"""
+        if conn.in_transaction:
+            await conn.rollback()
+        if self._idle is not None and conn in self._connections:
+            self._idle.put_nowait(conn)
+
+    async def ping(self):
+        """Проверка доступности базы данных"""
+        conn = await self.acquire()
+        try:
+            await conn.execute("SELECT 1")
+        finally:
+            await self.release(conn)
@@ -0,0 +1,95 @@
+# Запросы отчётов /report. Агрегация выполняется в SQLite; суммы в копейках,
+# коды статусов подставляются литералами из Status, как в OPEN_STATUSES_SQL.
+
+from .values import OPEN_STATUSES, OPEN_STATUSES_SQL, Status
+
+# Перцентили p50, p90 и p99 длительностей действий, совершённых после :since.
+# Длительности записываются в журнал согласований вместе с событием (wait_seconds,
+# approve_seconds), поэтому отчёт читает только покрывающий индекс по времени события.
+# Длительности группируются по минутам (SUM OVER по группам вместо сортировки всех значений);
+# перцентиль - наибольшая длительность в минуте, на которой накопленная доля достигает p.
+# Ожидания группируются за один проход по журналу (минута первой: сортировка сравнивает
+# меньше столбцов), метрики оплаты, отделов и согласующих собираются из сгруппированных строк.
+SLA_QUERY = """
+WITH waits AS (
+    SELECT action, department, username, CAST(wait_seconds / 60 AS INTEGER) AS minute,
+           COUNT(*) AS count, MAX(wait_seconds) AS seconds
+    FROM approval_events
+    WHERE created_at >= :since AND wait_seconds IS NOT NULL
+    GROUP BY minute, username, department, action
+),
+durations AS (
+    SELECT 'approve' AS metric, CAST(approve_seconds / 60 AS INTEGER) AS minute,
+           COUNT(*) AS count, MAX(approve_seconds) AS seconds
+    FROM approval_events
+    WHERE created_at >= :since AND approve_seconds IS NOT NULL
+    GROUP BY minute
+    UNION ALL
+    SELECT 'pay', minute, count, seconds
+    FROM waits
+    WHERE action = 'pay'
+    UNION ALL
+    SELECT 'department:' || department, minute, count, seconds
+    FROM waits
+    WHERE department IS NOT NULL
+    UNION ALL
+    SELECT 'user:' || username, minute, count, seconds
+    FROM waits
+),
+minutes AS (
+    SELECT metric, minute, SUM(count) AS count, MAX(seconds) AS seconds
+    FROM durations
+    GROUP BY metric, minute
+),
+cumulative AS (
+    SELECT metric, seconds, SUM(count) OVER metric_total AS total,
+           1.0 * SUM(count) OVER (PARTITION BY metric ORDER BY minute)
+               / SUM(count) OVER metric_total AS share
+    FROM minutes
+    WINDOW metric_total AS (PARTITION BY metric)
+)
+SELECT metric, MAX(total),
+       MIN(CASE WHEN share >= 0.5 THEN seconds END),
+       MIN(CASE WHEN share >= 0.9 THEN seconds END),
+       MIN(CASE WHEN share >= 0.99 THEN seconds END)
+FROM cumulative
+GROUP BY metric
+ORDER BY metric
+"""
+
+# Открытые заявки по статусам (отделам): количество, сумма и ожидание старейшей
+BACKLOG_QUERY = f"""
+SELECT status, COUNT(*), SUM(amount), (julianday('now') - julianday(MIN(updated_at))) * 86400
+FROM approvals
+WHERE {OPEN_STATUSES_SQL}
+GROUP BY status
+"""
+
+# Дольше всего ожидающие заявки каждого открытого статуса: по индексу (status, updated_at)
+# читаются только первые :limit строк статуса
+BACKLOG_OLDEST_QUERY = "\nUNION ALL\n".join(
+    f"""SELECT * FROM (
+    SELECT status, id, amount, partner, (julianday('now') - julianday(updated_at)) * 86400
+    FROM approvals
+    WHERE status = {int(status)}
+    ORDER BY updated_at
+    LIMIT :limit
+)"""
+    for status in OPEN_STATUSES
+)
+
+# Оплаченные и открытые суммы по статье, группе и месяцу создания заявки
+# с итогом по статье; статьи - по убыванию итога
+TOTALS_QUERY = f"""
+SELECT expense_item, expense_group, month, paid, open,
+       SUM(paid + open) OVER (PARTITION BY expense_item) AS item_total
+FROM (
+    SELECT expense_item, expense_group, strftime('%Y-%m', created_at) AS month,
+           COALESCE(SUM(CASE WHEN status = {int(Status.PAID)} THEN amount END), 0) AS paid,
+           COALESCE(SUM(CASE WHEN {OPEN_STATUSES_SQL} THEN amount END), 0) AS open
+    FROM approvals
+    WHERE created_at >= :since AND status != {int(Status.REJECTED)}
+    GROUP BY expense_item, expense_group, month
+)
+ORDER BY item_total DESC, expense_item, expense_group, month
+"""
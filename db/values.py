@@ -0,0 +1,44 @@
+"""Значения, хранящиеся в таблице заявок: коды статусов и суммы в копейках."""
+
+from decimal import Decimal, ROUND_HALF_UP
+from enum import IntEnum
+
+
+class Status(IntEnum):
+    """Статусы заявки. В базе данных хранятся числовые коды."""
+
+    NOT_PROCESSED = 1
+    PENDING = 2
+    APPROVED = 3
+    PAID = 4
+    REJECTED = 5
+
+    @property
+    def label(self):
+        return status_labels[self]
+
+
+status_labels = {
+    Status.NOT_PROCESSED: "Not processed",
+    Status.PENDING: "Pending",
+    Status.APPROVED: "Approved",
+    Status.PAID: "Paid",
+    Status.REJECTED: "Rejected",
+}
+
+# Статусы заявок, ожидающих обработки или оплаты. Подставляются в запросы литералами,
+# чтобы планировщик SQLite мог использовать частичный индекс idx_approvals_open.
+OPEN_STATUSES = (Status.NOT_PROCESSED, Status.PENDING, Status.APPROVED)
+OPEN_STATUSES_SQL = "status IN ({})".format(", ".join(str(int(status)) for status in OPEN_STATUSES))
+
+MINOR_UNITS = 100  # копеек в рубле; суммы хранятся целым числом копеек
+
+
+def to_minor(amount) -> int:
+    """Сумма в копейках для записи в базу данных"""
+    return int((Decimal(amount) * MINOR_UNITS).to_integral_value(ROUND_HALF_UP))
+
+
+def from_minor(value) -> Decimal:
+    """Сумма в рублях из значения в копейках"""
+    return Decimal(value) / MINOR_UNITS
@@ -0,0 +1,4 @@
+from .registry import MetricsRegistry, instrument_handler, registry, timed
+
+
+__all__ = ["MetricsRegistry", "instrument_handler", "registry", "timed"]
@@ -0,0 +1,166 @@
+import functools
+import inspect
+import time
+from bisect import bisect_left
+
+
+# Границы корзин гистограмм задержек в секундах
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Гистограмма задержек с фиксированными корзинами"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Оценка квантиля линейной интерполяцией внутри корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return BUCKETS[-1]
+
+
+def format_labels(labels):
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class MetricsRegistry:
+    """Хранилище метрик бота: гистограммы задержек и счётчики"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def observe(self, name, value, **labels):
+        """Добавление значения в гистограмму name с метками labels"""
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        """Увеличение счётчика name с метками labels"""
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def histograms(self, name):
+        """Гистограммы метрики name: словарь метки -> Histogram"""
+        return {
+            labels: histogram
+            for (metric, labels), histogram in self._histograms.items()
+            if metric == name
+        }
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus"""
+        lines = []
+        for name in sorted({metric for metric, _ in self._histograms}):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in sorted(self.histograms(name).items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    bucket_labels = format_labels(labels + (("le", bound),))
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+        for name in sorted({metric for metric, _ in self._counters}):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for (metric, labels), value in sorted(self._counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+registry.describe("handler_latency_seconds", "Время обработки обновления Telegram обработчиком")
+registry.describe("handler_errors_total", "Количество ошибок в обработчиках")
+registry.describe("downstream_latency_seconds", "Время обращения к базе данных и Google Sheets")
+
+
+def timed(service):
+    """
+    Декоратор для замера времени обращения к внешнему сервису.
+    Поддерживает корутины и асинхронные генераторы.
+    """
+
+    def decorator(func):
+        labels = {"service": service, "method": func.__name__}
+
+        if inspect.isasyncgenfunction(func):
+
+            @functools.wraps(func)
+            async def generator_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    async for item in func(*args, **kwargs):
+                        yield item
+                finally:
+                    registry.observe(
+                        "downstream_latency_seconds", time.perf_counter() - started, **labels
+                    )
+
+            return generator_wrapper
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                registry.observe(
+                    "downstream_latency_seconds", time.perf_counter() - started, **labels
+                )
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_handler(callback, name):
+    """Обёртка обработчика Telegram, замеряющая время обработки и считающая ошибки"""
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            registry.inc("handler_errors_total", handler=name)
+            raise
+        finally:
+            registry.observe("handler_latency_seconds", time.perf_counter() - started, handler=name)
+
+    return wrapper
@@ -0,0 +1,160 @@
+import csv
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+from payments import PaymentRequest, parse_amount, parse_period
+
+
+MAX_ROWS = 10000  # максимальное количество заявок в одном файле
+MAX_REPORTED_ERRORS = 20  # количество некорректных строк, о которых сообщается подробно
+
+# Поля заявки и заголовки соответствующих столбцов файла (регистр и "ё" не учитываются)
+column_titles = {
+    "amount": "Сумма",
+    "expense_item": "Статья",
+    "expense_group": "Группа",
+    "partner": "Партнер",
+    "comment": "Комментарий",
+    "period": "Даты начисления",
+    "payment_method": "Форма оплаты",
+}
+fields = tuple(column_titles)
+
+
+def normalize_title(title) -> str:
+    return " ".join(title.casefold().replace("ё", "е").split())
+
+
+columns = {normalize_title(title): name for name, title in column_titles.items()}
+
+
+@dataclass
+class BulkResult:
+    """Результат разбора файла с заявками"""
+
+    requests: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    invalid: int = 0
+    total: int = 0
+
+    def add_error(self, row_number, text):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, text))
+
+
+def cell_text(value) -> str:
+    """Значение ячейки XLSX в виде строки; даты - в формате mm.yy"""
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%m.%y")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def read_csv(path):
+    """Построчное чтение CSV с разделителем ";", "," или табуляцией"""
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        sample = file.read(4096)
+        file.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(file, dialect)
+
+
+def read_xlsx(path):
+    """Построчное чтение первого листа XLSX без загрузки всей книги в память"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Для загрузки XLSX необходим пакет openpyxl.")
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield [cell_text(value) for value in row]
+    finally:
+        workbook.close()
+
+
+readers = {".csv": read_csv, ".xlsx": read_xlsx}
+
+
+def parse_row(row, positions, categories) -> PaymentRequest:
+    """Заявка из строки файла. Выбрасывает ValueError с описанием ошибки."""
+    values = {
+        name: (row[position] if position < len(row) else "").strip()
+        for name, position in positions.items()
+    }
+    empty = [column_titles[name] for name in fields if not values[name]]
+    if empty:
+        raise ValueError(f"Не заполнены поля: {', '.join(empty)}")
+
+    amount = values["amount"].replace("\xa0", "").replace(" ", "").replace(",", ".")
+    amount = parse_amount(amount)
+    try:
+        period = parse_period(values["period"])
+    except ValueError:
+        raise ValueError(f"Неверные даты начисления: {values['period']}")
+
+    item, group, partner = values["expense_item"], values["expense_group"], values["partner"]
+    if categories.locate(item, group, partner) is None:
+        raise ValueError(f"Нет в справочнике категорий: {item} / {group} / {partner}")
+
+    return PaymentRequest(
+        amount=amount,
+        expense_item=item,
+        expense_group=group,
+        partner=partner,
+        comment=values["comment"],
+        period=period,
+        payment_method=values["payment_method"],
+    )
+
+
+def read_payments(path, categories, max_rows=MAX_ROWS) -> BulkResult:
+    """
+    Потоковый разбор CSV или XLSX с заявками на платёж и проверка по справочнику категорий.
+    Первая строка - заголовок с названиями столбцов (см. column_titles).
+    В памяти хранятся только корректные заявки и первые MAX_REPORTED_ERRORS ошибок.
+    """
+    reader = readers.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        raise ValueError("Поддерживаются только файлы CSV и XLSX.")
+
+    rows = reader(path)
+    try:
+        return parse_rows(rows, categories, max_rows)
+    finally:
+        rows.close()
+
+
+def parse_rows(rows, categories, max_rows) -> BulkResult:
+    header = next(rows, None) or []
+    positions = {}
+    for position, title in enumerate(header):
+        name = columns.get(normalize_title(title))
+        if name is not None and name not in positions:
+            positions[name] = position
+    missing = [title for name, title in column_titles.items() if name not in positions]
+    if missing:
+        raise ValueError(f"В файле нет столбцов: {', '.join(missing)}")
+
+    result = BulkResult()
+    for row_number, row in enumerate(rows, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        if result.total >= max_rows:
+            result.add_error(row_number, f"Превышено ограничение в {max_rows} строк, остальные строки не обработаны.")
+            break
+        result.total += 1
+        try:
+            result.requests.append(parse_row(row, positions, categories))
+        except ValueError as e:
+            result.add_error(row_number, str(e))
+    return result
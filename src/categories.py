@@ -0,0 +1,149 @@
+import hashlib
+from bisect import bisect_left
+from dataclasses import dataclass
+from types import MappingProxyType
+
+
+ITEM_COLUMN = "Статья"
+GROUP_COLUMN = "Группа"
+PARTNER_COLUMN = "Партнер"
+
+
+@dataclass(frozen=True)
+class CategoryIndex:
+    """
+    Неизменяемый индекс категорий из таблицы "категории".
+    Идентификатор статьи - её позиция в items, идентификатор группы - позиция в groups[item_id].
+    digest - отпечаток содержимого, одинаковый для одинаковых данных и после перезапуска бота.
+    *_prefixes - отсортированные индексы для поиска по началу названия (см. build_prefix_index).
+    """
+
+    items: tuple
+    groups: tuple
+    partners: MappingProxyType
+    digest: str
+    item_prefixes: tuple
+    group_prefixes: tuple
+    partner_prefixes: MappingProxyType
+
+    def item_groups(self, item_id):
+        """Группы статьи по её идентификатору"""
+        return self.groups[item_id]
+
+    def group_partners(self, item_id, group_id):
+        """Партнёры группы по идентификаторам статьи и группы"""
+        return self.partners[(item_id, group_id)]
+
+    def triples(self):
+        """Все тройки (статья, группа, партнёр)"""
+        for item_id, item in enumerate(self.items):
+            for group_id, group in enumerate(self.groups[item_id]):
+                for partner in self.partners[(item_id, group_id)]:
+                    yield item, group, partner
+
+    def locate(self, item, group, partner):
+        """Идентификаторы статьи и группы тройки или None, если в этой версии её нет"""
+        try:
+            item_id = self.items.index(item)
+            group_id = self.groups[item_id].index(group)
+        except ValueError:
+            return None
+        if partner not in self.partners[(item_id, group_id)]:
+            return None
+        return item_id, group_id
+
+    def search_items(self, prefix):
+        """Идентификаторы статей, название или слово в названии которых начинается с prefix"""
+        return prefix_search(self.item_prefixes, prefix)
+
+    def search_groups(self, item_id, prefix):
+        """Идентификаторы групп статьи, подходящих под prefix"""
+        return prefix_search(self.group_prefixes[item_id], prefix)
+
+    def search_partners(self, item_id, group_id, prefix):
+        """Позиции партнёров группы, подходящих под prefix"""
+        return prefix_search(self.partner_prefixes[(item_id, group_id)], prefix)
+
+
+def build_prefix_index(names):
+    """
+    Отсортированные пары (ключ, позиция) для поиска по началу названия.
+    Ключами служат название без учёта регистра и его окончания, начинающиеся с каждого слова,
+    поэтому "ром" и "ромашка 2" находят "ООО Ромашка 2".
+    """
+    entries = set()
+    for position, name in enumerate(names):
+        words = name.casefold().split()
+        for start in range(len(words)):
+            entries.add((" ".join(words[start:]), position))
+    return tuple(sorted(entries))
+
+
+def prefix_search(index, prefix):
+    """Позиции названий, подходящих под prefix, по возрастанию. Поиск начала диапазона - O(log n)."""
+    prefix = " ".join(prefix.casefold().split())
+    found = set()
+    for position in range(bisect_left(index, (prefix,)), len(index)):
+        key, number = index[position]
+        if not key.startswith(prefix):
+            break
+        found.add(number)
+    return sorted(found)
+
+
+def index_digest(tree):
+    """Отпечаток дерева категорий"""
+    return hashlib.blake2b(repr(tree).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def build_category_index(rows):
+    """
+    Построение индекса категорий за один проход по строкам листа.
+    Первая строка - заголовок, порядок статей, групп и партнёров сохраняется.
+    """
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return make_category_index({})
+
+    try:
+        item_col = header.index(ITEM_COLUMN)
+        group_col = header.index(GROUP_COLUMN)
+        partner_col = header.index(PARTNER_COLUMN)
+    except ValueError as e:
+        raise RuntimeError(f'Неверный заголовок листа "категории": {e}')
+    width = max(item_col, group_col, partner_col) + 1
+
+    tree = {}
+    for row in rows:
+        if len(row) < width:
+            row = list(row) + [""] * (width - len(row))
+        item = row[item_col]
+        if not item:
+            continue
+        partners = tree.setdefault(item, {}).setdefault(row[group_col], {})
+        partners[row[partner_col]] = None
+
+    return make_category_index(tree)
+
+
+def make_category_index(tree):
+    """Индекс категорий по дереву статья -> группа -> партнёры"""
+    items = tuple(tree)
+    groups = tuple(tuple(tree[item]) for item in items)
+    partners = {
+        (item_id, group_id): tuple(tree[item][group])
+        for item_id, item in enumerate(items)
+        for group_id, group in enumerate(groups[item_id])
+    }
+    return CategoryIndex(
+        items=items,
+        groups=groups,
+        partners=MappingProxyType(partners),
+        digest=index_digest(tree),
+        item_prefixes=build_prefix_index(items),
+        group_prefixes=tuple(build_prefix_index(item_groups) for item_groups in groups),
+        partner_prefixes=MappingProxyType(
+            {key: build_prefix_index(names) for key, names in partners.items()}
+        ),
+    )
@@ -1,12 +1,16 @@
 import logging
 import re
+from math import ceil
 
-from handlers import submit_record_command
-from datetime import datetime
+from decimal import Decimal
+
+from handlers import submit_payment
 from telegram import Update, ForceReply, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ConversationHandler, ContextTypes
 
-from sheets import GoogleSheetsManager
+from payments import PaymentRequest, parse_amount, parse_period
+from search import triple_index
+from sheets import sheets_manager
 
 
 from config.logging_config import logger
@@ -26,28 +30,196 @@ from config.logging_config import logger
 
 payment_types = ["нал", "безнал", "крипта"]
 
+PAGE_SIZE = 8  # количество вариантов на одной странице клавиатуры выбора
+
+# Данные кнопок шагов диалога. Остальные кнопки (например, find_ из результатов /find)
+# не должны попадать в обработчики шагов.
+CHOICE_PATTERN = r"^(\d+|page_\d+)$"
+PAYMENT_TYPE_PATTERN = r"^\d+$"
+CONFIRM_PATTERN = "^(Подтвердить|Отмена)$"
+
+# Ключи user_data, сохраняемые между перезапусками бота. Сами категории не сохраняются:
+# диалог хранит только выбор пользователя и отпечаток версии категорий.
+DIALOG_KEYS = frozenset(
+    {
+        "chat_id",
+        "categories_digest",
+        "enter_sum_message_id",
+        "sum",
+        "item",
+        "item_id",
+        "group",
+        "group_id",
+        "partner",
+        "comment",
+        "dates",
+        "payment_method",
+        "search",
+        "preselected",
+    }
+)
+
+
+async def create_keyboard(massive, numbers=None, page=0):
+    """
+    Функция для создания клавиатуры. Каждый кнопка создаётся с новой строки.
+    Показывается страница из PAGE_SIZE вариантов с кнопками перехода между страницами.
+    numbers - позиции показываемых вариантов (по умолчанию все).
+    """
+    if numbers is None:
+        numbers = range(len(massive))
+    pages = max(1, ceil(len(numbers) / PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
 
-async def create_keyboard(massive):
-    """Функция для создания клавиатуры. Каждый кнопка создаётся с новой строки."""
     keyboard = []
-
-    for number, item in enumerate(massive):
-        button = InlineKeyboardButton(item, callback_data=number)
+    for number in numbers[page * PAGE_SIZE : (page + 1) * PAGE_SIZE]:
+        button = InlineKeyboardButton(massive[number], callback_data=number)
         keyboard.append([button])
 
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("« Назад", callback_data=f"page_{page - 1}"))
+    if page < pages - 1:
+        navigation.append(InlineKeyboardButton("Далее »", callback_data=f"page_{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
+
     return InlineKeyboardMarkup(keyboard)
 
 
-async def enter_record(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Начало диалога. Ввод суммы и получение данных о статьях, группах, партнёрах."""
-    manager = GoogleSheetsManager()
-    await manager.initialize_google_sheets()
-    options_dict, items = await manager.get_data()
+def choice_prompt(title, massive) -> str:
+    """Текст запроса выбора. Для длинных списков добавляется подсказка о поиске."""
+    if len(massive) > PAGE_SIZE:
+        return f"{title} или введите начало названия для поиска:"
+    return f"{title}:"
+
+
+def choice_options(categories, user_data, state):
+    """Варианты выбора на шаге state"""
+    if state == INPUT_ITEM:
+        return categories.items
+    if state == INPUT_GROUP:
+        return categories.item_groups(user_data["item_id"])
+    return categories.group_partners(user_data["item_id"], user_data["group_id"])
+
+
+def choice_search(categories, user_data, state, prefix):
+    """Позиции вариантов выбора на шаге state, подходящих под prefix"""
+    if state == INPUT_ITEM:
+        return categories.search_items(prefix)
+    if state == INPUT_GROUP:
+        return categories.search_groups(user_data["item_id"], prefix)
+    return categories.search_partners(user_data["item_id"], user_data["group_id"], prefix)
+
+
+async def turn_page(query, context, state) -> int:
+    """Переход на другую страницу клавиатуры выбора с учётом введённого поиска"""
+    categories = await dialog_categories(context)
+    options = choice_options(categories, context.user_data, state)
+    prefix = context.user_data.get("search")
+    numbers = choice_search(categories, context.user_data, state, prefix) if prefix else None
+
+    await query.answer()
+    reply_markup = await create_keyboard(options, numbers, int(query.data.split("_")[1]))
+    await query.edit_message_reply_markup(reply_markup=reply_markup)
+    return state
+
+
+async def search_choice(update: Update, context: ContextTypes.DEFAULT_TYPE, state) -> int:
+    """Поиск варианта выбора по началу названия, введённому пользователем"""
+    prefix = update.message.text.strip()
+    categories = await dialog_categories(context)
+    options = choice_options(categories, context.user_data, state)
+    numbers = choice_search(categories, context.user_data, state, prefix)
+
+    if not numbers:
+        await update.message.reply_text(
+            "Ничего не найдено. Введите другое начало названия или выберите вариант из списка."
+        )
+        return state
+
+    context.user_data["search"] = prefix
+    reply_markup = await create_keyboard(options, numbers)
+    await update.message.reply_text(f"Найдено: {len(numbers)}", reply_markup=reply_markup)
+    return state
+
+
+async def search_item(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Обработчик поиска статьи расхода."""
+    return await search_choice(update, context, INPUT_ITEM)
+
+
+async def search_group(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Обработчик поиска группы расхода."""
+    return await search_choice(update, context, INPUT_GROUP)
+
+
+async def search_partner(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Обработчик поиска партнёра."""
+    return await search_choice(update, context, INPUT_PARTNER)
+
+
+async def dialog_categories(context):
+    """Индекс категорий той версии, по которой построены кнопки диалога"""
+    return await sheets_manager.get_data(context.user_data.get("categories_digest"))
+
+
+async def categories_changed(query, context, categories) -> bool:
+    """
+    Проверка, что кнопки диалога построены по той же версии категорий.
+    Если версия больше недоступна, выбор статьи начинается заново по текущей версии.
+    """
+    if categories.digest == context.user_data.get("categories_digest"):
+        return False
+
+    context.user_data["categories_digest"] = categories.digest
+    context.user_data.pop("search", None)
+    await query.edit_message_text("Справочник категорий обновился.")
+    reply_markup = await create_keyboard(categories.items)
+    await query.message.reply_text(
+        choice_prompt("Выберите статью расхода", categories.items), reply_markup=reply_markup
+    )
+    return True
+
+
+async def preselect_triple(context, categories, number) -> bool:
+    """Выбор статьи, группы и партнёра по идентификатору тройки из результатов поиска"""
+    triple = await triple_index.get(categories, number)
+    position = categories.locate(*triple) if triple else None
+    if position is None:
+        return False
+
+    item, group, partner = triple
+    context.user_data.update(
+        item=item,
+        item_id=position[0],
+        group=group,
+        group_id=position[1],
+        partner=partner,
+        preselected=True,
+    )
+    return True
+
+
+async def start_dialog(update: Update, context: ContextTypes.DEFAULT_TYPE, number=None) -> int:
+    """Ввод суммы и получение данных о статьях, группах, партнёрах. number - тройка из поиска."""
+    categories = await sheets_manager.get_data()
+    message = update.effective_message
 
     context.user_data["chat_id"] = update.effective_chat.id
-    context.user_data["options"], context.user_data["items"] = options_dict, items
+    context.user_data["categories_digest"] = categories.digest
+    context.user_data.pop("preselected", None)
+
+    if number is not None:
+        if await preselect_triple(context, categories, number):
+            await message.reply_text(
+                f"Выбрано: {context.user_data['item']} / {context.user_data['group']} / "
+                f"{context.user_data['partner']}"
+            )
+        else:
+            await message.reply_text("Выбранный вариант не найден в справочнике категорий.")
 
-    bot_message = await update.message.reply_text(
+    bot_message = await message.reply_text(
         "Введите сумму:",
         reply_markup=ForceReply(selective=True),
     )
@@ -56,14 +228,30 @@ async def enter_record(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     return INPUT_SUM
 
 
+async def enter_record(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """
+    Начало диалога командой /enter_record.
+    /enter_record <id> (результат встроенного поиска) сразу выбирает статью, группу и партнёра.
+    """
+    return await start_dialog(update, context, context.args[0] if context.args else None)
+
+
+async def enter_found_record(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Начало диалога по кнопке результата /find."""
+    query = update.callback_query
+    await query.answer()
+    return await start_dialog(update, context, query.data.split("_", 1)[1])
+
+
 async def input_sum(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработчик ввода суммы и выбор категории."""
     user_sum = update.message.text
-    pattern = r"^[0-9]+(?:\.[0-9]+)?$"
 
     await update.message.from_user.delete_message(update.message.message_id)
 
-    if not re.fullmatch(pattern, user_sum):
+    try:
+        user_sum = str(parse_amount(user_sum))
+    except ValueError:
         await update.message.reply_text("Некорректная сумма. Попробуйте ещё раз.")
         bot_message = await update.message.reply_text(
             "Введите сумму:",
@@ -77,12 +265,20 @@ async def input_sum(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data["sum"] = user_sum
     await update.message.reply_text(f"Введена сумма: {user_sum}")
 
-    items = context.user_data["items"]
+    if context.user_data.pop("preselected", False):
+        await update.message.reply_text(
+            "Введите комментарий для отчёта:",
+            reply_markup=ForceReply(selective=True),
+        )
+        return INPUT_COMMENT
+
+    categories = await dialog_categories(context)
+    context.user_data["categories_digest"] = categories.digest
 
-    reply_markup = await create_keyboard(items)
+    reply_markup = await create_keyboard(categories.items)
 
     await update.message.reply_text(
-        "Выберите статью расхода:", reply_markup=reply_markup
+        choice_prompt("Выберите статью расхода", categories.items), reply_markup=reply_markup
     )
 
     return INPUT_ITEM
@@ -91,36 +287,38 @@ async def input_sum(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 async def input_item(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработчик выбора категории платежа."""
     query = update.callback_query
-    selected_item = context.user_data["items"][int(query.data)]
-    logger.info(f"Выбрана статья расхода: {selected_item}")
+    categories = await dialog_categories(context)
+    if await categories_changed(query, context, categories):
+        return INPUT_ITEM
+    if query.data.startswith("page_"):
+        return await turn_page(query, context, INPUT_ITEM)
+
+    context.user_data.pop("search", None)
+    item_id = int(query.data)
+    selected_item = categories.items[item_id]
+    logger.info("Выбрана статья расхода: %s", selected_item)
     await query.edit_message_text(f"Выбрана статья расхода: {selected_item}")
 
     context.user_data["item"] = selected_item
-    context.user_data["options"] = context.user_data["options"].get(selected_item)
-    groups = list(context.user_data["options"].keys())
-    context.user_data["groups"] = groups
-
-    del context.user_data["items"]
+    context.user_data["item_id"] = item_id
+    groups = categories.item_groups(item_id)
 
     if len(groups) == 1:
 
-        selected_group = context.user_data["groups"][0]
-        logger.info(f"Выбрана группа расхода: {selected_group}")
+        selected_group = groups[0]
+        logger.info("Выбрана группа расхода: %s", selected_group)
         context.user_data["group"] = selected_group
-        partners = context.user_data["options"].get(selected_group)
-        context.user_data["partners"] = context.user_data["options"].get(selected_group)
-        del context.user_data["options"]
-        del context.user_data["groups"]
+        context.user_data["group_id"] = 0
+        partners = categories.group_partners(item_id, 0)
 
         await context.bot.send_message(
             context.user_data["chat_id"], f"Выбрана группа расхода: {selected_group}"
         )
 
         if len(partners) == 1:
-            selected_partner = context.user_data["partners"][0]
-            logger.info(f"Выбран партнёр расхода: {selected_partner}")
+            selected_partner = partners[0]
+            logger.info("Выбран партнёр расхода: %s", selected_partner)
             context.user_data["partner"] = selected_partner
-            del context.user_data["partners"]
 
             await context.bot.send_message(
                 context.user_data["chat_id"], f"Выбран партнёр: {selected_partner}"
@@ -132,14 +330,16 @@ async def input_item(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
             )
             return INPUT_COMMENT
 
-        reply_markup = await create_keyboard(context.user_data["partners"])
-        await query.message.reply_text("Выберите партнёра:", reply_markup=reply_markup)
+        reply_markup = await create_keyboard(partners)
+        await query.message.reply_text(
+            choice_prompt("Выберите партнёра", partners), reply_markup=reply_markup
+        )
 
         return INPUT_PARTNER
 
     reply_markup = await create_keyboard(groups)
     await query.message.reply_text(
-        "Выберите группу расхода:", reply_markup=reply_markup
+        choice_prompt("Выберите группу расхода", groups), reply_markup=reply_markup
     )
 
     return INPUT_GROUP
@@ -148,21 +348,27 @@ async def input_item(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 async def input_group(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработчик выбора группы расходов."""
     query = update.callback_query
-    selected_group = context.user_data["groups"][int(query.data)]
-    logger.info(f"Выбрана группа расхода: {selected_group}")
+    categories = await dialog_categories(context)
+    if await categories_changed(query, context, categories):
+        return INPUT_ITEM
+    if query.data.startswith("page_"):
+        return await turn_page(query, context, INPUT_GROUP)
+
+    context.user_data.pop("search", None)
+    item_id = context.user_data["item_id"]
+    group_id = int(query.data)
+    selected_group = categories.item_groups(item_id)[group_id]
+    logger.info("Выбрана группа расхода: %s", selected_group)
     await query.edit_message_text(f"Выбрана группа расхода: {selected_group}")
 
     context.user_data["group"] = selected_group
-    partners = context.user_data["options"].get(selected_group)
-    context.user_data["partners"] = partners
-    del context.user_data["options"]
-    del context.user_data["groups"]
+    context.user_data["group_id"] = group_id
+    partners = categories.group_partners(item_id, group_id)
 
     if len(partners) == 1:
-        selected_partner = context.user_data["partners"][0]
-        logger.info(f"Выбран партнёр расхода: {selected_partner}")
+        selected_partner = partners[0]
+        logger.info("Выбран партнёр расхода: %s", selected_partner)
         context.user_data["partner"] = selected_partner
-        del context.user_data["partners"]
         await context.bot.send_message(
             context.user_data["chat_id"], f"Выбран партнёр: {selected_partner}"
         )
@@ -173,8 +379,10 @@ async def input_group(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
         )
         return INPUT_COMMENT
 
-    reply_markup = await create_keyboard(context.user_data["partners"])
-    await query.message.reply_text("Выберите партнёра:", reply_markup=reply_markup)
+    reply_markup = await create_keyboard(partners)
+    await query.message.reply_text(
+        choice_prompt("Выберите партнёра", partners), reply_markup=reply_markup
+    )
 
     return INPUT_PARTNER
 
@@ -182,12 +390,21 @@ async def input_group(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 async def input_partner(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработчик выбора партнёра к группе расходов платежа и создание цитирования для ввода комментария"""
     query = update.callback_query
-    selected_partner = context.user_data["partners"][int(query.data)]
-    logger.info(f"Выбран партнёр расхода: {selected_partner}")
+    categories = await dialog_categories(context)
+    if await categories_changed(query, context, categories):
+        return INPUT_ITEM
+    if query.data.startswith("page_"):
+        return await turn_page(query, context, INPUT_PARTNER)
+
+    context.user_data.pop("search", None)
+    partners = categories.group_partners(
+        context.user_data["item_id"], context.user_data["group_id"]
+    )
+    selected_partner = partners[int(query.data)]
+    logger.info("Выбран партнёр расхода: %s", selected_partner)
     await query.edit_message_text(f"Выбран партнёр: {selected_partner}")
 
     context.user_data["partner"] = selected_partner
-    del context.user_data["partners"]
 
     await query.message.reply_text(
         "Введите комментарий для отчёта:",
@@ -205,7 +422,7 @@ async def input_comment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         await update.message.reply_text("Некорректный комментарий. Попробуйте ещё раз")
         return ConversationHandler.END
 
-    logger.info(f"Введён комментарий {user_comment}")
+    logger.info("Введён комментарий %s", user_comment)
     context.user_data["comment"] = user_comment
 
     await update.message.from_user.delete_message(update.message.message_id)
@@ -224,17 +441,8 @@ async def input_dates(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     user_dates = update.message.text
 
     try:
-        pattern = r"(\d{2}\.\d{2}\s*)+"
-        match = re.search(pattern, user_dates)
-        if not re.fullmatch(pattern, user_dates):
-            await update.message.reply_text("Неверный формат дат.")
-        period_dates = match.group(0).split()
-        _ = [
-            datetime.strptime(f"01.{date}", "%d.%m.%y").strftime("%Y-%m-%d")
-            for date in period_dates
-        ]
-
-    except Exception:
+        user_dates = " ".join(parse_period(user_dates))
+    except ValueError:
         await update.message.reply_text(
             f"Неверный формат дат. Введите даты начисления платежей в формате mm.yy строго через"
             " пробел",
@@ -243,7 +451,7 @@ async def input_dates(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
         return INPUT_DATES
 
     context.user_data["dates"] = user_dates
-    logger.info(f"Введены даты: {user_dates}")
+    logger.info("Введены даты: %s", user_dates)
     await update.message.reply_text(f"Введены даты: {user_dates}")
 
     await update.message.from_user.delete_message(update.message.message_id)
@@ -259,16 +467,10 @@ async def input_payment_type(update: Update, context: ContextTypes) -> int:
     query = update.callback_query
     await query.answer()
     payment_type = payment_types[int(query.data)]
-    logger.info(f"Выбран тип платежа: {payment_type}")
+    logger.info("Выбран тип платежа: %s", payment_type)
     await query.edit_message_text(f"Выбран тип платежа: {payment_type}")
 
-    final_command = (
-        f"{context.user_data['sum']}; {context.user_data['item']}; "
-        f"{context.user_data['group']}; {context.user_data['partner']}; {context.user_data['comment']}; "
-        f"{context.user_data['dates']}; {payment_type}"
-    )
-
-    context.user_data["final_command"] = final_command
+    context.user_data["payment_method"] = payment_type
 
     buttons = [
         [InlineKeyboardButton("Подтвердить", callback_data="Подтвердить")],
@@ -288,28 +490,41 @@ async def input_payment_type(update: Update, context: ContextTypes) -> int:
     return CONFIRM_COMMAND
 
 
-async def confirm_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def confirm_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработчик подтверждения и отклонения итоговой команды."""
     query = update.callback_query
     await query.answer()
     await query.edit_message_reply_markup(reply_markup=None)
 
     if query.data == "Подтвердить":
-        context.args = context.user_data.get("final_command").split()
+        # Поля уже проверены на шагах диалога
+        user_data = context.user_data
+        request = PaymentRequest(
+            amount=Decimal(user_data["sum"]),
+            expense_item=user_data["item"],
+            expense_group=user_data["group"],
+            partner=user_data["partner"],
+            comment=user_data["comment"],
+            period=tuple(user_data["dates"].split()),
+            payment_method=user_data["payment_method"],
+        )
+        chat_id = user_data["chat_id"]
         context.user_data.clear()
-        logger.info(f"Платёж подтверждён @{query.from_user.username}")
-        await submit_record_command(update, context)
+        logger.info("Платёж подтверждён @%s", query.from_user.username)
+        await submit_payment(request, chat_id, context)
+        return ConversationHandler.END
 
     elif query.data == "Отмена":
-        logger.info(f"Платёж отменён @{query.from_user.username}")
-        await stop_dialog(update, context)
+        logger.info("Платёж отменён @%s", query.from_user.username)
+        return await stop_dialog(update, context)
+
 
 async def stop_dialog(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Обработчик команды /stop."""
+    """Обработчик команды /stop и кнопки "Отмена" (ответ в сообщение с кнопкой)."""
 
     context.user_data.clear()
 
-    await update.message.reply_text(
+    await update.effective_message.reply_text(
         "Диалог был остановлен. Начните заново с командой /enter_record",
         reply_markup=InlineKeyboardMarkup([]),
     )
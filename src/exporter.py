@@ -0,0 +1,119 @@
+import asyncio
+import random
+
+from db import db
+from sheets import build_payment_rows, get_today_moscow_time, sheets_manager
+from config.logging_config import logger
+
+
+BATCH_SIZE = 50  # максимальное количество заявок в одной выгрузке
+POLL_INTERVAL = 5  # секунды между проверками очереди без уведомлений
+BASE_DELAY = 2  # секунды до первой повторной попытки
+MAX_DELAY = 600  # максимальная задержка между попытками
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед повторной попыткой со случайным разбросом"""
+
+    delay = min(MAX_DELAY, BASE_DELAY * 2 ** attempts)
+    return random.uniform(delay / 2, delay)
+
+
+class SheetsExporter:
+    """
+    Фоновая выгрузка оплаченных заявок из очереди 'export_outbox' в Google Sheets.
+    Заявки из очереди выгружаются пачками одним запросом append_rows,
+    при ошибке выгрузка откладывается с экспоненциальной задержкой.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        """Запуск фоновой выгрузки"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка фоновой выгрузки. Невыгруженные заявки остаются в очереди."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """Сообщает о новой заявке в очереди, чтобы выгрузить её без ожидания"""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                while await self.export_batch() == self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error("Ошибка фоновой выгрузки в Google Sheets: %s", e)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def export_batch(self):
+        """
+        Выгрузка одной пачки заявок из очереди. Возвращает количество взятых заявок.
+        Заявки, строки которых не удаётся построить, откладываются отдельно и не задерживают
+        остальные. Перед добавлением строк заявки отмечаются (claim_export): если строки не добавлены,
+        отметка снимается и выгрузка откладывается, иначе заявки повторно не выгружаются,
+        даже если отметить их выгруженными не удалось.
+        """
+        async with db:
+            batch = await db.fetch_export_batch(self.batch_size)
+        if not batch:
+            return 0
+
+        today_date = await get_today_moscow_time()
+        rows = []
+        exported = []
+        for item in batch:
+            try:
+                rows.extend(build_payment_rows(item["record"], today_date))
+            except (ValueError, TypeError, ArithmeticError) as e:
+                logger.error("Заявка %s не выгружена: неверные данные: %s", item["record"]["id"], e)
+                async with db:
+                    await db.mark_export_failed(
+                        [(item["outbox_id"], retry_delay(item["attempts"]))],
+                        f"Неверные данные заявки: {e}",
+                    )
+                continue
+            exported.append(item)
+
+        if not exported:
+            return len(batch)
+
+        async with db:
+            await db.claim_export([item["outbox_id"] for item in exported])
+        try:
+            await sheets_manager.append_payment_rows(rows)
+        except Exception as e:
+            logger.error("Не удалось выгрузить %s заявок в Google Sheets: %s", len(exported), e)
+            async with db:
+                await db.mark_export_failed(
+                    [(item["outbox_id"], retry_delay(item["attempts"])) for item in exported],
+                    str(e),
+                )
+            return 0
+
+        async with db:
+            await db.mark_exported([item["outbox_id"] for item in exported])
+        logger.info("Выгружено заявок в Google Sheets: %s", len(exported))
+        return len(batch)
+
+
+sheets_exporter = SheetsExporter()
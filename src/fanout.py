@@ -0,0 +1,117 @@
+import asyncio
+import time
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+
+from config.logging_config import logger
+
+
+MAX_CONCURRENCY = 10  # одновременных запросов send_message
+GLOBAL_RATE = 30  # сообщений в секунду на бота
+CHAT_RATE = 1  # сообщений в секунду на чат
+CHAT_BURST = 3  # сообщений подряд в один чат без ожидания
+MAX_RETRIES = 3  # повторных попыток после RetryAfter
+IDLE_BUCKET_TTL = 60  # секунды, после которых неиспользуемый лимит чата удаляется
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов по алгоритму token bucket"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Ожидание свободного токена"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class FanOutSender:
+    """
+    Рассылка сообщения в несколько чатов одновременно.
+    Количество одновременных запросов ограничено, частота отправки ограничена
+    на бота и на каждый чат; при RetryAfter отправка повторяется после паузы.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=MAX_CONCURRENCY,
+        global_rate=GLOBAL_RATE,
+        chat_rate=CHAT_RATE,
+        chat_burst=CHAT_BURST,
+    ):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._chats = {}
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            self._prune_buckets()
+            bucket = self._chats[chat_id] = TokenBucket(self._chat_rate, self._chat_burst)
+        return bucket
+
+    def _prune_buckets(self):
+        now = time.monotonic()
+        for chat_id in [
+            chat_id
+            for chat_id, bucket in self._chats.items()
+            if now - bucket.updated_at > IDLE_BUCKET_TTL
+        ]:
+            del self._chats[chat_id]
+
+    async def send(self, bot, chat_ids, text, reply_markup=None, **kwargs):
+        """
+        Отправка сообщения во все чаты.
+        Возвращает словарь chat_id -> отправленное сообщение или исключение.
+        """
+        chat_ids = list(dict.fromkeys(chat_ids))
+        results = await asyncio.gather(
+            *(
+                self._send_one(bot, chat_id, text, reply_markup, **kwargs)
+                for chat_id in chat_ids
+            )
+        )
+        return dict(zip(chat_ids, results))
+
+    async def _send_one(self, bot, chat_id, text, reply_markup, **kwargs):
+        for attempt in range(MAX_RETRIES + 1):
+            async with self._semaphore:
+                await self._chat_bucket(chat_id).acquire()
+                await self._global.acquire()
+                try:
+                    return await bot.send_message(
+                        chat_id=chat_id, text=text, reply_markup=reply_markup, **kwargs
+                    )
+                except RetryAfter as e:
+                    error = e
+                    delay = e.retry_after
+                    if isinstance(delay, timedelta):
+                        delay = delay.total_seconds()
+                except Exception as e:
+                    return e
+
+            if attempt < MAX_RETRIES:
+                logger.warning(
+                    "Превышен лимит отправки в чат %s, повтор через %s с.", chat_id, delay
+                )
+                await asyncio.sleep(delay)
+        return error
+
+
+fanout = FanOutSender()
@@ -1,17 +1,43 @@
+import asyncio
+import html
+import os
 import re
-import textwrap
-
+import tempfile
 from datetime import datetime
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+
+from telegram import (
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+)
 from telegram.ext import CallbackContext, ContextTypes
 
 
+from bulk import read_payments
 from config.config import Config
-from db import db
-from sheets import GoogleSheetsManager
+from db import db, Status
+from exporter import sheets_exporter
+from fanout import fanout
+from metrics import registry
+from payments import PaymentRequest, parse_amount, parse_payment_request
+from reports import budget_report, build_report, parse_budget_args, parse_report_args
+from search import triple_index
+from sheets import moscow_tz, sheets_manager
 from config.logging_config import logger
 
 
+NOT_PAID_PAGE_SIZE = 10  # максимальное количество заявок на странице /show_not_paid
+MESSAGE_LIMIT = 4096  # максимальная длина сообщения Telegram
+CALLBACK_DATA_LIMIT = 64  # максимальная длина данных кнопки Telegram, байт
+APPROVAL_GROUP_SIZE = 10  # количество заявок из файла в одном сообщении на одобрение
+MAX_APPROVAL_MESSAGES = 2  # сообщений с кнопками на одну загрузку; о большем количестве заявок - одна сводка
+MAX_UPLOAD_SIZE = 20 * 1024 * 1024  # максимальный размер загружаемого файла (ограничение Bot API)
+APPROVE_BATCH_SIZE = 20  # максимальное количество заявок в /approve_batch
+CHECKED, UNCHECKED = "☑", "☐"  # отметки выбранных и невыбранных заявок в /approve_batch
+
+
 async def chat_ids_department(department) -> list[str]:
     """Возвращяет chat_id для подгрупп"""
 
@@ -26,6 +52,28 @@ async def chat_ids_department(department) -> list[str]:
     return chat_ids[department]
 
 
+def chat_department(chat_id) -> str | None:
+    """Отдел, одобряющий заявки из чата chat_id: "head", "finance" или None"""
+
+    if chat_id in Config.department_head_chat_id:
+        return "head"
+    if chat_id in Config.finance_chat_ids:
+        return "finance"
+    return None
+
+
+def actor(user) -> str:
+    """Имя пользователя для журнала согласований: @username или id, если username не задан"""
+
+    return f"@{user.username}" if user.username else str(user.id)
+
+
+def is_developer_chat(update: Update) -> bool:
+    """Проверяет, что команда отправлена из чата разработчика"""
+
+    return str(update.effective_chat.id) == str(Config.developer_chat_id)
+
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /start."""
 
@@ -48,20 +96,202 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     )
 
 
+async def reload_categories_command(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Обработчик команды /reload_categories. Принудительно обновляет кэш категорий."""
+
+    if not is_developer_chat(update):
+        await update.message.reply_text("Команда доступна только администратору.")
+        return
+
+    version = await sheets_manager.reload_categories()
+    await update.message.reply_text(f"Категории обновлены. Версия кэша: {version}")
+
+
+async def export_status_command(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Обработчик команды /export_status. Показывает состояние очереди выгрузки в Google Sheets."""
+
+    if not is_developer_chat(update):
+        await update.message.reply_text("Команда доступна только администратору.")
+        return
+
+    async with db:
+        stats = await db.export_queue_stats()
+
+    text = (
+        f"Заявок в очереди выгрузки: {stats['depth']}\n"
+        f"Ожидание старейшей заявки: {stats['lag']:.0f} с\n"
+        f"Заявок с ошибками выгрузки: {stats['failing']}\n"
+        f"Заявок с прерванной выгрузкой (проверьте лист вручную): {stats['claimed']}"
+    )
+    if stats["last_error"]:
+        text += f"\nПоследняя ошибка: {stats['last_error']}"
+    await update.message.reply_text(text)
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /stats. Показывает задержки обработчиков и обращений к сервисам."""
+
+    if not is_developer_chat(update):
+        await update.message.reply_text("Команда доступна только администратору.")
+        return
+
+    lines = ["<b>Обработчики</b> (кол-во, p50, p99, с):"]
+    for labels, histogram in sorted(registry.histograms("handler_latency_seconds").items()):
+        lines.append(
+            f"{dict(labels)['handler']}: {histogram.count}, "
+            f"{histogram.quantile(0.5):.3f}, {histogram.quantile(0.99):.3f}"
+        )
+    lines.append("\n<b>Сервисы</b> (кол-во, p50, p99, с):")
+    for labels, histogram in sorted(registry.histograms("downstream_latency_seconds").items()):
+        labels = dict(labels)
+        lines.append(
+            f"{labels['service']}.{labels['method']}: {histogram.count}, "
+            f"{histogram.quantile(0.5):.3f}, {histogram.quantile(0.99):.3f}"
+        )
+    lines.append("\n<b>Согласования</b> (одобрено, отклонено, оплачено):")
+    async with db:
+        approver_stats = await db.approver_stats()
+    for username, actions in approver_stats:
+        lines.append(
+            f"{html.escape(username)}: {actions.get('approve', 0)}, "
+            f"{actions.get('reject', 0)}, {actions.get('pay', 0)}"
+        )
+    lines.append(f"\n<b>Google Sheets</b>: {sheets_manager.stats}")
+    lines.append(f"<b>Кэш категорий</b>: {sheets_manager.categories.stats}")
+
+    text = "\n".join(lines)
+    await update.message.reply_text(text[:MESSAGE_LIMIT], parse_mode="HTML")
+
+
+async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик команды /report. Сроки одобрения и оплаты, открытые заявки по отделам
+    и суммы по статьям, группам и месяцам.
+    """
+
+    chat_ids = await chat_ids_department("all")
+    if update.effective_chat.id not in chat_ids and not is_developer_chat(update):
+        await update.message.reply_text("Команда доступна участникам согласования заявок.")
+        return
+
+    try:
+        kind, days = parse_report_args(context.args)
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+
+    text = await build_report(kind, days)
+    await update.message.reply_text(text[:MESSAGE_LIMIT])
+
+
+async def budget_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик команды /budget [mm.yy] [статья]. Оплаченные суммы за месяц начисления
+    из сводки бюджета, по умолчанию - за текущий месяц.
+    """
+
+    chat_ids = await chat_ids_department("all")
+    if update.effective_chat.id not in chat_ids and not is_developer_chat(update):
+        await update.message.reply_text("Команда доступна участникам согласования заявок.")
+        return
+
+    month, expense_item = parse_budget_args(context.args, datetime.now(moscow_tz))
+    text = await budget_report(month, expense_item)
+    await update.message.reply_text(text[:MESSAGE_LIMIT])
+
+
+async def rebuild_budget_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /rebuild_budget. Пересчитывает сводку бюджета по всем оплаченным заявкам."""
+
+    if not is_developer_chat(update):
+        await update.message.reply_text("Команда доступна только администратору.")
+        return
+
+    async with db:
+        count = await db.rebuild_budget()
+    await update.message.reply_text(f"Сводка бюджета пересчитана. Оплаченных заявок: {count}")
+
+
+def format_triple(triple) -> str:
+    """Текст тройки (статья, группа, партнёр) для результатов поиска"""
+
+    item, group, partner = triple
+    return f"{partner} — {item} / {group}" if partner else f"{item} / {group}"
+
+
+async def find_categories(text):
+    """Нечёткий поиск троек (статья, группа, партнёр) в текущей версии категорий"""
+
+    return await triple_index.find(await sheets_manager.get_data(), text)
+
+
+async def find_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик команды /find. Ищет статью, группу и партнёра по части названия;
+    кнопка результата начинает создание заявки с уже выбранными значениями.
+    """
+
+    text = " ".join(context.args or [])
+    if not text:
+        await update.message.reply_text("Укажите текст для поиска, например: /find ромашка")
+        return
+
+    results = await find_categories(text)
+    if not results:
+        await update.message.reply_text("Ничего не найдено.")
+        return
+
+    keyboard = [
+        [InlineKeyboardButton(format_triple(triple), callback_data=f"find_{number}")]
+        for number, triple in results
+    ]
+    await update.message.reply_text(
+        "Выберите вариант, чтобы создать заявку:",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+    )
+
+
+async def inline_find(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик встроенного поиска @бот <текст>.
+    Выбранный результат отправляет в чат команду /enter_record <id>.
+    """
+
+    query = update.inline_query
+    if not query.query.strip():
+        await query.answer([])
+        return
+
+    results = await find_categories(query.query)
+    await query.answer(
+        [
+            InlineQueryResultArticle(
+                id=number,
+                title=partner or group,
+                description=f"{item} / {group}",
+                input_message_content=InputTextMessageContent(f"/enter_record {number}"),
+            )
+            for number, (item, group, partner) in results
+        ],
+        cache_time=Config.categories_cache_ttl,
+    )
+
+
 async def submit_record_command(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
     """
-    Обработчик введённого пользователем платежа в соответствии с паттерном:
+    Обработчик введённого пользователем платежа в формате
+    "сумма; статья; группа; партнёр; комментарий; даты начисления; форма оплаты":
     1)Сумма счёта: положительное число (возможно с плавающей точкой)
-    2)Статья расхода: любая строка из букв и цифр
-    3)Группа расхода: любая строка из букв и цифр
-    4)Партнёр: любая строка из букв и цифр
-    5)Дата: как минимум 2 даты; дата оплаты и дата(ы) начисления платежа
-    6)Форма оплаты: любая строка из букв и цифр
-    7)Комментарий к платежу: любая строка из букв и цифр
-    Добавление платежа в базу данных 'approvals';
-    Отправление данных о платеже для одобрения главой отдела.
+    2)Статья расхода, 3)Группа расхода, 4)Партнёр: любая строка
+    5)Комментарий к платежу: любая строка, может содержать ";"
+    6)Даты начисления платежа в формате mm.yy через пробел
+    7)Форма оплаты: любая строка
     """
 
     initiator_chat_id = update.effective_chat.id
@@ -71,62 +301,83 @@ async def submit_record_command(
         )
         raise ValueError(f"Необходимо ввести данные о платеже.")
 
-    pattern = (
-        r"((?:0|[1-9]\d*)(?:\.\d+)?)\s*;\s*([^;]+)\s*;\s*([^;]+)\s*;\s*([^;]+)\s*;\s*([^;]+)\s*;"
-        r"\s*((?:\d{2}\.\d{2}\s*){1,})\s*;\s*([^;]+)$"
-    )
-    message = " ".join(context.args)
-    match = re.match(pattern, message)
-    if not match:
-        await context.bot.send_message(
-            chat_id=initiator_chat_id,
-            text="Неверный формат аргументов. Пожалуйста, следуйте указанному формату.\n"
-            "1)Сумма счёта: положительное число (возможно с плавающей точкой)\n"
-            "2)Статья расхода: любая строка из букв и цифр\n"
-            "3)Группа расхода: любая строка из букв и цифр\n"
-            "4)Партнёр: любая строка из букв и цифр\n"
-            "5)Дата: как минимум 2 даты; дата оплаты и дата(ы) начисления платежа\n"
-            "6)Форма оплаты: любая строка из букв и цифр\n"
-            "7)Комментарий к платежу: любая строка из букв и цифр\n"
-        )
-
     try:
-        period_dates = match.group(6).split()
-        _ = [
-            datetime.strptime(date, "%m.%y").strftime("%m.%Y") for date in period_dates
-        ]
-
-    except Exception as e:
-        await context.bot.send_message(
-            chat_id=initiator_chat_id,
-            text=f'Ошибка {e}. Введены неверные даты. Даты вводятся в формате mm.yy. '
-                 f'строго через пробел(например: "08.22 10.22"). Пожалуйста, следуйте указанному формату.'
-        )
+        request = parse_payment_request(" ".join(context.args))
+    except ValueError as e:
+        await context.bot.send_message(chat_id=initiator_chat_id, text=str(e))
         return
 
-    record_dict = {
-        "amount": match.group(1),
-        "expense_item": match.group(2),
-        "expense_group": match.group(3),
-        "partner": match.group(4),
-        "comment": match.group(5),
-        "period": match.group(6),
-        "payment_method": match.group(7),
-        "approvals_needed": 1 if float(match.group(1)) < 50000 else 2,
-        "approvals_received": 0,
-        "status": "Not processed",
-        "approved_by": None,
-    }
+    await submit_payment(request, initiator_chat_id, context)
+
+
+async def submit_payment(
+    request: PaymentRequest, initiator_chat_id, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    """
+    Добавление заявки на платёж в базу данных 'approvals'
+    и отправка её на одобрение главе отдела. Возвращает id заявки.
+    """
 
+    record = request.as_record(initiator_chat_id)
     try:
         async with db:
-            approval_id = await db.insert_record(record_dict)
+            approval_id = await db.insert_record(record)
     except Exception as e:
         raise RuntimeError(f"Произошла ошибка при добавлении счёта в базу данных. {e}")
 
     await create_and_send_approval_message(
-        approval_id, initiator_chat_id, record_dict, "head", context=context
+        approval_id, initiator_chat_id, record, "head", context=context
     )
+    return approval_id
+
+
+async def upload_payments(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик загруженного файла CSV или XLSX с заявками на платёж.
+    Корректные строки добавляются в базу данных одной транзакцией и отправляются
+    главе отдела на одобрение группами, а при большом количестве - одной сводкой
+    (см. create_and_send_bulk_approval_messages); о некорректных строках сообщается отправителю.
+    """
+
+    document = update.message.document
+    if document.file_size and document.file_size > MAX_UPLOAD_SIZE:
+        await update.message.reply_text("Файл слишком большой.")
+        return
+
+    categories = await sheets_manager.get_data()
+    extension = os.path.splitext(document.file_name or "")[1].lower()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"payments{extension}")
+        file = await document.get_file()
+        await file.download_to_drive(path)
+        try:
+            result = await asyncio.to_thread(read_payments, path, categories)
+        except ValueError as e:
+            await update.message.reply_text(str(e))
+            return
+
+    approval_ids = []
+    if result.requests:
+        records = [request.as_record(update.effective_chat.id) for request in result.requests]
+        try:
+            async with db:
+                approval_ids = await db.insert_records(records)
+        except Exception as e:
+            raise RuntimeError(f"Произошла ошибка при добавлении счетов в базу данных. {e}")
+
+        for approval_id, record in zip(approval_ids, records):
+            record["id"] = approval_id
+        await create_and_send_bulk_approval_messages(records, "head", context)
+
+    lines = [f"Строк в файле: {result.total}. Создано заявок: {len(approval_ids)}."]
+    if approval_ids:
+        lines.append(f"Номера заявок: {approval_ids[0]}-{approval_ids[-1]}.")
+    if result.invalid:
+        lines.append(f"Некорректных строк: {result.invalid}.")
+        lines.extend(f"Строка {row_number}: {text}" for row_number, text in result.errors)
+        if result.invalid > len(result.errors):
+            lines.append("...")
+    await update.message.reply_text("\n".join(lines)[:MESSAGE_LIMIT])
 
 
 async def reject_record_command(
@@ -150,12 +401,13 @@ async def reject_record_command(
     row_id = row_id[0]
 
     async with db:
-        result = await db.get_row_by_id(row_id)
-
-        if not result:
-            raise RuntimeError(f"Запись с id: {row_id} не найдена.")
+        rejected = await db.reject(row_id, actor(update.effective_user))
 
-        await db.update_row_by_id(row_id, {"status": "Rejected"})
+    if not rejected:
+        await update.message.reply_text(
+            f"Заявка {row_id} не найдена, уже оплачена или отклонена."
+        )
+        return
 
     await update.message.reply_text(f"Заявка {row_id} отклонена.")
 
@@ -198,6 +450,83 @@ async def create_and_send_approval_message(
     await send_message_to_chats(chat_ids, message_text, context, reply_markup)
 
 
+def summary_line(record) -> str:
+    """Краткое описание заявки для сообщений с несколькими заявками"""
+
+    return (
+        f'{record["id"]}) сумма: {record["amount"]}, {record["expense_item"]} / '
+        f'{record["expense_group"]} / {record["partner"]}, период: {record["period"]}, '
+        f'форма оплаты: {record["payment_method"]}, комментарий: {record["comment"][:50]}'
+    )
+
+
+async def create_and_send_bulk_approval_messages(
+    records, department, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """
+    Отправка нескольких заявок на одобрение отделу department.
+    В одном сообщении до APPROVAL_GROUP_SIZE заявок, у каждой свои кнопки "Одобрить" и "Отклонить".
+    Если сообщений понадобилось бы больше MAX_APPROVAL_MESSAGES, отправляется одна сводка
+    с предложением одобрить заявки через /approve_batch.
+    """
+
+    chat_ids = await chat_ids_department(department)
+    if len(records) > APPROVAL_GROUP_SIZE * MAX_APPROVAL_MESSAGES:
+        await send_message_to_chats(chat_ids, bulk_approval_summary(records), context)
+        return
+
+    for start in range(0, len(records), APPROVAL_GROUP_SIZE):
+        group = records[start : start + APPROVAL_GROUP_SIZE]
+        lines = ["Пожалуйста, одобрите запросы на платеж:"]
+        lines.extend(summary_line(record) for record in group)
+        keyboard = [
+            [
+                InlineKeyboardButton(
+                    f"Одобрить {record['id']}",
+                    callback_data=f"approval_{department}_approve_{record['id']}_"
+                    f"{record['initiator_chat_id']}_group",
+                ),
+                InlineKeyboardButton(
+                    f"Отклонить {record['id']}",
+                    callback_data=f"approval_{department}_reject_{record['id']}_"
+                    f"{record['initiator_chat_id']}_group",
+                ),
+            ]
+            for record in group
+        ]
+        await send_message_to_chats(
+            chat_ids, "\n".join(lines)[:MESSAGE_LIMIT], context, InlineKeyboardMarkup(keyboard)
+        )
+
+
+def bulk_approval_summary(records) -> str:
+    """Сводка о большом количестве заявок на одобрение вместо сообщения с кнопками для каждой"""
+
+    ids = [record["id"] for record in records]
+    total = sum(record["amount"] for record in records)
+    return (
+        f"Поступило заявок на платёж: {len(records)}, номера {min(ids)}-{max(ids)}, "
+        f"общая сумма: {total}.\n"
+        f"Для одобрения отправьте /approve_batch: команда показывает по {APPROVE_BATCH_SIZE} заявок, "
+        f"ожидающих одобрения, их можно отметить и одобрить или отклонить одним действием."
+    )
+
+
+async def create_and_send_bulk_payment_message(records, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Одно сообщение плательщикам со всеми одобренными заявками и кнопкой "Оплачено" у каждой."""
+
+    lines = ["Запросы на платёж одобрены. Пожалуйста, оплатите заявки:"]
+    lines.extend(summary_line(record) for record in records)
+    keyboard = [
+        [InlineKeyboardButton(f"Оплачено {record['id']}", callback_data=f"pay_{record['id']}_group")]
+        for record in records
+    ]
+    chat_ids = await chat_ids_department("payers")
+    await send_message_to_chats(
+        chat_ids, "\n".join(lines)[:MESSAGE_LIMIT], context, InlineKeyboardMarkup(keyboard)
+    )
+
+
 async def create_and_send_payment_message(
     approval_id, approved_users, record, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
@@ -220,20 +549,17 @@ async def create_and_send_payment_message(
 
 
 async def send_message_to_chats(chat_ids, text, context, reply_markup=None):
-    """Отправка сообщения в выбранные телеграм-чаты."""
-
-    for chat_id in chat_ids:
-        await context.bot.send_message(
-            chat_id=chat_id, text=text, reply_markup=reply_markup
-        )
-
-
-async def add_record_to_google_sheet(record) -> None:
-    """Функция для добавления строки в таблицу Google Sheet."""
+    """
+    Отправка сообщения в выбранные телеграм-чаты.
+    Сообщения отправляются параллельно; ошибка отправки в один чат не прерывает рассылку.
+    Возвращает словарь chat_id -> отправленное сообщение или исключение.
+    """
 
-    manager = GoogleSheetsManager()
-    await manager.initialize_google_sheets()
-    await manager.add_payment_to_sheet(record)
+    results = await fanout.send(context.bot, chat_ids, text, reply_markup)
+    for chat_id, result in results.items():
+        if isinstance(result, Exception):
+            logger.error("Не удалось отправить сообщение в чат %s: %s", chat_id, result)
+    return results
 
 
 async def process_pay(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -248,26 +574,58 @@ async def process_pay(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     except Exception as e:
         raise RuntimeError(f'Ошибка считывания данных с кнопки "Оплачено". Ошибка: {e}')
 
+    # Заявка попадает в очередь выгрузки и сводку бюджета в той же транзакции, что и смена статуса
     async with db:
-        record = await db.get_row_by_id(approval_id)
+        paid = await db.mark_paid(approval_id, actor(update.callback_query.from_user))
 
-        if not record:
-            raise RuntimeError(f"Запись {approval_id} для оплаты не найдена в таблице")
+    if not paid:
+        await answer_request(
+            update,
+            approval_id,
+            f"Заявка {approval_id} не найдена, уже оплачена, отклонена или не одобрена.",
+        )
+        return
 
-    async with db:
-        await db.update_row_by_id(approval_id, {"status": "Paid"})
+    sheets_exporter.notify()
 
-    await update.callback_query.edit_message_text(
-        text=f"Заявка {approval_id} оплачена.", reply_markup=InlineKeyboardMarkup([])
-    )
+    await answer_request(update, approval_id, f"Заявка {approval_id} оплачена.")
+
+
+def callback_approval_id(data) -> str:
+    """id заявки из данных кнопок "Одобрить"/"Отклонить" и "Оплачено"."""
+
+    parts = data.split("_")
+    return parts[3] if parts[0] == "approval" else parts[1]
+
+
+async def answer_request(update: Update, approval_id, text) -> None:
+    """
+    Замена кнопок заявки результатом обработки.
+    В сообщении с несколькими заявками убираются только кнопки этой заявки, а результат
+    добавляется к тексту сообщения.
+    """
 
-    # При нажатии "Оплачено" добавляем данные в таблицу
-    await add_record_to_google_sheet(record)
+    query = update.callback_query
+    if not query.data.endswith("_group"):
+        await query.edit_message_text(text=text, reply_markup=InlineKeyboardMarkup([]))
+        return
+
+    keyboard = [
+        row
+        for row in query.message.reply_markup.inline_keyboard
+        if callback_approval_id(row[0].callback_data) != str(approval_id)
+    ]
+    await query.edit_message_text(
+        text=f"{query.message.text}\nЗаявка {approval_id}: {text}"[:MESSAGE_LIMIT],
+        reply_markup=InlineKeyboardMarkup(keyboard),
+    )
 
 
 async def process_approval(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Обработчик нажатий пользователем кнопок "Одобрить" или "Отклонить."
+    Статус заявки меняется одним атомарным запросом; повторное нажатие
+    или одновременное нажатие несколькими пользователями не теряет апрувы.
     """
 
     try:
@@ -275,200 +633,253 @@ async def process_approval(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         department, action = response_list[1:3]
         approval_id = response_list[3]
         initiator_id = response_list[4]
-        approved_user = "@" + update.callback_query.from_user.username
-
-        async with db:
-            record = await db.get_row_by_id(approval_id)
-            if not record:
-                raise RuntimeError("Запись в таблице с данным id не найдена.")
-
-            approved_users_in_db = record["approved_by"]
-            if approved_users_in_db:
-                approved_users = f"{approved_users_in_db}, {approved_user}"
-            else:
-                approved_users = approved_user
+        approver = actor(update.callback_query.from_user)
 
     except Exception as e:
         raise RuntimeError(f'Ошибка обработки кнопок "Одобрить" и "Отклонить". Ошибка: {e}')
 
-    await handle_head_approval(
-        context,
-        approval_id,
-        initiator_id,
-        approved_users,
-        record,
-        department,
-        action,
-        update=update,
-    )
+    expected_status = Status.NOT_PROCESSED if department == "head" else Status.PENDING
+    new_status = Status.APPROVED if action == "approve" else Status.REJECTED
 
+    async with db:
+        record = await db.transition(
+            approval_id, expected_status, new_status, approver, department
+        )
 
-async def handle_head_approval(
-    context,
-    approval_id,
-    initiator_id,
-    approved_users,
-    record,
-    department,
-    action,
-    update: Update,
-) -> None:
-    """Обработчик заявок для одобрения или отклонения."""
+    if record is None:
+        await answer_request(update, approval_id, f"Заявка {approval_id} уже обработана.")
+        return
 
     if action == "reject":
         await reject_payment(
-            context,
-            approval_id,
-            initiator_id,
-            approved_users,
-            department,
-            update=update,
+            context, approval_id, initiator_id, approver, department, update=update
         )
 
     elif action == "approve":
-        await approve_payment(
-            context,
-            approval_id,
-            initiator_id,
-            approved_users,
-            record,
-            department,
-            update=update,
-        )
+        await approve_payment(context, approval_id, initiator_id, record, update=update)
 
 
 async def reject_payment(
-    context, approval_id, initiator_id, approved_users, department, update: Update
+    context, approval_id, initiator_id, approver, department, update: Update
 ) -> None:
-    """Отправка сообщения об отклонении платежа и изменение статуса платежа."""
+    """Отправка сообщения об отклонении платежа."""
 
     if department == "finance":
-        approved_by = approved_users.split(", ")
-        async with db:
-            await db.update_row_by_id(
-                approval_id,
-                {
-                    "approvals_received": 1,
-                    "status": "Rejected",
-                },
-            )
-        await update.callback_query.edit_message_text(
-            text=f"Заявка {approval_id} отклонена.",
-            reply_markup=InlineKeyboardMarkup([]),
-        )
-
-        await context.bot.send_message(
-            initiator_id, f"Заявка {approval_id} отклонена {approved_by[1]}."
-        )
-
+        text = f"Заявка {approval_id} отклонена."
     else:
+        text = f"Заявка {approval_id} отклонена руководителем департамента."
 
-        async with db:
-            await db.update_row_by_id(
-                approval_id, {"approvals_received": 0, "status": "Rejected"}
-            )
-
-        await update.callback_query.edit_message_text(
-            text=f"Заявка {approval_id} отклонена руководителем департамента.",
-            reply_markup=InlineKeyboardMarkup([]),
-        )
+    await answer_request(update, approval_id, text)
 
-        await context.bot.send_message(
-            initiator_id, f"Заявка {approval_id} отклонена {approved_users}."
-        )
+    await context.bot.send_message(
+        initiator_id, f"Заявка {approval_id} отклонена {approver}."
+    )
 
 
 async def approve_payment(
     context,
     approval_id,
     initiator_id,
-    approved_users,
     record,
-    department,
     update: Update,
 ):
     """
-    Функция выполняет одну из трёх команд в зависимости от входных данных:
-    1)отправка сообщения в финансовый отдел на согласование платежа, если платёж более 50000, меняет количество апрувов
-     и статус платежа;
-    2)отправка сообщения об одобрении платежа для главы департамента, если платёж менее 50000, меняет количество
-     апрувов и статус платежа;
-    3)отправка сообщения об одобрении платежа для финансового отдела, меняет количество апрувов и статус платежа.
+    Отправка сообщений после одобрения заявки:
+    1)в финансовый отдел на согласование, если заявке нужен ещё один апрув (платёж от 50000);
+    2)плательщикам, если заявка получила все необходимые апрувы.
     """
 
-    if department == "head":
-        if float(record["amount"]) >= 50000:
+    if record["status"] == Status.PENDING:
+        await answer_request(
+            update, approval_id, "Запрос на одобрение отправлен в финансовый " "отдел."
+        )
+        await create_and_send_approval_message(
+            approval_id, initiator_id, record, "finance", context=context
+        )
 
-            async with db:
-                await db.update_row_by_id(
-                    approval_id,
-                    {
-                        "approvals_received": 1,
-                        "status": "Pending",
-                        "approved_by": approved_users,
-                    },
-                )
-                record = await db.get_row_by_id(approval_id)
+    else:
+        await answer_request(
+            update, approval_id, "Запрос на платеж одобрен. Заявка готова к оплате."
+        )
+        async with db:
+            approvers = await db.approvers([record["id"]])
+        await create_and_send_payment_message(
+            approval_id, ", ".join(approvers.get(record["id"], [])), record, context
+        )
 
-            await update.callback_query.edit_message_text(
-                text="Запрос на одобрение отправлен в финансовый " "отдел.",
-                reply_markup=InlineKeyboardMarkup([]),
-            )
-            await create_and_send_approval_message(
-                approval_id, initiator_id, record, "finance", context=context
+
+def batch_keyboard(department, options) -> InlineKeyboardMarkup:
+    """
+    Клавиатура /approve_batch. options - список (id заявки, подпись, выбрана ли).
+    Выбор хранится в самих кнопках и не требует состояния на стороне бота.
+    """
+
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                f"{CHECKED if checked else UNCHECKED} {label}",
+                callback_data=f"batch_{department}_toggle_{approval_id}",
             )
+        ]
+        for approval_id, label, checked in options
+    ]
+    if options:
+        keyboard.append(
+            [InlineKeyboardButton("Выбрать все", callback_data=f"batch_{department}_all")]
+        )
+        keyboard.append(
+            [
+                InlineKeyboardButton(
+                    "Одобрить выбранные", callback_data=f"batch_{department}_approve"
+                ),
+                InlineKeyboardButton(
+                    "Отклонить выбранные", callback_data=f"batch_{department}_reject"
+                ),
+            ]
+        )
+    return InlineKeyboardMarkup(keyboard)
 
-        else:
 
-            async with db:
-                await db.update_row_by_id(
-                    approval_id,
-                    {
-                        "approvals_received": 1,
-                        "status": "Approved",
-                        "approved_by": approved_users,
-                    },
+def batch_options(reply_markup) -> list:
+    """Заявки и отметки выбора из клавиатуры /approve_batch"""
+
+    options = []
+    for row in reply_markup.inline_keyboard:
+        button = row[0]
+        if "_toggle_" in button.callback_data:
+            options.append(
+                (
+                    button.callback_data.rsplit("_", 1)[1],
+                    button.text[2:],
+                    button.text.startswith(CHECKED),
                 )
+            )
+    return options
 
-                record = await db.get_row_by_id(approval_id)
 
-            await update.callback_query.edit_message_text(
-                text="Запрос на платеж одобрен. Заявка готова к оплате.",
-                reply_markup=InlineKeyboardMarkup([]),
-            )
+async def approve_batch_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик команды /approve_batch. Показывает заявки, ожидающие одобрения отделом чата;
+    отмеченные заявки одобряются или отклоняются одним действием.
+    """
 
-            await create_and_send_payment_message(
-                approval_id, approved_users, record, context
+    department = chat_department(update.effective_chat.id)
+    if department is None:
+        await update.message.reply_text(
+            "Команда доступна руководителю департамента и финансовому отделу."
+        )
+        return
+
+    expected_status = Status.NOT_PROCESSED if department == "head" else Status.PENDING
+    async with db:
+        rows = [
+            row._asdict()
+            async for row in db.find_open(
+                limit=APPROVE_BATCH_SIZE, filters={"status": expected_status}
             )
+        ]
+    if not rows:
+        await update.message.reply_text("Нет заявок, ожидающих одобрения.")
+        return
 
-    elif department == "finance":
+    lines = ["Отметьте заявки и нажмите «Одобрить выбранные» или «Отклонить выбранные»:"]
+    lines.extend(summary_line(row) for row in rows)
+    options = [
+        (row["id"], f"{row['id']}: {row['amount']}, {row['partner']}", False) for row in rows
+    ]
+    await update.message.reply_text(
+        "\n".join(lines)[:MESSAGE_LIMIT], reply_markup=batch_keyboard(department, options)
+    )
 
-        async with db:
-            await db.update_row_by_id(
-                approval_id,
-                {
-                    "approvals_received": 2,
-                    "status": "Approved",
-                    "approved_by": approved_users,
-                },
-            )
 
-            record = await db.get_row_by_id(approval_id)
+async def process_batch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик кнопок /approve_batch: отметка заявок, одобрение и отклонение выбранных.
+    Статусы всех выбранных заявок меняются одним запросом в одной транзакции.
+    """
+
+    query = update.callback_query
+    try:
+        _, department, action, *toggled = query.data.split("_")
+        options = batch_options(query.message.reply_markup)
+    except Exception as e:
+        raise RuntimeError(f"Ошибка обработки кнопок /approve_batch. Ошибка: {e}")
+
+    if action == "toggle":
+        options = [
+            (number, label, checked != (number == toggled[0]))
+            for number, label, checked in options
+        ]
+    elif action == "all":
+        select = not all(checked for _, _, checked in options)
+        options = [(number, label, select) for number, label, _ in options]
+    if action in ("toggle", "all"):
+        await query.answer()
+        await query.edit_message_reply_markup(reply_markup=batch_keyboard(department, options))
+        return
+
+    selected = [int(number) for number, _, checked in options if checked]
+    if not selected:
+        await query.answer("Не выбрано ни одной заявки.")
+        return
+    await query.answer()
 
-        await update.callback_query.edit_message_text(
-            text="Запрос на платеж одобрен. Заявка готова к оплате.",
-            reply_markup=InlineKeyboardMarkup([]),
+    approver = actor(query.from_user)
+    expected_status = Status.NOT_PROCESSED if department == "head" else Status.PENDING
+    new_status = Status.APPROVED if action == "approve" else Status.REJECTED
+    async with db:
+        records = await db.transition_many(
+            selected, expected_status, new_status, approver, department
         )
-        await create_and_send_payment_message(
-            approval_id, approved_users, record, context
+
+    changed = sorted(record["id"] for record in records)
+    lines = [query.message.text]
+    if changed:
+        verb = "Одобрены" if action == "approve" else "Отклонены"
+        lines.append(f"{verb}: {', '.join(map(str, changed))}")
+    skipped = [number for number in selected if number not in changed]
+    if skipped:
+        lines.append(f"Уже обработаны: {', '.join(map(str, skipped))}")
+    remaining = [option for option in options if not option[2]]
+    await query.edit_message_text(
+        "\n".join(lines)[:MESSAGE_LIMIT], reply_markup=batch_keyboard(department, remaining)
+    )
+
+    if action == "reject":
+        await notify_batch_rejected(records, approver, department, context)
+        return
+
+    pending = [record for record in records if record["status"] == Status.PENDING]
+    approved = [record for record in records if record["status"] == Status.APPROVED]
+    if pending:
+        await create_and_send_bulk_approval_messages(pending, "finance", context)
+    if approved:
+        await create_and_send_bulk_payment_message(approved, context)
+
+
+async def notify_batch_rejected(records, approver, department, context) -> None:
+    """Одно сообщение каждому инициатору со списком его отклонённых заявок."""
+
+    by_initiator = {}
+    for record in records:
+        if record["initiator_chat_id"] is not None:
+            by_initiator.setdefault(record["initiator_chat_id"], []).append(str(record["id"]))
+    suffix = "" if department == "finance" else " руководителем департамента"
+    await asyncio.gather(
+        *(
+            send_message_to_chats(
+                [chat_id], f"Заявки {', '.join(ids)} отклонены{suffix} {approver}.", context
+            )
+            for chat_id, ids in by_initiator.items()
         )
+    )
 
 
 async def error_callback(update: Update, context: CallbackContext) -> None:
     """Обработчик ошибок для логирования и уведомления пользователя с детальной информацией об ошибке."""
 
     error_text = str(context.error)
-    logger.error(f"{error_text}")
+    logger.error("%s", error_text)
     message_text = f'{error_text}'
     if update:
         try:
@@ -477,32 +888,221 @@ async def error_callback(update: Update, context: CallbackContext) -> None:
             return
 
         except Exception as e:
-            text = f"Ошибка при отправке уведомления об ошибке: {e}."
-            logger.error(text)
+            logger.error("Ошибка при отправке уведомления об ошибке: %s.", e)
             return
 
 
 
-async def show_not_paid(update: Update) -> None:
+# Подписи полей заявки в /show_not_paid
+record_labels = (
+    ("id", "id заявки"),
+    ("amount", "сумма"),
+    ("expense_item", "статья"),
+    ("expense_group", "группа"),
+    ("partner", "партнёр"),
+    ("comment", "комментарий"),
+    ("period", "период дат"),
+    ("payment_method", "способ оплаты"),
+    ("approvals_needed", "апрувов требуется"),
+    ("approvals_received", "апрувов получено"),
+    ("status", "статус"),
+)
+
+# Значения фильтра status= в /show_not_paid
+status_filters = {
+    "not_processed": Status.NOT_PROCESSED,
+    "pending": Status.PENDING,
+    "approved": Status.APPROVED,
+}
+
+filter_pattern = re.compile(r"(\w+)=(.*?)(?=\s+\w+=|$)")
+
+
+def parse_not_paid_filters(args) -> dict:
     """
-    Возвращает все неоплаченные заявки на платежи из таблицы "approvals"
+    Разбор фильтров /show_not_paid вида "status=pending item=Аренда min=100 max=5000".
+    Выбрасывает ValueError при неизвестном фильтре или неверном значении.
+    """
+
+    filters = {}
+    for key, value in filter_pattern.findall(" ".join(args or [])):
+        value = value.strip()
+        if key == "status":
+            if value.lower() not in status_filters:
+                raise ValueError(
+                    f"Неизвестный статус {value}. Доступны: {', '.join(status_filters)}"
+                )
+            filters["status"] = status_filters[value.lower()]
+        elif key == "item":
+            filters["expense_item"] = value
+        elif key in ("min", "max"):
+            try:
+                filters[f"{key}_amount"] = parse_amount(value)
+            except ValueError:
+                raise ValueError(f"Неверная сумма в фильтре {key}: {value}")
+        else:
+            raise ValueError(f"Неизвестный фильтр {key}. Доступны: status, item, min, max")
+    return filters
+
+
+def encode_not_paid_filters(filters) -> str:
+    """
+    Фильтры /show_not_paid для данных кнопок навигации: "s2,a100,b5000,iАренда".
+    Статья идёт последней, так как может содержать запятые.
+    """
+
+    parts = []
+    if filters.get("status") is not None:
+        parts.append(f"s{int(filters['status'])}")
+    if filters.get("min_amount") is not None:
+        parts.append(f"a{filters['min_amount']}")
+    if filters.get("max_amount") is not None:
+        parts.append(f"b{filters['max_amount']}")
+    if filters.get("expense_item") is not None:
+        parts.append(f"i{filters['expense_item']}")
+    return ",".join(parts)
+
+
+def decode_not_paid_filters(encoded) -> dict:
+    """Разбор фильтров из encode_not_paid_filters. Выбрасывает ValueError при неверных данных."""
+
+    filters = {}
+    while encoded:
+        if encoded[0] == "i":
+            filters["expense_item"] = encoded[1:]
+            break
+        part, _, encoded = encoded.partition(",")
+        if part[:1] == "s":
+            filters["status"] = Status(int(part[1:]))
+        elif part[:1] in ("a", "b"):
+            filters["min_amount" if part[0] == "a" else "max_amount"] = parse_amount(part[1:])
+        else:
+            raise ValueError(f"Неизвестный фильтр {part!r}")
+    return filters
+
+
+def not_paid_callback(direction, cursor, filters) -> str:
+    """
+    Данные кнопки навигации /show_not_paid: направление, курсор и фильтры.
+    Выбрасывает ValueError, если фильтры не помещаются в данные кнопки.
+    """
+
+    data = f"notpaid_{direction}_{cursor}_{encode_not_paid_filters(filters)}"
+    if len(data.encode()) > CALLBACK_DATA_LIMIT:
+        raise ValueError(
+            "Фильтры слишком длинные для кнопок навигации. Уберите часть фильтров или сократите их."
+        )
+    return data
+
+
+def format_record(row, approvers) -> str:
+    """Текст одной заявки для /show_not_paid. approvers - одобрившие заявку пользователи."""
+
+    fields = ", ".join(
+        f"{label}: {row.status.label if key == 'status' else getattr(row, key)}"
+        for key, label in record_labels
+    )
+    return f"{fields}, кем апрувенно: {', '.join(approvers) or None}"
+
+
+def fit_records(lines, limit, from_end=False) -> int:
+    """
+    Количество записей, которые помещаются в сообщение длиной limit.
+    При from_end=True записи набираются с конца списка.
+    """
+
+    size = 0
+    count = 0
+    for line in reversed(lines) if from_end else lines:
+        size += len(line) + 2
+        if size > limit and count:
+            break
+        count += 1
+    return count
+
+
+async def render_not_paid_page(filters, after_id=0, before_id=None):
+    """
+    Текст и клавиатура одной страницы неоплаченных заявок.
+    Страница содержит не более NOT_PAID_PAGE_SIZE заявок и не длиннее сообщения Telegram.
+    Фильтры передаются в данных кнопок навигации (см. not_paid_callback).
     """
 
     async with db:
-        rows = await db.find_not_paid()
-    messages = []
+        rows = [
+            row
+            async for row in db.find_open(
+                NOT_PAID_PAGE_SIZE + 1, after_id, filters, before_id
+            )
+        ]
+        approvers = await db.approvers([row.id for row in rows])
 
-    for i, record in enumerate(rows, start=1):
-        line = ", ".join([f"{key}: {value}" for key, value in record.items()])
-        message_line = f"{i}. {line}"
-        wrapped_message = textwrap.fill(message_line, width=4096)
-        messages.append(wrapped_message)
+    backward = before_id is not None
+    has_more = len(rows) > NOT_PAID_PAGE_SIZE
+    if has_more:
+        rows = rows[1:] if backward else rows[:-1]
 
-    final_text = "\n\n".join(messages)
+    if not rows:
+        return "Заявок не обнаружено", None
+
+    lines = [format_record(row, approvers.get(row.id, []))[:MESSAGE_LIMIT] for row in rows]
+    count = fit_records(lines, MESSAGE_LIMIT, from_end=backward)
+    if count < len(rows):
+        has_more = True
+        rows = rows[-count:] if backward else rows[:count]
+        lines = lines[-count:] if backward else lines[:count]
+
+    has_prev = has_more if backward else after_id > 0
+    has_next = True if backward else has_more
+
+    buttons = []
+    if has_prev:
+        data = not_paid_callback("prev", rows[0].id, filters)
+        buttons.append(InlineKeyboardButton("« Назад", callback_data=data))
+    if has_next:
+        data = not_paid_callback("next", rows[-1].id, filters)
+        buttons.append(InlineKeyboardButton("Вперёд »", callback_data=data))
+
+    reply_markup = InlineKeyboardMarkup([buttons]) if buttons else None
+    return "\n\n".join(lines), reply_markup
 
-    if final_text:
-        await update.message.reply_text(final_text)
-    else:
-        await update.message.reply_text("Заявок не обнаружено")
 
-    return
\ No newline at end of file
+async def show_not_paid(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик команды /show_not_paid.
+    Возвращает первую страницу неоплаченных заявок на платежи из таблицы "approvals".
+    Поддерживает фильтры status=, item=, min=, max=.
+    """
+
+    try:
+        filters = parse_not_paid_filters(context.args)
+        text, reply_markup = await render_not_paid_page(filters)
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+
+async def show_not_paid_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик кнопок "Назад" и "Вперёд" в /show_not_paid"""
+
+    query = update.callback_query
+    await query.answer()
+
+    try:
+        _, direction, cursor, encoded = query.data.split("_", 3)
+        cursor = int(cursor)
+        filters = decode_not_paid_filters(encoded)
+    except ValueError as e:
+        raise RuntimeError(f"Ошибка считывания данных с кнопки навигации. Ошибка: {e}")
+
+    try:
+        if direction == "prev":
+            text, reply_markup = await render_not_paid_page(filters, before_id=cursor)
+        else:
+            text, reply_markup = await render_not_paid_page(filters, after_id=cursor)
+    except ValueError as e:
+        # Курсор следующей страницы может оказаться длиннее, чем на первой
+        text, reply_markup = str(e), None
+    await query.edit_message_text(text, reply_markup=reply_markup)
@@ -0,0 +1,124 @@
+import asyncio
+
+from config.logging_config import logger
+
+
+MAX_BODY_SIZE = 1024 * 1024  # максимальный размер тела запроса в байтах
+REQUEST_TIMEOUT = 10  # секунды на чтение запроса
+
+reasons = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class Request:
+    """HTTP-запрос"""
+
+    __slots__ = ("method", "path", "headers", "body")
+
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+
+class HttpServer:
+    """
+    Минимальный асинхронный HTTP/1.1 сервер на asyncio.
+    Обработчик маршрута - корутина, принимающая Request и возвращающая
+    (код ответа, тип содержимого, тело).
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._routes = {}
+        self._server = None
+
+    def route(self, method, path, handler):
+        """Регистрация обработчика для метода и пути"""
+        self._routes[(method, path)] = handler
+
+    async def start(self):
+        """Запуск сервера"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info("HTTP-сервер запущен на %s:%s", self.host, self.port)
+
+    async def stop(self):
+        """Остановка приёма новых соединений"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            logger.info("HTTP-сервер остановлен.")
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(self._read_request(reader), REQUEST_TIMEOUT)
+            if isinstance(request, int):
+                status, content_type, body = request, "text/plain", reasons[request]
+            else:
+                status, content_type, body = await self._dispatch(request)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1")
+            + body
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            return 400
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            return 400
+        if length > MAX_BODY_SIZE:
+            return 413
+        body = await reader.readexactly(length) if length else b""
+        return Request(method, target.split("?", 1)[0], headers, body)
+
+    async def _dispatch(self, request):
+        handler = self._routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self._routes):
+                return 405, "text/plain", reasons[405]
+            return 404, "text/plain", reasons[404]
+        try:
+            return await handler(request)
+        except Exception as e:
+            logger.error("Ошибка обработки HTTP-запроса %s %s: %s", request.method, request.path, e)
+            return 500, "text/plain", reasons[500]
@@ -1,24 +1,36 @@
+import asyncio
+
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
     ConversationHandler,
+    InlineQueryHandler,
     MessageHandler,
     filters
 )
 
 from config.config import Config
+from config.logging_config import configure_logging
 from conversation import (
     enter_record,
+    enter_found_record,
     input_sum,
     input_item,
     input_group,
     input_partner,
+    search_item,
+    search_group,
+    search_partner,
     input_comment,
     input_dates,
     input_payment_type,
     confirm_command,
     stop_dialog,
+    DIALOG_KEYS,
+    CHOICE_PATTERN,
+    PAYMENT_TYPE_PATTERN,
+    CONFIRM_PATTERN,
 )
 from handlers import (
     start_command,
@@ -26,9 +38,29 @@ from handlers import (
     error_callback,
     reject_record_command,
     show_not_paid,
+    show_not_paid_page,
     process_pay,
     process_approval,
+    reload_categories_command,
+    export_status_command,
+    stats_command,
+    report_command,
+    budget_command,
+    rebuild_budget_command,
+    find_command,
+    inline_find,
+    upload_payments,
+    approve_batch_command,
+    process_batch,
 )
+from db import db
+from exporter import sheets_exporter
+from http_server import HttpServer
+from metrics import instrument_handler, registry
+from persistence import DialogPersistence
+from sheets import sheets_manager
+from update_processor import ChatOrderedUpdateProcessor
+from webhook import WebhookServer
 
 (
     INPUT_SUM,
@@ -41,39 +73,156 @@ from handlers import (
     CONFIRM_COMMAND,
 ) = range(8)
 
+state_names = {
+    INPUT_SUM: "INPUT_SUM",
+    INPUT_ITEM: "INPUT_ITEM",
+    INPUT_GROUP: "INPUT_GROUP",
+    INPUT_PARTNER: "INPUT_PARTNER",
+    INPUT_COMMENT: "INPUT_COMMENT",
+    INPUT_DATES: "INPUT_DATES",
+    INPUT_PAYMENT_TYPE: "INPUT_PAYMENT_TYPE",
+    CONFIRM_COMMAND: "CONFIRM_COMMAND",
+}
+
+async def serve_metrics(request):
+    """Метрики бота в текстовом формате Prometheus"""
+    return 200, "text/plain; version=0.0.4; charset=utf-8", registry.render()
+
+
+def create_metrics_server() -> HttpServer:
+    """HTTP-сервер метрик бота"""
+    server = HttpServer(Config.metrics_host, Config.metrics_port)
+    server.route("GET", "/metrics", serve_metrics)
+    return server
+
+
+def instrument_handlers(application: Application) -> None:
+    """
+    Замер времени работы всех зарегистрированных обработчиков.
+    Обработчики диалога помечаются состоянием, в котором они вызываются.
+    """
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                for entry_point in handler.entry_points:
+                    entry_point.callback = instrument_handler(
+                        entry_point.callback, f"entry:{entry_point.callback.__name__}"
+                    )
+                for state, state_handlers in handler.states.items():
+                    for state_handler in state_handlers:
+                        state_handler.callback = instrument_handler(
+                            state_handler.callback, f"state:{state_names[state]}"
+                        )
+                for fallback in handler.fallbacks:
+                    fallback.callback = instrument_handler(
+                        fallback.callback, f"fallback:{fallback.callback.__name__}"
+                    )
+            else:
+                handler.callback = instrument_handler(handler.callback, handler.callback.__name__)
+
+
+async def on_startup(application: Application) -> None:
+    """Инициализация общих ресурсов бота при запуске."""
+    await db.setup()
+    await sheets_manager.start()
+    await sheets_exporter.start()
+    if Config.metrics_port:
+        application.bot_data["metrics_server"] = create_metrics_server()
+        await application.bot_data["metrics_server"].start()
+
+
+async def on_shutdown(application: Application) -> None:
+    """Освобождение общих ресурсов бота при остановке."""
+    if "metrics_server" in application.bot_data:
+        await application.bot_data["metrics_server"].stop()
+    await sheets_exporter.stop()
+    await sheets_manager.close()
+    await db.close()
+
 
 def main() -> None:
     """Основная функция для запуска бота."""
-    application = Application.builder().token(Config.telegram_bot_token).build()
+    configure_logging()
+    application = (
+        Application.builder()
+        .token(Config.telegram_bot_token)
+        .concurrent_updates(ChatOrderedUpdateProcessor(Config.max_concurrent_updates))
+        .persistence(DialogPersistence(DIALOG_KEYS))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("submit_record", submit_record_command))
     application.add_handler(CommandHandler("reject_record", reject_record_command))
     application.add_handler(CommandHandler("show_not_paid", show_not_paid))
+    application.add_handler(
+        CommandHandler("reload_categories", reload_categories_command)
+    )
+    application.add_handler(CommandHandler("export_status", export_status_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("report", report_command))
+    application.add_handler(CommandHandler("budget", budget_command))
+    application.add_handler(CommandHandler("rebuild_budget", rebuild_budget_command))
+    application.add_handler(CommandHandler("find", find_command))
+    application.add_handler(CommandHandler("approve_batch", approve_batch_command))
+    application.add_handler(InlineQueryHandler(inline_find))
+    application.add_handler(
+        MessageHandler(
+            filters.Document.FileExtension("csv") | filters.Document.FileExtension("xlsx"),
+            upload_payments,
+        )
+    )
+    application.add_handler(
+        CallbackQueryHandler(show_not_paid_page, pattern="^notpaid_.*")
+    )
     application.add_handler(CallbackQueryHandler(process_pay, pattern="^pay_.*"))
+    application.add_handler(CallbackQueryHandler(process_batch, pattern="^batch_.*"))
     application.add_handler(
         CallbackQueryHandler(process_approval, pattern="^approval_.*")
     )
     conversation_handler = ConversationHandler(
-        entry_points=[CommandHandler("enter_record", enter_record)],
+        entry_points=[
+            CommandHandler("enter_record", enter_record),
+            CallbackQueryHandler(enter_found_record, pattern="^find_"),
+        ],
         states={
             INPUT_SUM: [MessageHandler(filters.TEXT & ~filters.COMMAND, input_sum)],
-            INPUT_ITEM: [CallbackQueryHandler(input_item)],
-            INPUT_GROUP: [CallbackQueryHandler(input_group)],
-            INPUT_PARTNER: [CallbackQueryHandler(input_partner)],
+            INPUT_ITEM: [
+                CallbackQueryHandler(input_item, pattern=CHOICE_PATTERN),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, search_item),
+            ],
+            INPUT_GROUP: [
+                CallbackQueryHandler(input_group, pattern=CHOICE_PATTERN),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, search_group),
+            ],
+            INPUT_PARTNER: [
+                CallbackQueryHandler(input_partner, pattern=CHOICE_PATTERN),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, search_partner),
+            ],
             INPUT_COMMENT: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, input_comment)
             ],
             INPUT_DATES: [MessageHandler(filters.TEXT & ~filters.COMMAND, input_dates)],
-            INPUT_PAYMENT_TYPE: [CallbackQueryHandler(input_payment_type)],
-            CONFIRM_COMMAND: [CallbackQueryHandler(confirm_command)],
+            INPUT_PAYMENT_TYPE: [
+                CallbackQueryHandler(input_payment_type, pattern=PAYMENT_TYPE_PATTERN)
+            ],
+            CONFIRM_COMMAND: [CallbackQueryHandler(confirm_command, pattern=CONFIRM_PATTERN)],
         },
         fallbacks=[
             CommandHandler("stop", stop_dialog),
         ],
+        name="enter_record",
+        persistent=True,
     )
     application.add_handler(conversation_handler)
     application.add_error_handler(error_callback)
-    application.run_polling(close_loop=False)
+    instrument_handlers(application)
+
+    if Config.update_mode == "webhook":
+        asyncio.run(WebhookServer(application).serve())
+    else:
+        application.run_polling(close_loop=False)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+import re
+from dataclasses import dataclass
+from decimal import Decimal
+
+from db import Status
+
+
+amount_pattern = re.compile(r"[0-9]+(?:\.[0-9]{1,2})?")  # рубли и не более двух знаков копеек
+month_pattern = re.compile(r"(?:0[1-9]|1[0-2])\.[0-9]{2}")  # месяц начисления mm.yy, только цифры ASCII
+SECOND_APPROVAL_AMOUNT = Decimal(50000)  # сумма, с которой заявке нужно два одобрения
+
+FORMAT_ERROR = (
+    "Неверный формат аргументов. Пожалуйста, следуйте указанному формату.\n"
+    "1)Сумма счёта: положительное число (возможно с копейками через точку)\n"
+    "2)Статья расхода: любая строка из букв и цифр\n"
+    "3)Группа расхода: любая строка из букв и цифр\n"
+    "4)Партнёр: любая строка из букв и цифр\n"
+    "5)Комментарий к платежу: любая строка\n"
+    "6)Даты начисления платежа в формате mm.yy через пробел\n"
+    "7)Форма оплаты: любая строка из букв и цифр\n"
+    "Пункты разделяются точкой с запятой."
+)
+PERIOD_ERROR = (
+    'Введены неверные даты. Даты вводятся в формате mm.yy '
+    'строго через пробел (например: "08.22 10.22"). Пожалуйста, следуйте указанному формату.'
+)
+
+
+@dataclass(frozen=True, slots=True)
+class PaymentRequest:
+    """Заявка на платёж. Поля проверяются при разборе, объект создаётся уже из корректных значений."""
+
+    amount: Decimal
+    expense_item: str
+    expense_group: str
+    partner: str
+    comment: str
+    period: tuple
+    payment_method: str
+
+    @property
+    def approvals_needed(self):
+        return 1 if self.amount < SECOND_APPROVAL_AMOUNT else 2
+
+    @property
+    def period_text(self):
+        return " ".join(self.period)
+
+    def as_record(self, initiator_chat_id):
+        """Запись для таблицы 'approvals'"""
+        return {
+            "amount": self.amount,
+            "expense_item": self.expense_item,
+            "expense_group": self.expense_group,
+            "partner": self.partner,
+            "comment": self.comment,
+            "period": self.period_text,
+            "payment_method": self.payment_method,
+            "approvals_needed": self.approvals_needed,
+            "approvals_received": 0,
+            "status": Status.NOT_PROCESSED,
+            "initiator_chat_id": initiator_chat_id,
+        }
+
+
+def parse_amount(text) -> Decimal:
+    """Сумма счёта. Выбрасывает ValueError при неверном формате."""
+    text = text.strip()
+    if not amount_pattern.fullmatch(text):
+        raise ValueError(f"Некорректная сумма: {text}")
+    return Decimal(text)
+
+
+def parse_period(text) -> tuple:
+    """Месяцы начисления в формате mm.yy. Выбрасывает ValueError при неверном формате."""
+    period = tuple(text.split())
+    if not period:
+        raise ValueError(PERIOD_ERROR)
+    # Регулярное выражение, а не str.isdigit(): та пропускает цифры других алфавитов ("٠١", "²")
+    if not all(month_pattern.fullmatch(date) for date in period):
+        raise ValueError(PERIOD_ERROR)
+    return period
+
+
+def parse_payment_fields(amount, item, group, partner, comment, period, payment_method):
+    """Заявка на платёж из отдельных полей. Выбрасывает ValueError при неверном значении."""
+    fields = [field.strip() for field in (item, group, partner, comment, payment_method)]
+    if not all(fields):
+        raise ValueError(FORMAT_ERROR)
+    item, group, partner, comment, payment_method = fields
+    try:
+        amount = parse_amount(amount)
+    except ValueError:
+        raise ValueError(FORMAT_ERROR)
+
+    return PaymentRequest(
+        amount=amount,
+        expense_item=item,
+        expense_group=group,
+        partner=partner,
+        comment=comment,
+        period=parse_period(period),
+        payment_method=payment_method,
+    )
+
+
+def parse_payment_request(text) -> PaymentRequest:
+    """
+    Разбор текстовой заявки "сумма; статья; группа; партнёр; комментарий; даты; форма оплаты"
+    за один проход: первые четыре поля отделяются слева, последние два - справа,
+    всё между ними - комментарий, который может содержать ";".
+    Выбрасывает ValueError при неверном формате.
+    """
+    head = text.split(";", 4)
+    if len(head) < 5:
+        raise ValueError(FORMAT_ERROR)
+    amount, item, group, partner, rest = head
+
+    tail = rest.rsplit(";", 2)
+    if len(tail) < 3:
+        raise ValueError(FORMAT_ERROR)
+    comment, period, payment_method = tail
+
+    return parse_payment_fields(amount, item, group, partner, comment, period, payment_method)
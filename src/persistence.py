@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from db import db
+from config.logging_config import logger
+
+
+UPDATE_INTERVAL = 10  # секунды между передачей изменений диалогов из приложения
+FLUSH_DELAY = 1  # секунды накопления изменений перед записью в базу данных
+
+
+class DialogPersistence(BasePersistence):
+    """
+    Хранение состояний диалогов и данных пользователей в базе данных бота.
+    Сохраняются только ключи user_data из keys, данные чатов и бота не хранятся.
+    Изменения накапливаются и записываются в базу одной транзакцией.
+    """
+
+    def __init__(self, keys, update_interval=UPDATE_INTERVAL, flush_delay=FLUSH_DELAY):
+        super().__init__(
+            store_data=PersistenceInput(
+                bot_data=False, chat_data=False, user_data=True, callback_data=False
+            ),
+            update_interval=update_interval,
+        )
+        self.keys = keys
+        self.flush_delay = flush_delay
+        self._states = {}
+        self._data = {}
+        self._flush_task = None
+
+    async def get_user_data(self):
+        # Данные читаются при инициализации приложения, до post_init
+        await db.setup()
+        async with db:
+            rows = await db.load_dialog_data()
+        return {user_id: json.loads(data) for user_id, data in rows.items()}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        await db.setup()
+        async with db:
+            rows = await db.load_dialog_states(name)
+        return {tuple(json.loads(key)): state for key, state in rows.items()}
+
+    async def update_conversation(self, name, key, new_state):
+        self._states[(name, json.dumps(key))] = new_state
+        self._schedule_flush()
+
+    async def update_user_data(self, user_id, data):
+        choices = {key: value for key, value in data.items() if key in self.keys}
+        self._data[user_id] = json.dumps(choices, ensure_ascii=False) if choices else None
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id):
+        self._data[user_id] = None
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        """Немедленная запись накопленных изменений. Вызывается при остановке бота."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self._write()
+
+    def _schedule_flush(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_delay)
+        self._flush_task = None
+        await self._write()
+
+    async def _write(self):
+        states, self._states = self._states, {}
+        data, self._data = self._data, {}
+        if not states and not data:
+            return
+
+        try:
+            async with db:
+                await db.save_dialogs(
+                    [(name, key, state) for (name, key), state in states.items()],
+                    list(data.items()),
+                )
+        except Exception as e:
+            # Изменения, пришедшие во время записи, новее и не перезаписываются
+            self._states = {**states, **self._states}
+            self._data = {**data, **self._data}
+            logger.error("Не удалось сохранить состояние диалогов: %s", e)
+            return
+        logger.debug("Сохранены диалоги: %s состояний, %s пользователей", len(states), len(data))
@@ -0,0 +1,241 @@
+import asyncio
+import time
+from decimal import Decimal
+
+from db import db, Status
+from db.budget import period_months
+
+
+REPORT_TTL = 60  # секунды хранения готового отчёта
+DEFAULT_DAYS = 30  # период отчётов по умолчанию
+MAX_DAYS = 3660  # максимальный период отчётов
+MAX_TOTAL_LINES = 60  # строк в отчёте по суммам и в сводке бюджета
+CENT = Decimal("0.01")  # точность сумм в сводке бюджета
+
+department_names = {
+    "head": "руководитель департамента",
+    "finance": "финансовый отдел",
+    "payers": "плательщики",
+}
+
+# Отдел, от которого ждёт действия заявка в статусе
+status_departments = {
+    Status.NOT_PROCESSED: "head",
+    Status.PENDING: "finance",
+    Status.APPROVED: "payers",
+}
+
+
+class ReportCache:
+    """
+    Готовые тексты отчётов с коротким TTL.
+    Одновременные запросы одного отчёта ждут одно построение; ошибка построения не кэшируется.
+    """
+
+    def __init__(self, ttl=REPORT_TTL):
+        self.ttl = ttl
+        self._entries = {}
+
+    async def get(self, key, build):
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            entry = (time.monotonic(), asyncio.ensure_future(build()))
+            self._entries[key] = entry
+        try:
+            return await asyncio.shield(entry[1])
+        except Exception:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            raise
+
+
+report_cache = ReportCache()
+
+
+def format_duration(seconds) -> str:
+    """Длительность в виде "2 д 4 ч", "3 ч 12 мин" или "45 с" """
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if days:
+        return f"{days} д {hours} ч"
+    if hours:
+        return f"{hours} ч {minutes} мин"
+    if minutes:
+        return f"{minutes} мин"
+    return f"{seconds} с"
+
+
+def format_percentiles(name, total, p50, p90, p99) -> str:
+    return (
+        f"{name}: {total} шт., p50 {format_duration(p50)}, p90 {format_duration(p90)}, "
+        f"p99 {format_duration(p99)}"
+    )
+
+
+async def sla_report(days) -> str:
+    """Перцентили времени одобрения и оплаты, ожидания по отделам и согласующим"""
+    async with db:
+        rows = await db.sla_report(days)
+
+    totals = {}
+    departments = []
+    users = []
+    for metric, *values in rows:
+        kind, _, name = metric.partition(":")
+        if kind == "department":
+            departments.append(format_percentiles(department_names.get(name, name), *values))
+        elif kind == "user":
+            users.append(format_percentiles(name, *values))
+        else:
+            totals[kind] = values
+
+    lines = [
+        f"Сроки обработки заявок по действиям за {days} дн.",
+        "Перцентили приблизительные: длительности считаются с точностью до минуты.",
+    ]
+    for kind, name in (("approve", "До одобрения"), ("pay", "От одобрения до оплаты")):
+        if kind in totals:
+            lines.append(format_percentiles(name, *totals[kind]))
+        else:
+            lines.append(f"{name}: нет данных")
+    if departments:
+        lines.append("\nОжидание действия отдела:")
+        lines.extend(departments)
+    if users:
+        lines.append("\nОжидание действия согласующего:")
+        lines.extend(users)
+    return "\n".join(lines)
+
+
+async def backlog_report(days=None) -> str:
+    """Открытые заявки по отделам и дольше всего ожидающие из них"""
+    async with db:
+        backlog = await db.backlog_report()
+
+    if not backlog:
+        return "Открытых заявок нет."
+
+    lines = ["Открытые заявки по отделам:"]
+    for status, department in status_departments.items():
+        if status not in backlog:
+            continue
+        item = backlog[status]
+        lines.append(
+            f"\n{department_names[department]}: {item['count']} шт. на {item['amount']}, "
+            f"старейшая ждёт {format_duration(item['age'])}"
+        )
+        lines.extend(
+            f"  {row['id']}: {row['amount']}, {row['partner']} - {format_duration(row['age'])}"
+            for row in item["oldest"]
+        )
+    return "\n".join(lines)
+
+
+async def totals_report(days) -> str:
+    """Оплаченные и открытые суммы по статьям, группам и месяцам"""
+    async with db:
+        rows = await db.totals_report(days)
+
+    if not rows:
+        return f"За {days} дн. заявок нет."
+
+    lines = [f"Суммы заявок за {days} дн. (оплачено / открыто):"]
+    item = None
+    for expense_item, expense_group, month, paid, open_, item_total in rows:
+        if len(lines) >= MAX_TOTAL_LINES:
+            lines.append("...")
+            break
+        if expense_item != item:
+            item = expense_item
+            lines.append(f"\n{expense_item}: итого {item_total}")
+        lines.append(f"  {expense_group}, {month}: {paid} / {open_}")
+    return "\n".join(lines)
+
+
+reports = {
+    "sla": sla_report,
+    "backlog": backlog_report,
+    "totals": totals_report,
+}
+
+
+def parse_report_args(args) -> tuple:
+    """
+    Вид отчёта и период в днях из аргументов /report.
+    Выбрасывает ValueError с подсказкой при неверных аргументах.
+    """
+    usage = (
+        "Использование: /report sla [дней] - сроки одобрения и оплаты, "
+        "/report backlog - открытые заявки по отделам, "
+        "/report totals [дней] - суммы по статьям, группам и месяцам."
+    )
+    if not args or args[0] not in reports or len(args) > 2:
+        raise ValueError(usage)
+    days = DEFAULT_DAYS
+    if len(args) == 2:
+        if not args[1].isdigit() or not 1 <= int(args[1]) <= MAX_DAYS:
+            raise ValueError(f"Период - число дней от 1 до {MAX_DAYS}.\n{usage}")
+        days = int(args[1])
+    return args[0], days
+
+
+async def build_report(kind, days) -> str:
+    """Текст отчёта kind за days дней из кэша или построенный заново"""
+    key = (kind, None if kind == "backlog" else days)
+    return await report_cache.get(key, lambda: reports[kind](days))
+
+
+def parse_budget_args(args, today) -> tuple:
+    """
+    Месяц начисления ("YYYY-MM") и статья из аргументов /budget [mm.yy] [статья].
+    По умолчанию - месяц даты today и все статьи (None).
+    """
+    month = today.strftime("%Y-%m")
+    if args:
+        try:
+            month = period_months(args[0])[0].strftime("%Y-%m")
+            args = args[1:]
+        except ValueError:
+            pass
+    return month, " ".join(args) or None
+
+
+async def budget_report(month, expense_item=None) -> str:
+    """
+    Оплаченные суммы за месяц начисления из сводки бюджета: по статьям,
+    а для статьи expense_item - по группам, партнёрам и формам оплаты.
+    """
+    async with db:
+        rows = await db.budget(month)
+
+    year, number = month.split("-")
+    if expense_item is not None:
+        name = expense_item.casefold()
+        rows = [row for row in rows if row[0].casefold() == name]
+        lines = [
+            f"  {group}, {partner}, {method}: {amount.quantize(CENT)} ({payments} сч.)"
+            for _, group, partner, method, amount, payments in sorted(rows, key=lambda row: -row[4])
+        ]
+        title = f"{rows[0][0] if rows else expense_item} за {number}.{year}"
+    else:
+        items = {}
+        for item, *_, amount, payments in rows:
+            total = items.setdefault(item, [Decimal(0), 0])
+            total[0] += amount
+            total[1] += payments
+        lines = [
+            f"  {item}: {amount.quantize(CENT)} ({payments} сч.)"
+            for item, (amount, payments) in sorted(items.items(), key=lambda item: -item[1][0])
+        ]
+        title = f"Бюджет за {number}.{year}"
+
+    if not rows:
+        return f"{title}: оплат нет."
+    total = sum((row[4] for row in rows), Decimal(0))
+    if len(lines) > MAX_TOTAL_LINES:
+        lines = lines[:MAX_TOTAL_LINES] + ["  ..."]
+    return "\n".join([f"{title}: оплачено {total.quantize(CENT)}", *lines])
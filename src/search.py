@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import heapq
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from config.logging_config import logger
+
+
+TOP_K = 10  # количество результатов поиска
+COMMON_SHARE = 0.05  # триграммы, встречающиеся в большей доле троек, не используются при наличии более редких
+
+
+def trigrams(text):
+    """Триграммы текста без учёта регистра и лишних пробелов"""
+    text = f"  {' '.join(text.casefold().split())} "
+    return frozenset(text[i : i + 3] for i in range(len(text) - 2))
+
+
+@lru_cache(maxsize=4096)
+def name_trigrams(name):
+    """Триграммы названия статьи или группы. Они повторяются во многих тройках и кэшируются."""
+    return trigrams(name)
+
+
+def triple_trigrams(triple):
+    item, group, partner = triple
+    return name_trigrams(item) | name_trigrams(group) | trigrams(partner)
+
+
+def triple_id(triple):
+    """Идентификатор тройки (статья, группа, партнёр), не зависящий от версии категорий"""
+    return hashlib.blake2b("\x1f".join(triple).encode("utf-8"), digest_size=6).hexdigest()
+
+
+class TripleIndex:
+    """
+    Триграммный индекс по тройкам (статья, группа, партнёр) для нечёткого поиска.
+    При смене версии категорий обновляются только добавленные и удалённые тройки;
+    обновление выполняется в отдельном потоке, обращения к индексу ждут его окончания.
+    """
+
+    def __init__(self):
+        self.digest = None
+        self.triples = {}
+        self._postings = defaultdict(set)
+        self._sizes = {}
+        self._lock = asyncio.Lock()
+
+    async def find(self, categories, text, limit=TOP_K):
+        """Поиск троек в версии категорий categories (см. search)"""
+        async with self._lock:
+            await self._ensure(categories)
+            return self.search(text, limit)
+
+    async def get(self, categories, number):
+        """Тройка версии категорий categories по идентификатору или None"""
+        async with self._lock:
+            await self._ensure(categories)
+            return self.triples.get(number)
+
+    async def _ensure(self, categories):
+        if categories.digest != self.digest:
+            await asyncio.to_thread(self.sync, categories)
+
+    def sync(self, categories):
+        """Приведение индекса к версии категорий categories"""
+        if categories.digest == self.digest:
+            return
+
+        current = {triple_id(triple): triple for triple in categories.triples()}
+        removed = self.triples.keys() - current.keys()
+        added = current.keys() - self.triples.keys()
+        for number in removed:
+            self._remove(number)
+        for number in added:
+            self._add(number, current[number])
+        self.digest = categories.digest
+        logger.info(
+            "Индекс поиска категорий обновлён: +%s, -%s, всего %s",
+            len(added),
+            len(removed),
+            len(self.triples),
+        )
+
+    def _add(self, number, triple):
+        grams = triple_trigrams(triple)
+        postings = self._postings
+        for gram in grams:
+            postings[gram].add(number)
+        self.triples[number] = triple
+        self._sizes[number] = len(grams)
+
+    def _remove(self, number):
+        for gram in triple_trigrams(self.triples.pop(number)):
+            postings = self._postings[gram]
+            postings.discard(number)
+            if not postings:
+                del self._postings[gram]
+        del self._sizes[number]
+
+    def search(self, text, limit=TOP_K):
+        """
+        До limit троек, содержащих больше всего триграмм запроса.
+        При равенстве выше тройки с более коротким текстом. Возвращает пары (идентификатор, тройка).
+        Вызывается после приведения индекса к нужной версии категорий.
+        """
+        postings = sorted(
+            (self._postings[gram] for gram in trigrams(text) if gram in self._postings), key=len
+        )
+        if not postings:
+            return []
+        # Частые триграммы почти не влияют на порядок, но их подсчёт дороже всего
+        common = max(1, int(len(self.triples) * COMMON_SHARE))
+        used = [grams for grams in postings if len(grams) <= common]
+        if not used:
+            # Все триграммы запроса частые: подходят тройки с самой редкой из них
+            best = heapq.nsmallest(limit, postings[0], key=self._sizes.__getitem__)
+            return [(number, self.triples[number]) for number in best]
+
+        hits = Counter()
+        for grams in used:
+            hits.update(grams)
+
+        threshold = max(1, len(used) // 2)
+        best = heapq.nlargest(
+            limit,
+            (item for item in hits.items() if item[1] >= threshold),
+            key=lambda item: (item[1], -self._sizes[item[0]]),
+        )
+        return [(number, self.triples[number]) for number, _ in best]
+
+
+triple_index = TripleIndex()
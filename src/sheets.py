@@ -1,14 +1,15 @@
-import gspread_asyncio
-from google.oauth2.service_account import Credentials
+import asyncio
+import re
+import time
 from datetime import datetime
-from decimal import Decimal, ROUND_HALF_UP
-
-import logging
-import pytz
-import pandas as pd
+from functools import cached_property
+from zoneinfo import ZoneInfo
 
+from categories import build_category_index
 from config.config import Config
 from config.logging_config import logger
+from db.budget import month_share, period_months
+from metrics import timed
 
 
 date_format = {  # паттерн для преобразования числа даты в необходимый формат
@@ -19,11 +20,66 @@ currency_format = {  # паттерн для преобразования чис
     "numberFormat": {"type": "CURRENCY", "pattern": "₽ #,###.0000000000"}
 }
 
+column_formats = {  # форматы столбцов листа записей по номеру столбца (A=0)
+    0: date_format,
+    1: currency_format,
+    6: date_format,
+}
+
+updated_range_pattern = re.compile(r"![A-Z]+(\d+)(?::[A-Z]+(\d+))?$")
+moscow_tz = ZoneInfo("Europe/Moscow")
+
+
+def build_payment_rows(payment_info, today_date):
+    """Строки листа записей для одного счёта: по одной строке на каждый месяц начисления"""
+
+    # Деление суммы по месяцам общее со сводкой бюджета (db.budget)
+    months = [month.strftime("%d.%m.%Y") for month in period_months(payment_info["period"])]
+    rounded_sum = float(month_share(payment_info["amount"], len(months)))
+    return [
+        [
+            today_date,
+            rounded_sum,
+            payment_info["expense_item"],
+            payment_info["expense_group"],
+            payment_info["partner"],
+            payment_info["comment"],
+            month,
+            payment_info["payment_method"],
+        ]
+        for month in months
+    ]
+
+
+def build_format_requests(sheet_id, updated_range):
+    """Запросы batch_update для форматирования только что добавленных строк"""
+
+    match = updated_range_pattern.search(updated_range)
+    if not match:
+        raise RuntimeError(f"Не удалось определить добавленный диапазон: {updated_range}")
+    first_row = int(match.group(1))
+    last_row = int(match.group(2) or first_row)
+    return [
+        {
+            "repeatCell": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "startRowIndex": first_row - 1,
+                    "endRowIndex": last_row,
+                    "startColumnIndex": column,
+                    "endColumnIndex": column + 1,
+                },
+                "cell": {"userEnteredFormat": cell_format},
+                "fields": "userEnteredFormat.numberFormat",
+            }
+        }
+        for column, cell_format in column_formats.items()
+    ]
+
 
 async def get_today_moscow_time():
     """Функция для получения текущей даты"""
 
-    moscow_tz = pytz.timezone("Europe/Moscow")
     today = datetime.now(moscow_tz)
     formatted_date = today.strftime("%d.%m.%Y")
     return formatted_date
@@ -31,6 +87,7 @@ async def get_today_moscow_time():
 
 def get_credentials():
     """Функция для получения данных для авторизации в Google Sheets"""
+    from google.oauth2.service_account import Credentials
 
     creds = Credentials.from_service_account_file(Config.google_sheets_credentials_file)
     scoped = creds.with_scopes(
@@ -43,91 +100,299 @@ def get_credentials():
     return scoped
 
 
+REAUTH_INTERVAL = 45  # минуты между переавторизациями клиента Google Sheets
+RECENT_VERSIONS = 4  # сколько последних версий категорий хранится для незавершённых диалогов
+
+
+class CategoriesCache:
+    """
+    Кэш дерева категорий с TTL.
+    Устаревшее значение отдаётся сразу, а обновление идёт в фоне;
+    одновременные запросы ожидают одну и ту же загрузку.
+    Несколько последних версий доступны по отпечатку для незавершённых диалогов.
+    """
+
+    def __init__(self, loader, ttl):
+        self._loader = loader
+        self.ttl = ttl
+        self.value = None
+        self.version = 0
+        self.loaded_at = None
+        self._inflight = None
+        self._recent = {}
+        self.stats = {"hits": 0, "misses": 0, "loads": 0}
+
+    def is_stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    async def get(self):
+        """Возвращает дерево категорий, при необходимости запуская его обновление"""
+        if self.value is None:
+            self.stats["misses"] += 1
+            return await self.refresh()
+
+        self.stats["hits"] += 1
+        if self.is_stale():
+            self._start_load()
+        return self.value
+
+    def lookup(self, digest):
+        """Версия дерева категорий с отпечатком digest, если она ещё хранится"""
+        return self._recent.get(digest)
+
+    def prefetch(self):
+        """Запуск фоновой загрузки без ожидания результата"""
+        self._start_load()
+
+    async def refresh(self):
+        """Принудительное обновление кэша. Возвращает новое значение."""
+        return await asyncio.shield(self._start_load())
+
+    def _start_load(self):
+        if self._inflight is None:
+            self._inflight = asyncio.create_task(self._load())
+            self._inflight.add_done_callback(self._log_load_error)
+        return self._inflight
+
+    async def _load(self):
+        try:
+            value = await self._loader()
+            self.value = value
+            self.version += 1
+            self._recent.pop(value.digest, None)
+            self._recent[value.digest] = value
+            while len(self._recent) > RECENT_VERSIONS:
+                del self._recent[next(iter(self._recent))]
+            self.loaded_at = time.monotonic()
+            self.stats["loads"] += 1
+            logger.info("Категории загружены. Версия кэша: %s", self.version)
+            return value
+        finally:
+            self._inflight = None
+
+    @staticmethod
+    def _log_load_error(task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Ошибка обновления кэша категорий: %s", task.exception())
+
+
 class GoogleSheetsManager:
-    """Класс для обработки Google Sheets таблиц."""
-
-    def __init__(self):
-        self.sheets_spreadsheet_id = Config.google_sheets_spreadsheet_id
-        self.records_sheet_id = Config.google_sheets_records_sheet_id
-        self.categories_sheet_id = Config.google_sheets_categories_sheet_id
-        self.options_dict = None
-        self.items = None
+    """
+    Класс для обработки Google Sheets таблиц.
+    Один экземпляр живёт всё время работы бота: клиент авторизуется один раз,
+    токен обновляется в фоне, открытые таблицы и листы кэшируются.
+    """
+
+    def __init__(self, reauth_interval=REAUTH_INTERVAL):
         self.agc = None
+        self.reauth_interval = reauth_interval
+        self._spreadsheets = {}
+        self._worksheets = {}
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+        self.stats = {
+            "auth_calls": 0,
+            "open_calls": 0,
+            "worksheet_calls": 0,
+            "write_calls": 0,
+        }
 
-    async def initialize_google_sheets(self):
-        """Инициализация в Google Sheets"""
+    def api_calls(self) -> int:
+        """Количество запросов к API Google Sheets с запуска: сумма счётчиков stats"""
+        return sum(self.stats.values())
+
+    @property
+    def sheets_spreadsheet_id(self):
+        return Config.google_sheets_spreadsheet_id
+
+    @property
+    def records_sheet_id(self):
+        return Config.google_sheets_records_sheet_id
+
+    @property
+    def categories_sheet_id(self):
+        return Config.google_sheets_categories_sheet_id
+
+    @cached_property
+    def categories(self):
+        return CategoriesCache(self._fetch_categories, Config.categories_cache_ttl)
+
+    @cached_property
+    def agcm(self):
+        """Менеджер клиента gspread. Библиотека импортируется при первой авторизации."""
+        import gspread_asyncio
+
+        return gspread_asyncio.AsyncioGspreadClientManager(
+            get_credentials, reauth_interval=self.reauth_interval
+        )
+
+    async def start(self):
+        """Авторизация при старте бота и запуск фонового обновления токена"""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
         try:
-            agcm = gspread_asyncio.AsyncioGspreadClientManager(get_credentials)
-            self.agc = await agcm.authorize()
+            await self.initialize_google_sheets()
+        except RuntimeError as e:
+            logger.warning("%s. Повторная попытка будет выполнена при первом обращении.", e)
+            return
+        self.categories.prefetch()
+
+    async def close(self):
+        """Остановка фонового обновления и сброс кэша при остановке бота"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+        self._reset_handles()
+        self.agc = None
+        logger.info("Статистика обращений к Google Sheets: %s", self.stats)
+
+    async def ping(self):
+        """Проверка готовности клиента Google Sheets"""
+        await self.initialize_google_sheets()
+        await self.get_spreadsheet()
+
+    async def initialize_google_sheets(self):
+        """Инициализация в Google Sheets. Повторные вызовы возвращают уже авторизованный клиент."""
+        if self.agc is not None:
             return self.agc
+
+        async with self._lock:
+            if self.agc is None:
+                await self._authorize()
+        return self.agc
+
+    @timed("sheets")
+    async def _authorize(self):
+        """Авторизация клиента. При смене клиента кэш таблиц и листов сбрасывается."""
+        self.stats["auth_calls"] += 1
+        try:
+            agc = await self.agcm.authorize()
         except Exception as e:
             raise RuntimeError(f"Не удалось авторизоваться в сервисе Google Sheet. Ошибка: {e}")
 
-    async def add_payment_to_sheet(self, payment_info):
-        """Добавление счёта в таблицу"""
+        if agc is not self.agc:
+            self._reset_handles()
+            self.agc = agc
+            logger.info("Выполнена авторизация в Google Sheets.")
 
-        try:
-            spreadsheet = await self.agc.open_by_key(self.sheets_spreadsheet_id)
-            worksheet = await spreadsheet.get_worksheet_by_id(0)
-            logger.info(f"Открытие листа: {self.sheets_spreadsheet_id}")
+    async def _refresh_loop(self):
+        """Фоновое обновление токена до истечения срока действия текущего"""
+        while True:
+            await asyncio.sleep(self.reauth_interval * 60 / 2)
+            try:
+                async with self._lock:
+                    await self._authorize()
+            except RuntimeError as e:
+                logger.error("Ошибка фонового обновления токена Google Sheets: %s", e)
 
-        except Exception as e:
-            raise RuntimeError(f"Ошибка при открытии или доступе к листу: {e}")
+    def _reset_handles(self):
+        self._spreadsheets.clear()
+        self._worksheets.clear()
+
+    @timed("sheets")
+    async def get_spreadsheet(self, key=None):
+        """Возвращает открытую таблицу из кэша или открывает её"""
+        key = key or self.sheets_spreadsheet_id
+        spreadsheet = self._spreadsheets.get(key)
+        if spreadsheet is None:
+            agc = await self.initialize_google_sheets()
+            self.stats["open_calls"] += 1
+            spreadsheet = await agc.open_by_key(key)
+            self._spreadsheets[key] = spreadsheet
+            logger.info("Открытие таблицы: %s", key)
+        return spreadsheet
+
+    @timed("sheets")
+    async def get_worksheet(self, sheet_id, key=None):
+        """Возвращает лист таблицы из кэша по ключу таблицы и id листа"""
+        key = key or self.sheets_spreadsheet_id
+        worksheet = self._worksheets.get((key, sheet_id))
+        if worksheet is None:
+            spreadsheet = await self.get_spreadsheet(key)
+            self.stats["worksheet_calls"] += 1
+            worksheet = await spreadsheet.get_worksheet_by_id(sheet_id)
+            self._worksheets[(key, sheet_id)] = worksheet
+        return worksheet
+
+    async def add_payment_to_sheet(self, payment_info):
+        """Добавление счёта в таблицу. Возвращает количество запросов к API."""
+        return await self.add_payments_to_sheet([payment_info])
+
+    async def add_payments_to_sheet(self, payments):
+        """
+        Добавление нескольких счетов в таблицу.
+        Строки всех счетов добавляются одним запросом, форматирование добавленного
+        диапазона - вторым. Возвращает количество запросов к API.
+        """
 
         today_date = await get_today_moscow_time()
-        period = payment_info["period"].split(" ")
-        months = [
-            datetime.strptime(f"01.{a}", "%d.%m.%y").strftime("%d.%m.%Y")
-            for a in period
+        rows = [
+            row
+            for payment_info in payments
+            for row in build_payment_rows(payment_info, today_date)
         ]
-        total_sum = Decimal(payment_info["amount"]) / Decimal(len(months))
-        logging.info(total_sum)
-        rounded_sum = float(total_sum.quantize(Decimal('0.0000000001'), rounding=ROUND_HALF_UP))
-        for month in months:
-            row_data = [
-                today_date,
-                rounded_sum,
-                payment_info["expense_item"],
-                payment_info["expense_group"],
-                payment_info["partner"],
-                payment_info["comment"],
-                month,
-                payment_info["payment_method"],
-            ]
-            await worksheet.append_row(row_data, value_input_option="USER_ENTERED")
-            logger.info(f"Добавлена строка: {row_data}")
-        await worksheet.format("A3:A", date_format)
-        await worksheet.format("B3:B", currency_format)
-        await worksheet.format("G3:G", date_format)
-
-
-    async def get_data(self):
+        return await self.append_payment_rows(rows)
+
+    @timed("sheets")
+    async def append_payment_rows(self, rows):
         """
-        Получение списка статей и списка словарей данных из таблицы "категории"
+        Добавление готовых строк листа записей одним запросом и форматирование добавленного
+        диапазона вторым. Исключение выбрасывается, только если строки не добавлены: после успешного
+        append_rows любая ошибка (в том числе неожиданный ответ) только записывается в журнал,
+        так как повтор добавил бы строки второй раз.
+        Возвращает количество запросов к API, включая открытие таблицы и листа при пустом кэше.
         """
+
+        calls = self.api_calls()
         try:
-            spreadsheet = await self.agc.open_by_key(self.sheets_spreadsheet_id)
-            worksheet = await spreadsheet.get_worksheet_by_id(self.categories_sheet_id)
+            spreadsheet = await self.get_spreadsheet()
+            worksheet = await self.get_worksheet(0)
         except Exception as e:
-            raise RuntimeError(f'Ошибка получения данных с листа "категории". Ошибка: {e}')
+            raise RuntimeError(f"Ошибка при открытии или доступе к листу: {e}")
 
-        df = pd.DataFrame(await worksheet.get_all_records())
-        unique_items = df["Статья"].unique()
-        data_structure = {}
+        self.stats["write_calls"] += 1
+        response = await worksheet.append_rows(rows, value_input_option="USER_ENTERED")
+        logger.info("Добавлены строки: %s", rows)
 
-        for _, row in df.iterrows():
-            category = row["Статья"]
-            group = row["Группа"]
-            partner = row["Партнер"]
+        try:
+            updated_range = response["updates"]["updatedRange"]
+            requests = build_format_requests(worksheet.id, updated_range)
+            self.stats["write_calls"] += 1
+            await spreadsheet.batch_update({"requests": requests})
+        except Exception as e:
+            logger.error("Не удалось отформатировать добавленные строки: %s. Ответ: %s", e, response)
+        return self.api_calls() - calls
+
+    async def get_data(self, digest=None):
+        """
+        Получение индекса статей, групп и партнёров из таблицы "категории".
+        Данные берутся из кэша и обновляются в фоне по истечении TTL.
+        Если указан digest и эта версия ещё хранится, возвращается она, иначе - текущая.
+        """
+        if digest is not None:
+            categories = self.categories.lookup(digest)
+            if categories is not None:
+                return categories
+        return await self.categories.get()
 
-            if category not in data_structure:
-                data_structure[category] = {}
+    async def reload_categories(self):
+        """Принудительное обновление кэша категорий"""
+        await self.categories.refresh()
+        return self.categories.version
 
-            if group not in data_structure[category]:
-                data_structure[category][group] = []
+    @timed("sheets")
+    async def _fetch_categories(self):
+        """Загрузка категорий с листа "категории" """
+        try:
+            worksheet = await self.get_worksheet(self.categories_sheet_id)
+        except Exception as e:
+            raise RuntimeError(f'Ошибка получения данных с листа "категории". Ошибка: {e}')
 
-            data_structure[category][group].append(partner)
+        return build_category_index(await worksheet.get_values())
 
-        self.options_dict, self.items = data_structure, unique_items
 
-        return data_structure, unique_items
+sheets_manager = GoogleSheetsManager()
@@ -0,0 +1,88 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+PENDING_FACTOR = 64  # во сколько раз ожидающих обновлений может быть больше, чем обрабатываемых
+
+
+def ordering_keys(update) -> list[str]:
+    """
+    Ключи, в пределах которых обновления обрабатываются строго по очереди:
+    чат (или пользователь) и заявка из данных кнопок "Одобрить"/"Отклонить"/"Оплачено".
+    """
+
+    keys = []
+    if not isinstance(update, Update):
+        return keys
+
+    if update.effective_chat is not None:
+        keys.append(f"chat:{update.effective_chat.id}")
+    elif update.effective_user is not None:
+        keys.append(f"user:{update.effective_user.id}")
+
+    if update.callback_query is not None and update.callback_query.data:
+        parts = update.callback_query.data.split("_")
+        if parts[0] == "approval" and len(parts) > 3:
+            keys.append(f"approval:{parts[3]}")
+        elif parts[0] == "pay" and len(parts) > 1:
+            keys.append(f"approval:{parts[1]}")
+
+    return sorted(keys)
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений разных чатов.
+    Обновления одного чата и одной заявки обрабатываются в порядке поступления,
+    одновременно обрабатывается не более max_concurrent_updates обновлений.
+    Ожидающие своей очереди обновления не занимают места обрабатываемых.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates * PENDING_FACTOR)
+        self.concurrency = max_concurrent_updates
+        self._active = asyncio.Semaphore(max_concurrent_updates)
+        self._locks = {}
+
+    def _lock(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _unlock(self, key, locked=True):
+        """Снятие учёта ключа key; locked - блокировка ключа была получена и освобождается"""
+        entry = self._locks[key]
+        if locked:
+            entry[0].release()
+        entry[1] -= 1
+        if not entry[1]:
+            del self._locks[key]
+
+    async def do_process_update(self, update, coroutine) -> None:
+        # Ключ учитывается непосредственно перед ожиданием его блокировки; при отмене обновления
+        # снимается учёт только учтённых ключей, а освобождаются только полученные блокировки
+        counted = []
+        acquired = 0
+        try:
+            for key in ordering_keys(update):
+                lock = self._lock(key)
+                counted.append(key)
+                await lock.acquire()
+                acquired += 1
+            async with self._active:
+                await coroutine
+        finally:
+            for position, key in enumerate(counted):
+                self._unlock(key, locked=position < acquired)
+            # Обновление, отменённое до начала обработки: корутина не запускалась
+            coroutine.close()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,102 @@
+import asyncio
+import hmac
+import json
+import signal
+
+from telegram import Update
+from telegram.ext import Application
+
+from config.config import Config
+from db import db
+from http_server import HttpServer
+from sheets import sheets_manager
+from config.logging_config import logger
+
+
+READY_TIMEOUT = 5  # секунды на проверку готовности зависимостей
+
+
+class WebhookServer:
+    """
+    Приём обновлений Telegram через вебхук встроенным HTTP-сервером.
+    Помимо пути вебхука обслуживает /healthz (процесс жив) и /readyz
+    (доступны база данных и Google Sheets, бот не останавливается).
+    """
+
+    def __init__(self, application: Application):
+        self.application = application
+        self.draining = False
+        self.server = HttpServer(Config.webhook_listen, Config.webhook_port)
+        self.server.route("POST", Config.webhook_path, self.receive_update)
+        self.server.route("GET", "/healthz", self.health)
+        self.server.route("GET", "/readyz", self.ready)
+
+    async def receive_update(self, request):
+        """Проверка секретного токена и постановка обновления в очередь приложения"""
+        token = request.headers.get("x-telegram-bot-api-secret-token", "")
+        if not hmac.compare_digest(token, Config.webhook_secret_token):
+            return 403, "text/plain", "Forbidden"
+        if self.draining:
+            return 503, "text/plain", "Draining"
+
+        try:
+            update = Update.de_json(json.loads(request.body), self.application.bot)
+        except (ValueError, TypeError) as e:
+            logger.warning("Получено некорректное обновление через вебхук: %s", e)
+            return 400, "text/plain", "Bad Request"
+
+        await self.application.update_queue.put(update)
+        return 200, "text/plain", "OK"
+
+    async def health(self, request):
+        return 200, "text/plain", "OK"
+
+    async def ready(self, request):
+        if self.draining:
+            return 503, "text/plain", "Draining"
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(db.ping(), sheets_manager.ping()), READY_TIMEOUT
+            )
+        except Exception as e:
+            return 503, "text/plain", f"Not ready: {e}"
+        return 200, "text/plain", "OK"
+
+    async def serve(self):
+        """
+        Запуск бота в режиме вебхука до получения SIGINT или SIGTERM.
+        При остановке новые обновления не принимаются, а уже принятые обрабатываются до конца.
+        """
+        if not Config.webhook_url or not Config.webhook_secret_token:
+            raise RuntimeError("Для режима вебхука необходимо указать WEBHOOK_URL и WEBHOOK_SECRET_TOKEN.")
+
+        application = self.application
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        try:
+            await application.bot.set_webhook(
+                url=Config.webhook_url,
+                secret_token=Config.webhook_secret_token,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            await application.start()
+            await self.server.start()
+            logger.info("Бот запущен в режиме вебхука: %s", Config.webhook_url)
+            await stop.wait()
+        finally:
+            self.draining = True
+            await self.server.stop()
+            if application.running:
+                await application.stop()
+                if application.post_stop:
+                    await application.post_stop(application)
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+            logger.info("Бот остановлен.")
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+# Модули src импортируют друг друга как модули верхнего уровня, как при запуске python src/main.py
+for path in (SRC, ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Минимальное окружение для config.config: настройки читаются при первом обращении
+TEST_ENV = {
+    "TELEGRAM_BOT_TOKEN": "123:test",
+    "GOOGLE_SHEETS_SPREADSHEET_ID": "spreadsheet",
+    "DATABASE_PATH": os.path.join(tempfile.gettempdir(), "budget_bot_tests.db"),
+    "GOOGLE_SHEETS_CREDENTIALS_FILE": "credentials.json",
+    "GOOGLE_SHEETS_CATEGORIES_SHEET_ID": "1",
+    "GOOGLE_SHEETS_RECORDS_SHEET_ID": "0",
+    "DEPARTMENT_HEAD_CHAT_ID": "1",
+    "FINANCE_CHAT_IDS": "2,3",
+    "PAYERS_CHAT_IDS": "4",
+    "DEVELOPER_CHAT_ID": "5",
+}
+for name, value in TEST_ENV.items():
+    os.environ.setdefault(name, value)
+
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Отдельная база данных ApprovalDB с пулом из 4 соединений во временном каталоге"""
+    from db.db import ApprovalDB
+    from db.pool import ConnectionPool
+
+    database = ApprovalDB()
+    database.pool = ConnectionPool(str(tmp_path / "approvals.db"), 4)
+    return database
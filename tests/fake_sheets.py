@@ -0,0 +1,63 @@
+"""Поддельный клиент gspread_asyncio для тестов без обращения к Google Sheets"""
+
+
+class FakeWorksheet:
+    id = 0
+
+    def __init__(self):
+        self.appended = []
+        self.next_row = 2
+        self.fail_append = False
+        self.malformed_response = False  # ответ без диапазона добавленных строк
+
+    async def append_rows(self, rows, value_input_option=None):
+        if self.fail_append:
+            raise RuntimeError("503 Service Unavailable")
+        self.appended.append(rows)
+        first_row = self.next_row
+        self.next_row += len(rows)
+        if self.malformed_response:
+            return {}
+        return {"updates": {"updatedRange": f"'записи'!A{first_row}:H{self.next_row - 1}"}}
+
+
+class FakeSpreadsheet:
+    def __init__(self, fail_format=False):
+        self.worksheet = FakeWorksheet()
+        self.fail_format = fail_format
+        self.format_requests = []
+
+    async def get_worksheet_by_id(self, sheet_id):
+        return self.worksheet
+
+    async def batch_update(self, body):
+        if self.fail_format:
+            raise RuntimeError("quota exceeded")
+        self.format_requests.append(body["requests"])
+
+
+class FakeClient:
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    async def open_by_key(self, key):
+        return self.spreadsheet
+
+
+class FakeClientManager:
+    """Заменяет gspread_asyncio.AsyncioGspreadClientManager"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def authorize(self):
+        return self.client
+
+
+def fake_manager(spreadsheet):
+    """GoogleSheetsManager, работающий с поддельной таблицей spreadsheet"""
+    from sheets import GoogleSheetsManager
+
+    manager = GoogleSheetsManager()
+    manager.agcm = FakeClientManager(FakeClient(spreadsheet))
+    return manager
@@ -0,0 +1,69 @@
+import asyncio
+from decimal import Decimal
+
+from db.db import Status
+from payments import PaymentRequest
+
+
+def request(amount, partner, period, payment_method="безнал"):
+    return PaymentRequest(
+        amount=Decimal(amount),
+        expense_item="Аренда",
+        expense_group="Офис",
+        partner=partner,
+        comment="",
+        period=tuple(period.split()),
+        payment_method=payment_method,
+    )
+
+
+# Суммы не делятся на месяцы нацело; у двух заявок одна строка сводки
+REQUESTS = [
+    request("100", "ООО Ромашка", "01.26 02.26 03.26"),
+    request("200.01", "ООО Ромашка", "02.26 03.26"),
+    request("0.07", "ООО Ромашка", "01.26 02.26 03.26"),
+    request("49999.99", "ИП Иванов", "12.25 01.26", "нал"),
+    request("1000", "ООО Ромашка", "01.26"),  # отклонена
+    request("5000", "ИП Иванов", "01.26"),  # одобрена, но не оплачена
+]
+MONTHS = ("2025-12", "2026-01", "2026-02", "2026-03")
+
+
+async def budgets(database):
+    async with database:
+        return {month: sorted(await database.budget(month)) for month in MONTHS}
+
+
+async def rollup_and_rebuild(database):
+    await database.setup()
+    try:
+        async with database:
+            ids = await database.insert_records([r.as_record(1) for r in REQUESTS])
+            for approval_id in ids[:4] + ids[5:]:
+                await database.transition(approval_id, Status.NOT_PROCESSED, Status.APPROVED)
+            for approval_id in ids[:4]:
+                assert await database.mark_paid(approval_id, "@payer")
+            assert await database.reject(ids[4], "@head")
+        incremental = await budgets(database)
+
+        async with database:
+            assert await database.rebuild_budget() == 4
+        return incremental, await budgets(database)
+    finally:
+        await database.close()
+
+
+def test_rollup_matches_rebuild(database):
+    incremental, rebuilt = asyncio.run(rollup_and_rebuild(database))
+
+    assert incremental == rebuilt
+    romashka = [row for row in rebuilt["2026-02"] if row[2] == "ООО Ромашка"]
+    # Доли по месяцам округляются до 10 знаков, как в листе записей
+    assert romashka == [
+        ("Аренда", "Офис", "ООО Ромашка", "безнал", Decimal("133.3616666666"), 3)
+    ]
+    assert rebuilt["2025-12"] == [("Аренда", "Офис", "ИП Иванов", "нал", Decimal("24999.995"), 1)]
+    # Отклонённая и неоплаченная заявки в сводку не попадают
+    assert sum(row[4] for row in rebuilt["2026-01"]) == (
+        Decimal("33.3333333333") + Decimal("0.0233333333") + Decimal("24999.995")
+    )
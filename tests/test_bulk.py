@@ -0,0 +1,197 @@
+import asyncio
+import csv
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+import handlers
+from bulk import MAX_REPORTED_ERRORS, read_payments
+from categories import make_category_index
+from db.db import Status
+from payments import PaymentRequest
+
+
+CATEGORIES = make_category_index({"Аренда": {"Офис": ["ООО Ромашка"]}})
+HEADER = ["Сумма", "Статья", "Группа", "Партнёр", "Комментарий", "Даты начисления", "Форма оплаты"]
+VALID_ROW = ["1 000,50", "Аренда", "Офис", "ООО Ромашка", "за март", "03.26 04.26", "безнал"]
+
+
+def write_csv(path, rows, delimiter=";"):
+    with open(path, "w", newline="", encoding="utf-8-sig") as file:
+        csv.writer(file, delimiter=delimiter).writerows(rows)
+    return str(path)
+
+
+def test_csv_rows_are_parsed_and_checked(tmp_path):
+    path = write_csv(
+        tmp_path / "payments.csv",
+        [
+            HEADER,
+            VALID_ROW,
+            ["", "", "", "", "", "", ""],
+            ["100", "Аренда", "Офис", "", "к", "03.26", "нал"],
+            ["100", "Аренда", "Офис", "ООО Ромашка", "к", "3.26", "нал"],
+            ["100", "Аренда", "Склад", "ООО Ромашка", "к", "03.26", "нал"],
+            ["сто", "Аренда", "Офис", "ООО Ромашка", "к", "03.26", "нал"],
+        ],
+    )
+
+    result = read_payments(path, CATEGORIES)
+
+    assert result.requests == [
+        PaymentRequest(
+            amount=Decimal("1000.50"),
+            expense_item="Аренда",
+            expense_group="Офис",
+            partner="ООО Ромашка",
+            comment="за март",
+            period=("03.26", "04.26"),
+            payment_method="безнал",
+        )
+    ]
+    # Пустая строка пропускается и не считается
+    assert (result.total, result.invalid) == (5, 4)
+    assert [row_number for row_number, _ in result.errors] == [4, 5, 6, 7]
+    assert "Партнер" in result.errors[0][1]
+    assert "Неверные даты" in result.errors[1][1]
+    assert "Нет в справочнике" in result.errors[2][1]
+
+
+def test_csv_delimiter_and_column_order_are_detected(tmp_path):
+    order = [6, 5, 4, 3, 2, 1, 0]
+    path = write_csv(
+        tmp_path / "payments.csv",
+        [[HEADER[i].upper() for i in order], [VALID_ROW[i] for i in order]],
+        delimiter="\t",
+    )
+
+    result = read_payments(path, CATEGORIES)
+
+    assert len(result.requests) == 1
+    assert result.requests[0].period == ("03.26", "04.26")
+
+
+def test_xlsx_cells_are_converted(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    workbook.active.append(HEADER)
+    workbook.active.append([1500.0, "Аренда", "Офис", "ООО Ромашка", "к", datetime(2026, 3, 1), "нал"])
+    workbook.active.append([None, "Аренда", "Офис", "ООО Ромашка", "к", "03.26", "нал"])
+    path = str(tmp_path / "payments.xlsx")
+    workbook.save(path)
+
+    result = read_payments(path, CATEGORIES)
+
+    assert [(r.amount, r.period) for r in result.requests] == [(Decimal(1500), ("03.26",))]
+    assert result.errors == [(3, "Не заполнены поля: Сумма")]
+
+
+def test_row_limit_stops_reading(tmp_path):
+    path = write_csv(tmp_path / "payments.csv", [HEADER] + [VALID_ROW] * 5)
+
+    result = read_payments(path, CATEGORIES, max_rows=3)
+
+    assert (len(result.requests), result.total, result.invalid) == (3, 3, 1)
+    assert result.errors[0][0] == 5
+    assert "ограничение в 3 строк" in result.errors[0][1]
+
+
+def test_only_first_errors_are_kept(tmp_path):
+    bad_row = ["сто"] + VALID_ROW[1:]
+    path = write_csv(tmp_path / "payments.csv", [HEADER] + [bad_row] * (MAX_REPORTED_ERRORS + 5))
+
+    result = read_payments(path, CATEGORIES)
+
+    assert result.invalid == MAX_REPORTED_ERRORS + 5
+    assert len(result.errors) == MAX_REPORTED_ERRORS
+
+
+@pytest.mark.parametrize(
+    "name, rows, message",
+    [
+        ("payments.txt", [HEADER], "CSV и XLSX"),
+        ("payments.csv", [HEADER[:-1], VALID_ROW[:-1]], "Форма оплаты"),
+    ],
+)
+def test_unreadable_file_is_rejected(tmp_path, name, rows, message):
+    path = write_csv(tmp_path / name, rows)
+
+    with pytest.raises(ValueError, match=message):
+        read_payments(path, CATEGORIES)
+
+
+async def insert(database, requests):
+    await database.setup()
+    try:
+        async with database:
+            first = await database.insert_records([requests[0].as_record(7)])
+            ids = await database.insert_records([request.as_record(7) for request in requests])
+            rows = [await database.get_row_by_id(approval_id) for approval_id in ids]
+        return first, ids, rows
+    finally:
+        await database.close()
+
+
+def test_insert_records_returns_consecutive_ids(database, tmp_path):
+    path = write_csv(tmp_path / "payments.csv", [HEADER, VALID_ROW, ["60000"] + VALID_ROW[1:]])
+    requests = read_payments(path, CATEGORIES).requests
+
+    first, ids, rows = asyncio.run(insert(database, requests))
+
+    assert first == [1]
+    assert ids == [2, 3]
+    assert [row["id"] for row in rows] == ids
+    assert [row["amount"] for row in rows] == [Decimal("1000.50"), Decimal(60000)]
+    assert [row["approvals_needed"] for row in rows] == [1, 2]
+    assert {row["status"] for row in rows} == {Status.NOT_PROCESSED}
+    assert {row["initiator_chat_id"] for row in rows} == {7}
+
+
+def records(count):
+    """count заявок из файла с номерами 1..count, как их отправляет upload_payments"""
+    request = PaymentRequest(
+        amount=Decimal(100),
+        expense_item="Аренда",
+        expense_group="Офис",
+        partner="ООО Ромашка",
+        comment="",
+        period=("03.26",),
+        payment_method="нал",
+    )
+    return [{**request.as_record(7), "id": approval_id} for approval_id in range(1, count + 1)]
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Сообщения, отправленные отделам: (текст, клавиатура)"""
+    messages = []
+
+    async def chat_ids_department(department):
+        return [1]
+
+    async def send_message_to_chats(chat_ids, text, context, reply_markup=None):
+        messages.append((text, reply_markup))
+
+    monkeypatch.setattr(handlers, "chat_ids_department", chat_ids_department)
+    monkeypatch.setattr(handlers, "send_message_to_chats", send_message_to_chats)
+    return messages
+
+
+def test_small_upload_is_sent_with_buttons(sent):
+    count = handlers.APPROVAL_GROUP_SIZE * handlers.MAX_APPROVAL_MESSAGES
+
+    asyncio.run(handlers.create_and_send_bulk_approval_messages(records(count), "head", None))
+
+    assert len(sent) == handlers.MAX_APPROVAL_MESSAGES
+    assert sum(len(markup.inline_keyboard) for _, markup in sent) == count
+
+
+def test_large_upload_is_sent_as_one_summary(sent):
+    asyncio.run(handlers.create_and_send_bulk_approval_messages(records(10_000), "head", None))
+
+    assert len(sent) == 1
+    text, markup = sent[0]
+    assert markup is None
+    assert "10000" in text and "1-10000" in text and "1000000" in text
+    assert "/approve_batch" in text
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from categories import build_prefix_index, make_category_index, prefix_search
+from conversation import PAGE_SIZE, create_keyboard
+
+
+PARTNERS = ["ООО Ромашка", "ООО Ромашка 2", "ИП Ромашкин", "АО Лютик", "ООО  Василёк"]
+
+
+@pytest.mark.parametrize(
+    "prefix, expected",
+    [
+        ("ром", [0, 1, 2]),
+        ("РОМАШКА ", [0, 1]),
+        ("ромашка 2", [1]),
+        ("ооо", [0, 1, 4]),
+        # Пробелы внутри запроса и названия не различаются
+        ("ооо   василёк", [4]),
+        ("ашка", []),
+        ("я", []),
+        ("", [0, 1, 2, 3, 4]),
+    ],
+)
+def test_prefix_search(prefix, expected):
+    assert prefix_search(build_prefix_index(PARTNERS), prefix) == expected
+
+
+def test_category_index_searches_each_level():
+    categories = make_category_index(
+        {"Аренда": {"Офис": PARTNERS, "Склад": ["ИП Иванов"]}, "Реклама": {"Офлайн": ["ИП Ромашкин"]}}
+    )
+
+    assert categories.search_items("ре") == [1]
+    assert categories.search_groups(0, "о") == [0]
+    assert categories.search_partners(0, 0, "ром") == [0, 1, 2]
+    assert categories.search_partners(1, 0, "ром") == [0]
+
+
+def buttons(markup):
+    """Варианты и кнопки перехода клавиатуры: ([callback_data], [callback_data])"""
+    data = [[button.callback_data for button in row] for row in markup.inline_keyboard]
+    if isinstance(data[-1][0], str):
+        return [row[0] for row in data[:-1]], data[-1]
+    return [row[0] for row in data], []
+
+
+def keyboard(massive, numbers=None, page=0):
+    return buttons(asyncio.run(create_keyboard(massive, numbers, page)))
+
+
+def test_short_list_fits_one_page():
+    assert keyboard(PARTNERS) == ([0, 1, 2, 3, 4], [])
+
+
+def test_long_list_is_paged():
+    massive = [f"Партнёр {number}" for number in range(PAGE_SIZE * 2 + 1)]
+
+    assert keyboard(massive) == (list(range(PAGE_SIZE)), ["page_1"])
+    assert keyboard(massive, page=1) == (list(range(PAGE_SIZE, PAGE_SIZE * 2)), ["page_0", "page_2"])
+    assert keyboard(massive, page=2) == ([PAGE_SIZE * 2], ["page_1"])
+    # Устаревший номер страницы ограничивается последней страницей
+    assert keyboard(massive, page=5) == ([PAGE_SIZE * 2], ["page_1"])
+
+
+def test_search_results_are_paged_with_original_positions():
+    massive = [f"Партнёр {number}" for number in range(100)]
+    numbers = list(range(1, 100, 10))
+
+    assert keyboard(massive, numbers) == (numbers[:PAGE_SIZE], ["page_1"])
+    assert keyboard(massive, numbers, 1) == (numbers[PAGE_SIZE:], ["page_0"])
+
+
+def test_empty_search_result_gives_empty_keyboard():
+    assert asyncio.run(create_keyboard(PARTNERS, [])).inline_keyboard == ()
@@ -0,0 +1,24 @@
+import pytest
+
+from conftest import TEST_ENV
+from config.config import load_config
+
+
+def test_defaults():
+    settings = load_config(dict(TEST_ENV))
+
+    assert settings.finance_chat_ids == [2, 3]
+    assert (settings.update_mode, settings.max_concurrent_updates) == ("polling", 16)
+    assert settings.database_pool_size == 4
+
+
+@pytest.mark.parametrize("value", ["0", "-1"])
+def test_database_pool_size_must_be_positive(value):
+    with pytest.raises(RuntimeError, match="DATABASE_POOL_SIZE"):
+        load_config({**TEST_ENV, "DATABASE_POOL_SIZE": value})
+
+
+@pytest.mark.parametrize("value", ["0", "-1"])
+def test_max_concurrent_updates_must_be_positive(value):
+    with pytest.raises(RuntimeError, match="MAX_CONCURRENT_UPDATES"):
+        load_config({**TEST_ENV, "MAX_CONCURRENT_UPDATES": value})
@@ -0,0 +1,141 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+import exporter
+from db.db import Status
+from fake_sheets import FakeSpreadsheet, fake_manager
+from payments import PaymentRequest
+
+
+def request(month):
+    return PaymentRequest(
+        amount=Decimal(1000),
+        expense_item="Аренда",
+        expense_group="Офис",
+        partner="ООО Ромашка",
+        comment="",
+        period=(month,),
+        payment_method="безнал",
+    )
+
+
+@pytest.fixture
+def spreadsheet():
+    return FakeSpreadsheet()
+
+
+@pytest.fixture
+def sheets_exporter(monkeypatch, database, spreadsheet):
+    """Выгрузка из отдельной базы данных в поддельную таблицу без задержек повторных попыток"""
+    monkeypatch.setattr(exporter, "db", database)
+    monkeypatch.setattr(exporter, "sheets_manager", fake_manager(spreadsheet))
+    monkeypatch.setattr(exporter, "retry_delay", lambda attempts: 0)
+    return exporter.SheetsExporter()
+
+
+async def pay(database, count):
+    """count оплаченных заявок в очереди выгрузки"""
+    await database.setup()
+    async with database:
+        ids = await database.insert_records(
+            [request(f"{month:02}.26").as_record(1) for month in range(1, count + 1)]
+        )
+        for approval_id in ids:
+            await database.transition(approval_id, Status.NOT_PROCESSED, Status.APPROVED)
+            assert await database.mark_paid(approval_id, "@payer")
+
+
+async def queue_stats(database):
+    async with database:
+        return await database.export_queue_stats()
+
+
+def run(database, *steps):
+    async def scenario():
+        try:
+            return [await step() for step in steps]
+        finally:
+            await database.close()
+
+    return asyncio.run(scenario())
+
+
+def test_batch_is_exported_once(database, spreadsheet, sheets_exporter):
+    results = run(
+        database,
+        lambda: pay(database, 3),
+        sheets_exporter.export_batch,
+        sheets_exporter.export_batch,
+        lambda: queue_stats(database),
+    )
+
+    assert results[1:3] == [3, 0]
+    assert [len(rows) for rows in spreadsheet.worksheet.appended] == [3]
+    assert results[3]["depth"] == 0
+
+
+def test_malformed_response_after_append_is_not_retried(database, spreadsheet, sheets_exporter):
+    # Строки добавлены, но в ответе нет диапазона: форматирование пропускается, выгрузка завершена
+    spreadsheet.worksheet.malformed_response = True
+
+    results = run(
+        database,
+        lambda: pay(database, 2),
+        sheets_exporter.export_batch,
+        sheets_exporter.export_batch,
+        lambda: queue_stats(database),
+    )
+
+    assert results[1:3] == [2, 0]
+    assert len(spreadsheet.worksheet.appended) == 1
+    assert results[3]["depth"] == 0
+
+
+def test_failure_to_mark_exported_does_not_append_again(database, spreadsheet, sheets_exporter):
+    async def broken(outbox_ids):
+        raise RuntimeError("database is locked")
+
+    async def export_with_broken_database():
+        database.mark_exported = broken
+        with pytest.raises(RuntimeError):
+            await sheets_exporter.export_batch()
+        del database.mark_exported
+
+    results = run(
+        database,
+        lambda: pay(database, 2),
+        export_with_broken_database,
+        sheets_exporter.export_batch,
+        lambda: queue_stats(database),
+    )
+
+    assert results[2] == 0
+    assert len(spreadsheet.worksheet.appended) == 1
+    # Заявки отмечены как начатые и видны в /export_status, но повторно не выгружаются
+    assert results[3]["depth"] == 2
+    assert results[3]["claimed"] == 2
+
+
+def test_failed_append_is_retried(database, spreadsheet, sheets_exporter):
+    async def fail_once():
+        spreadsheet.worksheet.fail_append = True
+        result = await sheets_exporter.export_batch()
+        spreadsheet.worksheet.fail_append = False
+        return result
+
+    results = run(
+        database,
+        lambda: pay(database, 2),
+        fail_once,
+        lambda: queue_stats(database),
+        sheets_exporter.export_batch,
+        lambda: queue_stats(database),
+    )
+
+    assert results[1] == 0
+    assert (results[2]["depth"], results[2]["failing"], results[2]["claimed"]) == (2, 2, 0)
+    assert results[3] == 2
+    assert len(spreadsheet.worksheet.appended) == 1
+    assert results[4]["depth"] == 0
@@ -0,0 +1,41 @@
+import pytest
+
+from config.logging_config import LOG_QUEUE_SIZE, load_log_settings
+
+
+def test_defaults():
+    settings = load_log_settings({})
+
+    assert settings.level == "INFO"
+    assert settings.queue_size == LOG_QUEUE_SIZE
+    assert settings.queue_policy == "drop"
+    assert settings.json is False
+
+
+def test_values_from_environment():
+    settings = load_log_settings(
+        {"LOG_LEVEL": "debug", "LOG_QUEUE_SIZE": "50", "LOG_QUEUE_POLICY": "block", "LOG_JSON": "1"}
+    )
+
+    assert (settings.level, settings.queue_size, settings.queue_policy, settings.json) == (
+        "DEBUG",
+        50,
+        "block",
+        True,
+    )
+
+
+def test_all_errors_are_reported_at_once():
+    with pytest.raises(RuntimeError) as error:
+        load_log_settings({"LOG_LEVEL": "loud", "LOG_QUEUE_SIZE": "10k", "LOG_QUEUE_POLICY": "wait"})
+
+    message = str(error.value)
+    assert "LOG_LEVEL" in message
+    assert "LOG_QUEUE_SIZE" in message
+    assert "LOG_QUEUE_POLICY" in message
+
+
+@pytest.mark.parametrize("size", ["0", "-5"])
+def test_queue_size_must_be_positive(size):
+    with pytest.raises(RuntimeError, match="LOG_QUEUE_SIZE"):
+        load_log_settings({"LOG_QUEUE_SIZE": size})
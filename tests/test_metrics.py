@@ -0,0 +1,98 @@
+import asyncio
+import importlib
+
+import pytest
+
+from metrics.registry import BUCKETS, Histogram, MetricsRegistry, instrument_handler, timed
+
+
+# Модуль, а не одноимённый экземпляр MetricsRegistry, экспортируемый пакетом metrics
+registry_module = importlib.import_module("metrics.registry")
+
+
+def test_render_histograms_and_counters():
+    metrics = MetricsRegistry()
+    metrics.describe("latency_seconds", "Время обработки")
+    metrics.observe("latency_seconds", 0.003, handler="start")
+    metrics.observe("latency_seconds", 0.2, handler="start")
+    metrics.observe("latency_seconds", 60, handler="start")
+    metrics.inc("errors_total", handler="start")
+    metrics.inc("errors_total", 2, handler="pay")
+
+    lines = metrics.render().splitlines()
+
+    assert lines[:2] == ["# HELP latency_seconds Время обработки", "# TYPE latency_seconds histogram"]
+    buckets = lines[2 : 3 + len(BUCKETS)]
+    assert buckets[0] == 'latency_seconds_bucket{handler="start",le="0.005"} 1'
+    assert buckets[5] == 'latency_seconds_bucket{handler="start",le="0.25"} 2'
+    # Значение больше последней границы попадает только в +Inf
+    assert buckets[-2] == 'latency_seconds_bucket{handler="start",le="30.0"} 2'
+    assert buckets[-1] == 'latency_seconds_bucket{handler="start",le="+Inf"} 3'
+    assert lines[3 + len(BUCKETS) :] == [
+        'latency_seconds_sum{handler="start"} 60.203',
+        'latency_seconds_count{handler="start"} 3',
+        "# TYPE errors_total counter",
+        'errors_total{handler="pay"} 2',
+        'errors_total{handler="start"} 1',
+    ]
+
+
+def test_label_values_are_escaped():
+    metrics = MetricsRegistry()
+    metrics.inc("errors_total", handler='say "hi"\\\n')
+
+    assert metrics.render().splitlines()[-1] == 'errors_total{handler="say \\"hi\\"\\\\\\n"} 1'
+
+
+def test_empty_registry_renders_empty_exposition():
+    assert MetricsRegistry().render() == "\n"
+
+
+@pytest.mark.parametrize(
+    "values, q, expected",
+    [
+        ([], 0.5, 0.0),
+        ([0.001] * 10, 0.5, 0.0025),
+        ([0.001] * 9 + [0.2], 0.99, 0.235),
+        ([100.0], 0.99, BUCKETS[-1]),
+    ],
+)
+def test_histogram_quantile(values, q, expected):
+    histogram = Histogram()
+    for value in values:
+        histogram.observe(value)
+
+    assert histogram.quantile(q) == pytest.approx(expected)
+
+
+def test_handlers_and_downstream_calls_are_recorded(monkeypatch):
+    metrics = MetricsRegistry()
+    monkeypatch.setattr(registry_module, "registry", metrics)
+
+    @timed("db")
+    async def fetch():
+        return 1
+
+    @timed("db")
+    async def rows():
+        yield 1
+        yield 2
+
+    async def failing(update, context):
+        raise RuntimeError("boom")
+
+    async def scenario():
+        assert await fetch() == 1
+        assert [row async for row in rows()] == [1, 2]
+        with pytest.raises(RuntimeError):
+            await instrument_handler(failing, "pay")(None, None)
+
+    asyncio.run(scenario())
+
+    downstream = metrics.histograms("downstream_latency_seconds")
+    assert {labels: histogram.count for labels, histogram in downstream.items()} == {
+        (("method", "fetch"), ("service", "db")): 1,
+        (("method", "rows"), ("service", "db")): 1,
+    }
+    assert [h.count for h in metrics.histograms("handler_latency_seconds").values()] == [1]
+    assert 'handler_errors_total{handler="pay"} 1' in metrics.render()
@@ -0,0 +1,175 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+from db import migrations
+from db.db import ApprovalDB, Status
+from db.migrations import APPROVALS_V2, SCHEMA_VERSION, V2_COLUMNS, V2_VALUES, migrate, schema_version
+from db.pool import ConnectionPool
+
+
+# Таблица заявок версии 0: создавалась ApprovalDB.create_table до появления миграций
+V0_APPROVALS = """CREATE TABLE approvals
+                  (id INTEGER PRIMARY KEY,
+                   amount REAL,
+                   expense_item TEXT,
+                   expense_group TEXT,
+                   partner TEXT,
+                   comment TEXT,
+                   period TEXT,
+                   payment_method TEXT,
+                   approvals_needed INTEGER,
+                   approvals_received INTEGER,
+                   status TEXT,
+                   approved_by TEXT)"""
+
+V0_ROWS = [
+    (1, 100.5, "Аренда", "Офис", "Партнёр", "", "01.26", "нал", 1, 0, "Not processed", None),
+    (2, 60000.0, "Аренда", "Офис", "Партнёр", "", "01.26", "нал", 2, 1, "Pending", "@head"),
+    (3, 70000.1, "Связь", "Офис", "Партнёр", "", "01.26", "нал", 2, 2, "Approved", "@head, @fin"),
+    (4, 300.0, "Связь", "Офис", "Партнёр", "", "01.26 02.26 03.26", "безнал", 1, 1, "Paid", "@head"),
+    (5, 0.29, "Связь", "Офис", "Партнёр", "", "02.26", "нал", 1, None, "Rejected", None),
+]
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Перенос частями по 2 строки: у таблицы из 5 заявок три части
+    monkeypatch.setattr(migrations, "MIGRATION_CHUNK", 2)
+
+
+async def open_v0(path, v1=False):
+    pool = ConnectionPool(str(path), 1)
+    conn = await pool.acquire()
+    await conn.execute(V0_APPROVALS)
+    await conn.executemany(f"INSERT INTO approvals VALUES ({', '.join('?' * 12)})", V0_ROWS)
+    await conn.commit()
+    if v1:
+        await migrations.create_base_schema(conn)
+        await conn.execute("PRAGMA user_version = 1")
+        await conn.commit()
+    return pool, conn
+
+
+async def fetch(conn, query):
+    result = await conn.execute(query)
+    return await result.fetchall()
+
+
+async def check_migrated(conn):
+    assert await schema_version(conn) == SCHEMA_VERSION
+    rows = await fetch(conn, "SELECT id, amount, status, approvals_received FROM approvals ORDER BY id")
+    assert rows == [
+        (1, 10050, Status.NOT_PROCESSED, 0),
+        (2, 6000000, Status.PENDING, 1),
+        (3, 7000010, Status.APPROVED, 2),
+        (4, 30000, Status.PAID, 1),
+        (5, 29, Status.REJECTED, 0),
+    ]
+    # Согласующие из approved_by перенесены в журнал
+    assert await fetch(
+        conn, "SELECT approval_id, username, department FROM approval_events ORDER BY id"
+    ) == [(2, "@head", "head"), (3, "@head", "head"), (3, "@fin", "finance"), (4, "@head", "head")]
+    # Оплаченная заявка учтена в сводке бюджета по трём месяцам начисления
+    budget = await fetch(conn, "SELECT month, amount, payments FROM budget_rollup ORDER BY month")
+    assert [(month, Decimal(amount), payments) for month, amount, payments in budget] == [
+        ("2026-01", Decimal(100), 1),
+        ("2026-02", Decimal(100), 1),
+        ("2026-03", Decimal(100), 1),
+    ]
+    indexes = {row[1] for row in await fetch(conn, "PRAGMA index_list(approvals)")}
+    assert {"idx_approvals_open", "idx_approvals_status_item", "idx_approvals_status_period"} <= indexes
+    tables = {row[0] for row in await fetch(conn, "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "approvals_v2" not in tables
+
+
+async def migrate_v0(path):
+    pool, conn = await open_v0(path)
+    try:
+        await migrate(conn)
+        await check_migrated(conn)
+    finally:
+        await pool.release(conn)
+        await pool.close()
+
+
+def test_migrates_v0_database_to_latest(tmp_path):
+    asyncio.run(migrate_v0(tmp_path / "v0.db"))
+
+
+async def resume_interrupted(path):
+    pool, conn = await open_v0(path, v1=True)
+    try:
+        # Перенос прерван после первой части: approvals_v2 содержит заявки 1 и 2
+        await conn.execute(APPROVALS_V2)
+        await conn.execute(
+            f"INSERT INTO approvals_v2 ({V2_COLUMNS}) SELECT {V2_VALUES} FROM approvals WHERE id <= 2"
+        )
+        await conn.commit()
+
+        await migrate(conn)
+        await check_migrated(conn)
+    finally:
+        await pool.release(conn)
+        await pool.close()
+
+
+def test_interrupted_conversion_resumes(tmp_path):
+    asyncio.run(resume_interrupted(tmp_path / "v1.db"))
+
+
+async def migrate_empty(path):
+    pool = ConnectionPool(str(path), 1)
+    conn = await pool.acquire()
+    try:
+        await migrate(conn)
+        assert await schema_version(conn) == SCHEMA_VERSION
+        assert await fetch(conn, "SELECT COUNT(*) FROM approvals") == [(0,)]
+    finally:
+        await pool.release(conn)
+        await pool.close()
+
+
+def test_migrates_new_database(tmp_path):
+    asyncio.run(migrate_empty(tmp_path / "new.db"))
+
+
+async def backfilled_stats(path):
+    pool, conn = await open_v0(path)
+    try:
+        # Третий согласующий в approved_by не относится ни к одному отделу
+        await conn.execute(
+            f"INSERT INTO approvals VALUES ({', '.join('?' * 12)})",
+            (6, 80000.0, "Связь", "Офис", "Партнёр", "", "01.26", "нал", 2, 2, "Approved",
+             "@head, @fin, @ceo"),
+        )
+        await conn.commit()
+        await migrate(conn)
+    finally:
+        await pool.release(conn)
+        await pool.close()
+
+    database = ApprovalDB()
+    database.pool = ConnectionPool(str(path), 2)
+    try:
+        await database.setup()
+        async with database:
+            # Одобрение после миграции дополняет перенесённый журнал
+            assert await database.transition(2, Status.PENDING, Status.APPROVED, "@fin", "finance")
+            events = await database.approval_events(6)
+            return events, await database.approvers([2, 3, 5, 6]), await database.approver_stats()
+    finally:
+        await database.close()
+
+
+def test_backfilled_events_feed_approver_stats(tmp_path):
+    events, approvers, stats = asyncio.run(backfilled_stats(tmp_path / "v0.db"))
+
+    assert [(e["username"], e["department"], e["created_at"]) for e in events] == [
+        ("@head", "head", None),
+        ("@fin", "finance", None),
+        ("@ceo", None, None),
+    ]
+    assert approvers == {2: ["@head", "@fin"], 3: ["@head", "@fin"], 6: ["@head", "@fin", "@ceo"]}
+    assert stats == [("@ceo", {"approve": 1}), ("@fin", {"approve": 3}), ("@head", {"approve": 4})]
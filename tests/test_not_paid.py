@@ -0,0 +1,108 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+import handlers
+from db import Status
+from handlers import (
+    CALLBACK_DATA_LIMIT,
+    NOT_PAID_PAGE_SIZE,
+    decode_not_paid_filters,
+    not_paid_callback,
+    parse_not_paid_filters,
+)
+from payments import PaymentRequest
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        [],
+        ["status=pending"],
+        ["min=100.5", "max=5000"],
+        ["item=Аренда,", "офис_2", "status=approved", "min=0"],
+    ],
+)
+def test_filters_round_trip_through_callback_data(args):
+    filters = parse_not_paid_filters(args)
+
+    data = not_paid_callback("next", 123456, filters)
+
+    assert data.startswith("notpaid_next_123456_")
+    assert len(data.encode()) <= CALLBACK_DATA_LIMIT
+    assert decode_not_paid_filters(data.split("_", 3)[3]) == filters
+
+
+def test_filters_longer_than_callback_data_are_rejected():
+    filters = parse_not_paid_filters(["item=" + "Очень длинная статья расходов " * 3])
+
+    with pytest.raises(ValueError, match="Уберите часть фильтров"):
+        not_paid_callback("next", 123456, filters)
+
+
+def test_decoded_values_have_filter_types():
+    filters = decode_not_paid_filters("s2,a100.5,iАренда, офис")
+
+    assert filters == {
+        "status": Status.PENDING,
+        "min_amount": Decimal("100.5"),
+        "expense_item": "Аренда, офис",
+    }
+
+
+@pytest.mark.parametrize("encoded", ["x1", "s9", "a-1", "b1e3"])
+def test_malformed_filters(encoded):
+    with pytest.raises(ValueError):
+        decode_not_paid_filters(encoded)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, reply_markup=None):
+        self.replies.append((text, reply_markup))
+
+
+class FakeUpdate:
+    def __init__(self):
+        self.message = FakeMessage()
+
+
+class FakeContext:
+    def __init__(self, args):
+        self.args = args
+
+
+async def show_long_item(database, item):
+    """Ответы /show_not_paid с фильтром по статье item, когда заявок больше одной страницы"""
+    request = PaymentRequest(
+        amount=Decimal(100),
+        expense_item=item,
+        expense_group="Офис",
+        partner="ООО Ромашка",
+        comment="",
+        period=("01.26",),
+        payment_method="нал",
+    )
+    await database.setup()
+    try:
+        async with database:
+            await database.insert_records([request.as_record(7)] * (NOT_PAID_PAGE_SIZE + 1))
+        update = FakeUpdate()
+        await handlers.show_not_paid(update, FakeContext([f"item={item}"]))
+        return update.message.replies
+    finally:
+        await database.close()
+
+
+def test_show_not_paid_asks_to_shorten_filters(database, monkeypatch):
+    monkeypatch.setattr(handlers, "db", database)
+
+    replies = asyncio.run(show_long_item(database, "Очень длинная статья расходов " * 2 + "офиса"))
+
+    assert len(replies) == 1
+    text, markup = replies[0]
+    assert text.startswith("Фильтры слишком длинные для кнопок навигации")
+    assert markup is None
@@ -0,0 +1,108 @@
+import time
+from decimal import Decimal
+
+import pytest
+
+from payments import FORMAT_ERROR, PERIOD_ERROR, parse_payment_request
+
+
+def test_valid_request():
+    request = parse_payment_request(
+        " 50000.5 ; Аренда ; Офис ; ООО Ромашка ; за март ; 03.26  04.26 ; безнал "
+    )
+
+    assert request.amount == Decimal("50000.5")
+    assert (request.expense_item, request.expense_group, request.partner) == (
+        "Аренда",
+        "Офис",
+        "ООО Ромашка",
+    )
+    assert request.comment == "за март"
+    assert request.period == ("03.26", "04.26")
+    assert request.payment_method == "безнал"
+    assert request.approvals_needed == 2
+
+
+@pytest.mark.parametrize(
+    "comment",
+    ["оплата; вторая часть", ";;;", "строка\nс переводом", "a=b; c=d; e=f"],
+)
+def test_comment_may_contain_separators(comment):
+    request = parse_payment_request(f"100;Аренда;Офис;Партнёр;{comment};01.26;нал")
+
+    assert request.comment == comment.strip()
+    assert request.period == ("01.26",)
+    assert request.payment_method == "нал"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        ";;;;;;",
+        "100",
+        "100;Аренда;Офис;Партнёр;01.26;нал",  # нет комментария
+        "100;Аренда;Офис;Партнёр;комментарий;01.26;",  # пустая форма оплаты
+        "100; ;Офис;Партнёр;комментарий;01.26;нал",  # пустая статья
+        "-100;Аренда;Офис;Партнёр;комментарий;01.26;нал",
+        "1e5;Аренда;Офис;Партнёр;комментарий;01.26;нал",
+        "100,50;Аренда;Офис;Партнёр;комментарий;01.26;нал",
+        "100.123;Аренда;Офис;Партнёр;комментарий;01.26;нал",
+        "NaN;Аренда;Офис;Партнёр;комментарий;01.26;нал",
+        "Infinity;Аренда;Офис;Партнёр;комментарий;01.26;нал",
+        "١٠٠;Аренда;Офис;Партнёр;комментарий;01.26;нал",  # цифры другого алфавита
+        "１００;Аренда;Офис;Партнёр;комментарий;01.26;нал",
+    ],
+)
+def test_malformed_request(text):
+    with pytest.raises(ValueError) as error:
+        parse_payment_request(text)
+
+    assert str(error.value) == FORMAT_ERROR
+
+
+@pytest.mark.parametrize(
+    "period",
+    ["", " ", "00.26", "13.26", "1.26", "01.2026", "01-26", "01.26,02.26", "0².26", "٠١.26", "０１.26"],
+)
+def test_malformed_period(period):
+    with pytest.raises(ValueError) as error:
+        parse_payment_request(f"100;Аренда;Офис;Партнёр;комментарий;{period};нал")
+
+    assert str(error.value) == PERIOD_ERROR
+
+
+SHORT = 20_000  # размер короткого входа в символах; длинный в 10 раз больше
+LONG_INPUT_BUDGET = 0.1  # допустимое время разбора длинного входа, с
+
+# Неверные и верные заявки, длина которых растёт вместе с n
+ADVERSARIAL = {
+    "amount": lambda n: "1" * n + ".;Аренда;Офис;Партнёр;к;01.26;нал",
+    "separators": lambda n: "1" * (n // 2) + ";" + "a;" * (n // 4),
+    "comment": lambda n: "100;Аренда;Офис;Партнёр;" + ";" * n + ";01.26;нал",
+    "period": lambda n: "100;Аренда;Офис;Партнёр;к;" + "01.26 " * (n // 6) + ";нал",
+    "spaces": lambda n: "100;" + " " * n + ";Офис;Партнёр;к;01.26;нал",
+}
+
+
+def parse_time(text):
+    """Лучшее из трёх время разбора заявки, верной или нет"""
+    elapsed = []
+    for _ in range(3):
+        started = time.perf_counter()
+        try:
+            parse_payment_request(text)
+        except ValueError:
+            pass
+        elapsed.append(time.perf_counter() - started)
+    return min(elapsed)
+
+
+@pytest.mark.parametrize("shape", ADVERSARIAL)
+def test_long_input_is_parsed_in_linear_time(shape):
+    make = ADVERSARIAL[shape]
+    short, long = parse_time(make(SHORT)), parse_time(make(10 * SHORT))
+
+    assert long < LONG_INPUT_BUDGET
+    # Квадратичный разбор замедлился бы в 100 раз; запас на шум замера коротких входов
+    assert long < 30 * short + 0.005
@@ -0,0 +1,138 @@
+import asyncio
+from decimal import Decimal
+
+from db.db import Status
+from payments import PaymentRequest
+
+
+POOL_SIZE = 4  # размер пула фикстуры database
+RECORDS = 100  # по RACERS одновременных действий с каждой: 500 одновременных транзакций
+RACERS = 5  # одновременных попыток одного и того же действия с каждой заявкой
+
+
+def request(amount=100000):
+    return PaymentRequest(
+        amount=Decimal(amount),
+        expense_item="Аренда",
+        expense_group="Офис",
+        partner="ООО Ромашка",
+        comment="",
+        period=("01.26", "02.26"),
+        payment_method="безнал",
+    )
+
+
+async def scalar(database, query, params=()):
+    async with database:
+        result = await database._conn.execute(query, params)
+        return (await result.fetchone())[0]
+
+
+async def race(database, ids, action):
+    """RACERS одновременных вызовов action(id) для каждой заявки, каждый в своём 'async with db'"""
+
+    async def attempt(approval_id, racer):
+        async with database:
+            return approval_id, await action(approval_id, racer)
+
+    return await asyncio.gather(
+        *(attempt(approval_id, racer) for approval_id in ids for racer in range(RACERS))
+    )
+
+
+def winners(results):
+    counts = {}
+    for approval_id, result in results:
+        counts[approval_id] = counts.get(approval_id, 0) + bool(result)
+    return counts
+
+
+async def transitions(database):
+    await database.setup()
+    try:
+        async with database:
+            ids = await database.insert_records([request().as_record(1)] * RECORDS)
+
+        # Руководители: заявке нужно два апрува, после первого она ждёт финансовый отдел
+        results = await race(
+            database,
+            ids,
+            lambda approval_id, racer: database.transition(
+                approval_id, Status.NOT_PROCESSED, Status.APPROVED, f"@head{racer}", "head"
+            ),
+        )
+        assert winners(results) == dict.fromkeys(ids, 1)
+        assert {result["status"] for _, result in results if result} == {Status.PENDING}
+
+        results = await race(
+            database,
+            ids,
+            lambda approval_id, racer: database.transition(
+                approval_id, Status.PENDING, Status.APPROVED, f"@finance{racer}", "finance"
+            ),
+        )
+        assert winners(results) == dict.fromkeys(ids, 1)
+        assert {result["approvals_received"] for _, result in results if result} == {2}
+
+        # Оплата и отклонение одной и той же заявки: выигрывает ровно одно действие
+        results = await race(
+            database,
+            ids,
+            lambda approval_id, racer: (
+                database.mark_paid(approval_id, f"@payer{racer}")
+                if racer % 2
+                else database.reject(approval_id, f"@finance{racer}")
+            ),
+        )
+        assert winners(results) == dict.fromkeys(ids, 1)
+
+        paid = await scalar(database, "SELECT COUNT(*) FROM approvals WHERE status = ?", (Status.PAID,))
+        rejected = await scalar(
+            database, "SELECT COUNT(*) FROM approvals WHERE status = ?", (Status.REJECTED,)
+        )
+        assert paid + rejected == RECORDS
+        assert await scalar(database, "SELECT COUNT(*) FROM export_outbox") == paid
+        # Два месяца начисления у каждой оплаченной заявки
+        assert await scalar(database, "SELECT COALESCE(SUM(payments), 0) FROM budget_rollup") == 2 * paid
+        assert await scalar(database, "SELECT COUNT(*) FROM approval_events") == 3 * RECORDS
+        assert (
+            await scalar(
+                database, "SELECT COUNT(*) FROM approval_events WHERE approve_seconds IS NOT NULL"
+            )
+            == RECORDS
+        )
+        # Все соединения вернулись в пул без незавершённых транзакций
+        assert database.pool._idle.qsize() == POOL_SIZE
+        assert not any(conn.in_transaction for conn in database.pool._connections)
+    finally:
+        await database.close()
+
+
+def test_concurrent_transitions_apply_once(database):
+    asyncio.run(transitions(database))
+
+
+async def nested_leases(database):
+    await database.setup()
+    try:
+        async with database:
+            outer = database._conn
+            async with database:
+                assert database._conn is outer
+            assert database._conn is outer
+
+        async def lease():
+            async with database:
+                await asyncio.sleep(0)
+                return database._conn
+
+        # Одновременные корутины получают разные соединения
+        connections = await asyncio.gather(*(lease() for _ in range(POOL_SIZE)))
+        assert len(set(map(id, connections))) == POOL_SIZE
+        assert database.pool._idle.qsize() == POOL_SIZE
+    finally:
+        await database.close()
+
+
+def test_leases_are_per_coroutine_and_reentrant(database):
+    asyncio.run(nested_leases(database))
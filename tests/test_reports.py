@@ -0,0 +1,89 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+import reports
+from benchmarks.reports import build_history, run
+from db.db import Status, since
+from db.pool import ConnectionPool
+from db.reports import BACKLOG_OLDEST_QUERY, BACKLOG_QUERY, SLA_QUERY, TOTALS_QUERY
+from payments import PaymentRequest
+
+
+# Бенчмарк в уменьшенном масштабе; бюджет с запасом на медленные машины CI
+BENCHMARK_APPROVALS = 50_000
+BENCHMARK_BUDGET = 0.5
+
+QUERIES = {
+    "sla": (SLA_QUERY, {"since": since(30)}),
+    "backlog": (BACKLOG_QUERY, {}),
+    "backlog oldest": (BACKLOG_OLDEST_QUERY, {"limit": 3}),
+    "totals": (TOTALS_QUERY, {"since": since(30)}),
+}
+
+
+def test_report_benchmark_stays_within_budget():
+    assert asyncio.run(run(BENCHMARK_APPROVALS, 30, BENCHMARK_BUDGET)) == []
+
+
+async def query_plans(path):
+    pool = ConnectionPool(path, 1)
+    conn = await pool.acquire()
+    try:
+        await build_history(conn, 2000)
+        plans = {}
+        for name, (query, params) in QUERIES.items():
+            result = await conn.execute(f"EXPLAIN QUERY PLAN {query}", params)
+            plans[name] = [row[3] for row in await result.fetchall()]
+        return plans
+    finally:
+        await pool.release(conn)
+        await pool.close()
+
+
+@pytest.fixture(scope="module")
+def plans(tmp_path_factory):
+    """Планы запросов отчётов на небольшой синтетической истории"""
+    return asyncio.run(query_plans(str(tmp_path_factory.mktemp("reports") / "reports.db")))
+
+
+@pytest.mark.parametrize("name", QUERIES)
+def test_report_queries_do_not_scan_tables(plans, name):
+    assert [step for step in plans[name] if step.startswith("SCAN approval")] == []
+    assert any(step.startswith("SEARCH approval") for step in plans[name])
+
+
+async def approve_and_pay(database):
+    await database.setup()
+    try:
+        async with database:
+            request = PaymentRequest(
+                amount=Decimal(1000),
+                expense_item="Аренда",
+                expense_group="Офис",
+                partner="ООО Ромашка",
+                comment="",
+                period=("01.26",),
+                payment_method="безнал",
+            )
+            (approval_id,) = await database.insert_records([request.as_record(7)])
+            await database.transition(approval_id, Status.NOT_PROCESSED, Status.APPROVED, "@head", "head")
+            assert await database.mark_paid(approval_id, "@payer")
+        return await reports.sla_report(30)
+    finally:
+        await database.close()
+
+
+def test_sla_report_marks_percentiles_as_approximate(database, monkeypatch):
+    monkeypatch.setattr(reports, "db", database)
+
+    lines = asyncio.run(approve_and_pay(database)).splitlines()
+
+    assert lines[:2] == [
+        "Сроки обработки заявок по действиям за 30 дн.",
+        "Перцентили приблизительные: длительности считаются с точностью до минуты.",
+    ]
+    assert lines[2] == "До одобрения: 1 шт., p50 0 с, p90 0 с, p99 0 с"
+    assert lines[3] == "От одобрения до оплаты: 1 шт., p50 0 с, p90 0 с, p99 0 с"
+    assert "@head: 1 шт., p50 0 с, p90 0 с, p99 0 с" in lines
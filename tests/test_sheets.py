@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+from categories import make_category_index
+from fake_sheets import FakeSpreadsheet, fake_manager
+from sheets import CategoriesCache
+
+
+def payment(period="01.26 02.26 03.26", amount="300000"):
+    return {
+        "amount": amount,
+        "expense_item": "Аренда",
+        "expense_group": "Офис",
+        "partner": "ООО Ромашка",
+        "comment": "",
+        "period": period,
+        "payment_method": "безнал",
+    }
+
+
+@pytest.fixture
+def spreadsheet():
+    return FakeSpreadsheet()
+
+
+@pytest.fixture
+def manager(spreadsheet):
+    return fake_manager(spreadsheet)
+
+
+def test_payment_costs_two_calls_once_handles_are_cached(manager, spreadsheet):
+    # Первая заявка: авторизация, открытие таблицы и листа, добавление строк, форматирование
+    assert asyncio.run(manager.add_payment_to_sheet(payment())) == 5
+    assert asyncio.run(manager.add_payment_to_sheet(payment())) == 2
+
+    assert manager.stats == {"auth_calls": 1, "open_calls": 1, "worksheet_calls": 1, "write_calls": 4}
+    assert manager.api_calls() == 7
+    # Все месяцы периода добавлены одним запросом
+    assert [len(rows) for rows in spreadsheet.worksheet.appended] == [3, 3]
+
+
+def test_batch_of_payments_is_one_append_and_one_format(manager, spreadsheet):
+    asyncio.run(manager.add_payment_to_sheet(payment()))
+    payments = [payment("0{}.26".format(month)) for month in range(1, 10)]
+
+    assert asyncio.run(manager.add_payments_to_sheet(payments)) == 2
+    assert len(spreadsheet.worksheet.appended[-1]) == 9
+    assert len(spreadsheet.format_requests) == 2
+
+
+def test_format_request_covers_only_appended_rows(manager, spreadsheet):
+    asyncio.run(manager.add_payment_to_sheet(payment()))
+
+    ranges = [request["repeatCell"]["range"] for request in spreadsheet.format_requests[0]]
+    assert {(cell["startRowIndex"], cell["endRowIndex"]) for cell in ranges} == {(1, 4)}
+
+
+def test_format_failure_does_not_append_again():
+    spreadsheet = FakeSpreadsheet(fail_format=True)
+    manager = fake_manager(spreadsheet)
+
+    # Ошибка форматирования записывается в журнал, запрос считается, строки не добавляются повторно
+    assert asyncio.run(manager.add_payment_to_sheet(payment())) == 5
+    assert len(spreadsheet.worksheet.appended) == 1
+
+
+class CategoriesLoader:
+    """Загрузчик версий категорий; загрузка ждёт release и может завершиться ошибкой"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.fail = False
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("429 Too Many Requests")
+        return make_category_index({f"Статья {self.calls}": {"Офис": ["ООО Ромашка"]}})
+
+
+def expire(cache):
+    cache.loaded_at -= cache.ttl + 1
+
+
+async def single_flight():
+    loader = CategoriesLoader()
+    cache = CategoriesCache(loader, ttl=60)
+
+    waiting = [asyncio.create_task(cache.get()) for _ in range(10)]
+    await asyncio.sleep(0)
+    loader.release.set()
+    values = await asyncio.gather(*waiting)
+
+    # Одновременные запросы пустого кэша ждут одну загрузку
+    assert loader.calls == 1
+    assert {id(value) for value in values} == {id(cache.value)}
+    assert cache.stats == {"hits": 0, "misses": 10, "loads": 1}
+
+
+def test_concurrent_misses_share_one_load():
+    asyncio.run(single_flight())
+
+
+async def stale_while_revalidate():
+    loader = CategoriesLoader()
+    loader.release.set()
+    cache = CategoriesCache(loader, ttl=60)
+    first = await cache.get()
+
+    # В пределах TTL загрузки нет
+    assert await cache.get() is first
+    assert loader.calls == 1
+
+    # Устаревшее значение отдаётся сразу, обновление одно на все запросы
+    expire(cache)
+    loader.release.clear()
+    assert [await cache.get() for _ in range(5)] == [first] * 5
+    await asyncio.sleep(0)
+    assert loader.calls == 2
+    loader.release.set()
+    second = await cache._inflight
+
+    assert await cache.get() is second
+    assert (cache.version, loader.calls) == (2, 2)
+    # Незавершённые диалоги находят прежнюю версию по отпечатку
+    assert cache.lookup(first.digest) is first
+    assert cache.lookup(second.digest) is second
+
+
+def test_stale_value_is_served_while_reloading():
+    asyncio.run(stale_while_revalidate())
+
+
+async def failed_reload():
+    loader = CategoriesLoader()
+    loader.release.set()
+    cache = CategoriesCache(loader, ttl=60)
+    first = await cache.get()
+
+    loader.fail = True
+    with pytest.raises(RuntimeError):
+        await cache.refresh()
+    expire(cache)
+    assert await cache.get() is first
+    with pytest.raises(RuntimeError):
+        await cache._inflight
+
+    # После ошибки кэш по-прежнему устаревший, следующий запрос повторяет загрузку
+    loader.fail = False
+    assert await cache.get() is first
+    assert await cache._inflight is not first
+    assert (cache.version, loader.calls) == (2, 4)
+
+
+def test_failed_reload_keeps_value_and_retries():
+    asyncio.run(failed_reload())
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from db.db import ApprovalDB
+from db.pool import ConnectionPool
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+IMPORT_BUDGET = 2.0  # допустимое время импорта main, с
+SETUP_BUDGET = 1.0  # допустимое время создания схемы новой базы при запуске, с
+
+# Модули, которые загружаются только при первом обращении к Google Sheets или загрузке XLSX
+LAZY_MODULES = ("pandas", "gspread", "gspread_asyncio", "google.oauth2", "openpyxl")
+
+
+def test_main_import_is_fast_and_has_no_side_effects(tmp_path):
+    # Окружение без настроек бота: импорт не должен читать конфигурацию
+    env = {"PATH": os.environ.get("PATH", ""), "PYTHONPATH": os.pathsep.join((SRC, ROOT))}
+    code = (
+        "import sys, main; "
+        f"print(','.join(name for name in {LAZY_MODULES!r} if name in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    assert result.stdout.strip() == ""
+    # Ни базы данных, ни каталога логов до запуска бота
+    assert os.listdir(tmp_path) == []
+
+    # Строка -X importtime: "import time: self [us] | cumulative | module"
+    cumulative = {
+        line.rsplit("|", 1)[1].strip(): int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and "self [us]" not in line
+    }
+    assert cumulative["main"] / 1_000_000 < IMPORT_BUDGET
+
+
+async def timed_setup(database):
+    started = time.perf_counter()
+    try:
+        await database.setup()
+        return time.perf_counter() - started
+    finally:
+        await database.close()
+
+
+def test_schema_setup_fits_startup_budget(tmp_path):
+    database = ApprovalDB()
+    database.pool = ConnectionPool(str(tmp_path / "approvals.db"), 4)
+
+    assert asyncio.run(timed_setup(database)) < SETUP_BUDGET
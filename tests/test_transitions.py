@@ -0,0 +1,246 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+from telegram import User
+
+import handlers
+from db.db import Status
+from payments import PaymentRequest
+
+
+HEAD = User(id=1, first_name="Head", is_bot=False, username="head")
+
+
+def request(amount):
+    return PaymentRequest(
+        amount=Decimal(amount),
+        expense_item="Аренда",
+        expense_group="Офис",
+        partner="ООО Ромашка",
+        comment="",
+        period=("01.26",),
+        payment_method="безнал",
+    )
+
+
+async def seed(database, amounts):
+    """Заявки с суммами amounts; вторая отклонена, третья уже одобрена руководителем"""
+    await database.setup()
+    async with database:
+        ids = await database.insert_records([request(amount).as_record(7) for amount in amounts])
+        assert await database.reject(ids[1], "@finance")
+        assert await database.transition(ids[2], Status.NOT_PROCESSED, Status.APPROVED, "@head", "head")
+    return ids
+
+
+async def statuses(database, ids):
+    async with database:
+        return [(await database.get_row_by_id(approval_id))["status"] for approval_id in ids]
+
+
+async def events(database, ids):
+    async with database:
+        return [[event["action"] for event in await database.approval_events(i)] for i in ids]
+
+
+def run(database, scenario):
+    async def wrapped():
+        try:
+            return await scenario()
+        finally:
+            await database.close()
+
+    return asyncio.run(wrapped())
+
+
+def test_transition_many_skips_records_in_other_statuses(database):
+    async def scenario():
+        ids = await seed(database, [1000, 1000, 1000, 60000])
+        async with database:
+            changed = await database.transition_many(
+                ids, Status.NOT_PROCESSED, Status.APPROVED, "@head2", "head"
+            )
+        return ids, changed, await statuses(database, ids), await events(database, ids)
+
+    ids, changed, after, journal = run(database, scenario)
+
+    # Первая заявка одобрена полностью, четвёртой нужен второй апрув финансового отдела
+    assert {record["id"]: record["status"] for record in changed} == {
+        ids[0]: Status.APPROVED,
+        ids[3]: Status.PENDING,
+    }
+    assert after == [Status.APPROVED, Status.REJECTED, Status.APPROVED, Status.PENDING]
+    # В журнал попадают только изменённые заявки
+    assert journal == [["approve"], ["reject"], ["approve"], ["approve"]]
+
+
+def test_transition_many_of_already_processed_records_changes_nothing(database):
+    async def scenario():
+        ids = await seed(database, [1000, 1000, 1000])
+        async with database:
+            changed = await database.transition_many(
+                ids[1:], Status.NOT_PROCESSED, Status.REJECTED, "@head2", "head"
+            )
+            empty = await database.transition_many([], Status.NOT_PROCESSED, Status.REJECTED)
+        return changed, empty, await events(database, ids)
+
+    changed, empty, journal = run(database, scenario)
+
+    assert (changed, empty) == ([], [])
+    assert journal == [[], ["reject"], ["approve"]]
+
+
+class FakeMessage:
+    def __init__(self, text, reply_markup):
+        self.text = text
+        self.reply_markup = reply_markup
+
+
+class FakeQuery:
+    """Нажатие кнопки; запоминает ответы и изменения сообщения. options - заявки /approve_batch"""
+
+    def __init__(self, data, options=()):
+        self.data = data
+        self.from_user = HEAD
+        self.message = FakeMessage("Заявки:", handlers.batch_keyboard("head", options))
+        self.answers = []
+        self.edited = None
+
+    async def answer(self, text=None):
+        self.answers.append(text)
+
+    async def edit_message_text(self, text, reply_markup=None):
+        self.edited = (text, reply_markup)
+
+
+class FakeUpdate:
+    def __init__(self, query):
+        self.callback_query = query
+
+
+@pytest.fixture
+def notifications(monkeypatch, database):
+    """Обработчики кнопок работают с отдельной базой данных; рассылки запоминаются"""
+    sent = []
+
+    async def bulk_approval(records, department, context):
+        sent.append((department, sorted(record["id"] for record in records)))
+
+    async def bulk_payment(records, context):
+        sent.append(("payers", sorted(record["id"] for record in records)))
+
+    monkeypatch.setattr(handlers, "db", database)
+    monkeypatch.setattr(handlers, "create_and_send_bulk_approval_messages", bulk_approval)
+    monkeypatch.setattr(handlers, "create_and_send_bulk_payment_message", bulk_payment)
+    return sent
+
+
+def test_process_batch_reports_records_processed_by_others(database, notifications):
+    async def scenario():
+        ids = await seed(database, [1000, 1000, 1000, 60000, 1000])
+        options = [(approval_id, str(approval_id), approval_id != ids[4]) for approval_id in ids]
+        query = FakeQuery("batch_head_approve", options)
+        await handlers.process_batch(FakeUpdate(query), None)
+        return ids, query, await statuses(database, ids)
+
+    ids, query, after = run(database, scenario)
+
+    text, markup = query.edited
+    assert f"Одобрены: {ids[0]}, {ids[3]}" in text
+    assert f"Уже обработаны: {ids[1]}, {ids[2]}" in text
+    # В клавиатуре остаются только невыбранные заявки
+    assert [options[0] for options in handlers.batch_options(markup)] == [str(ids[4])]
+    assert after == [
+        Status.APPROVED,
+        Status.REJECTED,
+        Status.APPROVED,
+        Status.PENDING,
+        Status.NOT_PROCESSED,
+    ]
+    assert notifications == [("finance", [ids[3]]), ("payers", [ids[0]])]
+
+
+def test_process_batch_without_selection_changes_nothing(database, notifications):
+    async def scenario():
+        ids = await seed(database, [1000, 1000, 1000])
+        query = FakeQuery("batch_head_approve", [(i, str(i), False) for i in ids])
+        await handlers.process_batch(FakeUpdate(query), None)
+        return query, await statuses(database, ids)
+
+    query, after = run(database, scenario)
+
+    assert query.answers == ["Не выбрано ни одной заявки."]
+    assert query.edited is None
+    assert after == [Status.NOT_PROCESSED, Status.REJECTED, Status.APPROVED]
+    assert notifications == []
+
+
+async def scalar(database, query, params=()):
+    async with database:
+        result = await database._conn.execute(query, params)
+        return (await result.fetchone())[0]
+
+
+def test_double_approval_counts_once(database):
+    async def scenario():
+        ids = await seed(database, [60000, 1000, 1000, 60000])
+        async with database:
+            first = await database.transition(ids[0], Status.NOT_PROCESSED, Status.APPROVED, "@head", "head")
+            # Повторное нажатие руководителем и нажатие финансовым отделом раньше руководителя
+            again = await database.transition(ids[0], Status.NOT_PROCESSED, Status.APPROVED, "@head", "head")
+            early = await database.transition(ids[3], Status.PENDING, Status.APPROVED, "@fin", "finance")
+            row = await database.get_row_by_id(ids[0])
+        return first, again, early, row, await events(database, [ids[0], ids[3]])
+
+    first, again, early, row, journal = run(database, scenario)
+
+    assert first["status"] == Status.PENDING
+    assert (again, early) == (None, None)
+    assert (row["status"], row["approvals_received"]) == (Status.PENDING, 1)
+    assert journal == [["approve"], []]
+
+
+def test_rejected_request_cannot_be_paid(database):
+    async def scenario():
+        ids = await seed(database, [1000, 1000, 1000])
+        async with database:
+            paid = [await database.mark_paid(approval_id, "@payer") for approval_id in ids]
+            rejected_after_payment = await database.reject(ids[2], "@finance")
+        return (
+            paid,
+            rejected_after_payment,
+            await statuses(database, ids),
+            await scalar(database, "SELECT COUNT(*) FROM export_outbox"),
+            await scalar(database, "SELECT COUNT(*) FROM budget_rollup"),
+        )
+
+    paid, rejected_after_payment, after, outbox, budget = run(database, scenario)
+
+    # Оплачивается только одобренная заявка; оплаченная не отклоняется
+    assert paid == [False, False, True]
+    assert rejected_after_payment is False
+    assert after == [Status.NOT_PROCESSED, Status.REJECTED, Status.PAID]
+    assert (outbox, budget) == (1, 1)
+
+
+def test_pay_button_of_rejected_request(database, notifications, monkeypatch):
+    exported = []
+    monkeypatch.setattr(handlers.sheets_exporter, "notify", lambda: exported.append(True))
+
+    async def scenario():
+        ids = await seed(database, [1000, 1000, 1000])
+        queries = [FakeQuery(f"pay_{approval_id}") for approval_id in (ids[1], ids[2], ids[2], 999)]
+        for query in queries:
+            await handlers.process_pay(FakeUpdate(query), None)
+        return ids, queries
+
+    ids, queries = run(database, scenario)
+
+    assert [query.edited[0] for query in queries] == [
+        f"Заявка {ids[1]} не найдена, уже оплачена, отклонена или не одобрена.",
+        f"Заявка {ids[2]} оплачена.",
+        f"Заявка {ids[2]} не найдена, уже оплачена, отклонена или не одобрена.",
+        "Заявка 999 не найдена, уже оплачена, отклонена или не одобрена.",
+    ]
+    assert exported == [True]
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from datetime import datetime
+
+from telegram import CallbackQuery, Chat, Message, Update, User
+
+from update_processor import ChatOrderedUpdateProcessor, ordering_keys
+
+
+CONCURRENCY = 8  # одновременно обрабатываемых обновлений
+USERS = 100  # пользователей, кроме медленного чата
+UPDATES_PER_USER = 5
+ARRIVAL_INTERVAL = 0.001  # секунды между поступлением обновлений
+HANDLER_TIME = 0.005  # время обработки обновления обычного чата, с
+SLOW_CHAT = 0
+SLOW_HANDLER_TIME = 0.3  # время обработки обновления медленного чата, например долгой выгрузки, с
+SLOW_UPDATES = 3
+
+USER = User(id=10, first_name="Test", is_bot=False)
+
+
+def message_update(update_id, chat_id):
+    chat = Chat(id=chat_id, type=Chat.PRIVATE)
+    message = Message(message_id=update_id, date=datetime.now(), chat=chat, from_user=USER)
+    return Update(update_id=update_id, message=message)
+
+
+def callback_update(update_id, chat_id, data):
+    chat = Chat(id=chat_id, type=Chat.GROUP)
+    message = Message(message_id=update_id, date=datetime.now(), chat=chat)
+    query = CallbackQuery(
+        id=str(update_id), from_user=USER, chat_instance="1", data=data, message=message
+    )
+    return Update(update_id=update_id, callback_query=query)
+
+
+def test_ordering_keys():
+    assert ordering_keys(message_update(1, 5)) == ["chat:5"]
+    assert ordering_keys(callback_update(2, 7, "approval_head_approve_42_")) == [
+        "approval:42",
+        "chat:7",
+    ]
+    assert ordering_keys(callback_update(3, 7, "pay_42")) == ["approval:42", "chat:7"]
+    assert ordering_keys(callback_update(4, 7, "notpaid_next_42_")) == ["chat:7"]
+    assert ordering_keys(object()) == []
+
+
+async def cancelled_while_waiting():
+    processor = ChatOrderedUpdateProcessor(2)
+    release = asyncio.Event()
+    started = []
+
+    async def handle(name):
+        started.append(name)
+        await release.wait()
+
+    first = asyncio.create_task(processor.do_process_update(message_update(1, 5), handle("first")))
+    await asyncio.sleep(0)
+    # Второе обновление того же чата ждёт блокировку чата и отменяется до начала обработки
+    second = asyncio.create_task(processor.do_process_update(message_update(2, 5), handle("second")))
+    await asyncio.sleep(0)
+    second.cancel()
+    await asyncio.gather(second, return_exceptions=True)
+
+    release.set()
+    await first
+    assert started == ["first"]
+    assert processor._locks == {}
+
+    # Блокировка чата свободна: следующее обновление обрабатывается сразу
+    await asyncio.wait_for(
+        processor.do_process_update(message_update(3, 5), handle("third")), timeout=1
+    )
+    assert started == ["first", "third"]
+    assert processor._locks == {}
+
+
+def test_cancelled_update_releases_only_its_own_locks():
+    asyncio.run(cancelled_while_waiting())
+
+
+async def chats_in_parallel():
+    processor = ChatOrderedUpdateProcessor(2)
+    order = []
+
+    async def handle(name, delay):
+        await asyncio.sleep(delay)
+        order.append(name)
+
+    await asyncio.gather(
+        processor.do_process_update(message_update(1, 5), handle("chat5-first", 0.02)),
+        processor.do_process_update(message_update(2, 5), handle("chat5-second", 0)),
+        processor.do_process_update(message_update(3, 6), handle("chat6", 0)),
+    )
+    # Обновления одного чата - по порядку, другой чат не ждёт
+    assert order == ["chat6", "chat5-first", "chat5-second"]
+
+
+def test_updates_of_one_chat_are_ordered():
+    asyncio.run(chats_in_parallel())
+
+
+def percentile(values, share):
+    return sorted(values)[min(len(values) - 1, int(len(values) * share))]
+
+
+async def load_with_slow_chat():
+    processor = ChatOrderedUpdateProcessor(CONCURRENCY)
+    latencies = []
+
+    async def handle(chat_id, received):
+        await asyncio.sleep(SLOW_HANDLER_TIME if chat_id == SLOW_CHAT else HANDLER_TIME)
+        if chat_id != SLOW_CHAT:
+            latencies.append(time.perf_counter() - received)
+
+    # Обновления поступают по очереди, как из очереди приложения; медленный чат пишет первым
+    chats = [SLOW_CHAT] * SLOW_UPDATES + [
+        chat_id for _ in range(UPDATES_PER_USER) for chat_id in range(1, USERS + 1)
+    ]
+    tasks = []
+    for update_id, chat_id in enumerate(chats, 1):
+        coroutine = handle(chat_id, time.perf_counter())
+        tasks.append(
+            asyncio.create_task(processor.process_update(message_update(update_id, chat_id), coroutine))
+        )
+        await asyncio.sleep(ARRIVAL_INTERVAL)
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def test_slow_chat_does_not_delay_other_users():
+    latencies = asyncio.run(load_with_slow_chat())
+
+    assert len(latencies) == USERS * UPDATES_PER_USER
+    p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+    # Ожидающие обновления медленного чата не занимают мест обработки остальных пользователей
+    assert p50 < 4 * HANDLER_TIME
+    assert p99 < SLOW_HANDLER_TIME / 3